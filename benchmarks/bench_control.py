@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Control-to-audible latency against the fake tools in benchmarks/fakebin, with the players consuming in real time.
+A tone plays for a second, then:
+    mute       set_volume(0) until the virtual mic player gets only silence
+    unmute     set_volume(1) until it gets sound again
+    stop       stop() until the last sound arrived
+"estimate" is the "audible" phase the mix thread records for the same call (see diagnostics), "restarted" tells
+whether stop() had to replace the helper processes. The paced output is measured first, then the old
+as-fast-as-the-pipe-takes-it output.
+
+Run from the repository root:
+    python3 benchmarks/bench_control.py --runs 5 --lookahead-ms 60
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio
+from bench_latency import PlaybackLog
+
+
+def wait_for(log: PlaybackLog, start_ns: int, sounding: bool, timeout: float = 3.0) -> int | None:
+    """Arrival of the first chunk after start_ns that is entirely silent, or has sound if sounding is set."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        log.poll()
+        for ns, _, non_zero, _ in log.entries:
+            if ns >= start_ns and bool(non_zero) == sounding:
+                return ns
+        time.sleep(0.0005)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lookahead-ms", type=float, default=60.0)
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(0.0)
+    os.environ["FAKE_PLAY_REALTIME"] = "1"
+    try:
+        import soundfile as sf
+        from model.sound_effect import SoundEffect
+        from service.pipewire_hijack_service import sb
+        from service.audio_state_service import audio_state
+        from service.settings_service import settings_service
+        from service.trace_service import tracer
+
+        settings_service.settings["output_lookahead_ms"] = args.lookahead_ms
+        sb.setup()
+        rate = sb.mixer.sample_rate
+        path = os.path.join(state_dir, "tone.wav")
+        t = np.arange(rate * 5) / rate
+        # Never exactly zero, so every chunk of the tone counts as sound in the player log
+        sf.write(path, (0.3 + 0.1 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), rate)
+        log = PlaybackLog(os.path.join(state_dir, "playback-virtual_mic_sink.log"))
+        effect = SoundEffect(Path(path))
+        sb.load_sound(effect)
+
+        def estimate(name: str) -> float:
+            trace = next((trace for trace in tracer.recent(10) if trace["sound"] == name), None)
+            return trace["phases"].get("audible", float("nan")) if trace else float("nan")
+
+        print(f"\n{args.runs} runs, lookahead {args.lookahead_ms:.0f} ms, block {sb.mixer.block_size} frames")
+        print(f"{'output':<8} {'control':<8} {'measured':>10} {'estimate':>10} {'restarted':>10}   (median ms)")
+        results = {}
+        for paced in (True, False):
+            settings_service.settings["paced_output"] = paced
+            measured = {"mute": [], "unmute": [], "stop": []}
+            estimated = {"mute": [], "unmute": [], "stop": []}
+            restarted = 0
+            for _ in range(args.runs):
+                log.wait_quiet()
+                sb.set_volume(1.0)
+                sb.play(effect)
+                time.sleep(1.0)
+
+                for name, volume in (("mute", 0.0), ("unmute", 1.0)):
+                    start = time.monotonic_ns()
+                    sb.set_volume(volume)
+                    arrived = wait_for(log, start, sounding=volume > 0)
+                    measured[name].append((arrived - start) / 1e6 if arrived else float("nan"))
+                    time.sleep(0.3)
+                    estimated[name].append(estimate("volume"))
+
+                pid = sb.output_streams[0].process.pid
+                start = time.monotonic_ns()
+                sb.stop()
+                last = log.wait_quiet()
+                measured["stop"].append(max(0, last - start) / 1e6)
+                estimated["stop"].append(estimate("stop"))
+                restarted += sb.output_streams[0].process.pid != pid
+
+            mode = "paced" if paced else "unpaced"
+            results[mode] = measured
+            for name in measured:
+                print(f"{mode:<8} {name:<8} {statistics.median(measured[name]):>10.1f} "
+                      f"{statistics.median(estimated[name]):>10.1f} "
+                      f"{f'{restarted}/{args.runs}' if name == 'stop' else '':>10}")
+
+        sb.cleanup()
+        audio_state.stop()
+        # Lookahead, one block of ramp and the 10 ms chunks of the player
+        bound = args.lookahead_ms + sb.mixer.block_size / rate * 1000 + 20
+        ok = all(max(values) < bound for values in results["paced"].values())
+        print(f"\npaced controls audible within {bound:.0f} ms: {'✅' if ok else '❌'}")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+The daemon (main.py --daemon) against the fake tools in benchmarks/fakebin, driven over its socket by DaemonClient.
+    round trip   one command, waiting for its reply before the next
+    pipelined    --batch commands sent at once, then all replies read (time per command)
+    dispatch     time the daemon spends in a command (from "stats")
+The sounds are short clicks that were played once before, so "play" measures a warm cache.
+At the end the daemon is stopped with SIGTERM, it has to remove its socket.
+
+Run from the repository root:
+    python3 benchmarks/bench_daemon.py --runs 500 --batch 1000
+"""
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio, ROOT
+
+
+def percentiles(values: list[float]) -> str:
+    values = sorted(values)
+    return f"{statistics.median(values):>9.1f} {values[min(len(values) - 1, len(values) * 99 // 100)]:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=500, help="commands per round trip measurement")
+    parser.add_argument("--batch", type=int, default=1000, help="commands per pipeline")
+    parser.add_argument("--sounds", type=int, default=200)
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(0.0)
+    os.environ["XDG_RUNTIME_DIR"] = state_dir
+    daemon = None
+    try:
+        import soundfile as sf
+        from service.settings_service import settings_service
+        from service.daemon_client_service import DaemonClient, socket_path
+
+        sound_path = Path(settings_service.settings["sound_path"])
+        click = np.zeros(4800, dtype=np.float32)
+        click[:8] = 0.8
+        for i in range(args.sounds):
+            sf.write(sound_path / f"click {i}.wav", click, 48000)
+
+        start = time.perf_counter()
+        daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), "--daemon"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        client = DaemonClient(socket_path())
+        while not client.connect():
+            if daemon.poll() is not None:
+                print("❌ The daemon exited")
+                return 1
+            time.sleep(0.01)
+        listening = time.perf_counter() - start
+        while client.stats()["setup_state"] == "starting" or len(client.list()) < args.sounds:
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+        print(f"\ndaemon listening after {listening * 1000:.0f} ms, audio and {args.sounds} sounds ready after "
+              f"{ready * 1000:.0f} ms")
+
+        # Warm the cache, and check that every command gets its own reply in order
+        replies = client.pipeline([f"play {i}" for i in range(args.sounds)] + ["bogus", "play 'click 3'", "ping"])
+        ok = all(reply.startswith("ok ") for reply in replies[:args.sounds])
+        ok = ok and replies[-3:-1] == ["err Unknown command: bogus", replies[-2]] and replies[-2].startswith("ok ")
+        ok = ok and replies[-1] == "ok pong"
+        client.request("stop")
+        sounds = client.list()
+
+        print(f"{'command':<22} {'p50 us':>9} {'p99 us':>9}")
+        for label, command in (("ping", lambda i: "ping"),
+                               ("play by id", lambda i: f"play {i % args.sounds}"),
+                               ("play by name", lambda i: f"play 'click {i % args.sounds}'"),
+                               ("play by path", lambda i: f"play '{sounds[i % args.sounds]['path']}'"),
+                               ("volume", lambda i: "volume 0.8")):
+            times = []
+            for i in range(args.runs):
+                begin = time.perf_counter_ns()
+                client.request(command(i))
+                times.append((time.perf_counter_ns() - begin) / 1000)
+                if label.startswith("play") and i % 8 == 7:
+                    client.request("stop")
+            print(f"{label + ' round trip':<22} {percentiles(times)}")
+        client.request("stop")
+
+        for label, command in (("ping", lambda i: "ping"), ("play by id", lambda i: f"play {i % 8}")):
+            commands = [command(i) for i in range(args.batch)]
+            if label.startswith("play"):
+                # Stops in between, so the voice limit isn't what is measured
+                commands = [c if i % 8 else "stop" for i, c in enumerate(commands)]
+            begin = time.perf_counter_ns()
+            replies = client.pipeline(commands)
+            per_command = (time.perf_counter_ns() - begin) / 1000 / len(commands)
+            ok = ok and len(replies) == len(commands) and all(reply.startswith("ok") for reply in replies)
+            print(f"{label + ' pipelined':<22} {per_command:>9.1f} {'':>9}")
+        client.request("stop")
+
+        stats = client.stats()
+        dispatch = stats["daemon"]["dispatch_us"]
+        print(f"{'dispatch (daemon)':<22} {dispatch['50']:>9.1f} {dispatch['99']:>9.1f}   "
+              f"over the last {min(1024, stats['daemon']['commands'])} of {stats['daemon']['commands']} commands")
+        client.close()
+
+        daemon.send_signal(signal.SIGTERM)
+        code = daemon.wait(timeout=10)
+        ok = ok and code == 0 and not socket_path().exists() and dispatch["50"] < 1000
+        print(f"\nreplies in order, sub-millisecond dispatch, clean shutdown: {'✅' if ok else '❌'}")
+        return 0 if ok else 1
+    finally:
+        if daemon is not None and daemon.poll() is None:
+            daemon.kill()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
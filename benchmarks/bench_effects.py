@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Cost and correctness of the effect chains in effects_service.
+For every chain a tone is rendered as a whole buffer (what a cached sound does once) and block by block
+(what the streaming decoder does). Both have to give the same samples. The realtime factor is seconds of audio
+processed per second.
+
+Run from the repository root:
+    python3 benchmarks/bench_effects.py --seconds 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.effects_service import EffectChain, parse_chain
+
+chains = [
+    "gain=-6",
+    "fade_in=50 fade_out=500",
+    "highpass=120",
+    "lowpass=3000",
+    "speed=1.25",
+    "pitch=3",
+    "pitch=-12",
+    "highpass=120 lowpass=8000 gain=-3 fade_in=20 fade_out=300 pitch=2",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the test tone")
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--block", type=int, default=8192, help="block size of the streamed run")
+    args = parser.parse_args()
+
+    rate = args.rate
+    t = np.arange(int(rate * args.seconds)) / rate
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    print(f"\n{args.seconds:.0f} s tone at {rate} Hz, streamed in blocks of {args.block}")
+    print(f"{'chain':<68} {'render':>9} {'realtime':>9} {'length':>8} {'stream diff':>12} {'pitch':>8}")
+    ok = True
+    for text in chains:
+        specs = parse_chain(text)
+        start = time.perf_counter()
+        chain = EffectChain(specs, rate, len(tone))
+        rendered = chain.render(tone)
+        seconds = time.perf_counter() - start
+
+        stream = EffectChain(specs, rate, len(tone))
+        blocks = [stream.process(tone[i:i + args.block]) for i in range(0, len(tone), args.block)]
+        streamed = np.concatenate(blocks + [stream.flush()])
+
+        length_ok = len(rendered) == chain.length == len(streamed)
+        diff = float(np.max(np.abs(rendered - streamed))) if length_ok else np.inf
+        # Loudest frequency of the middle, to see pitch and speed work
+        inner = rendered[len(rendered) // 4:-len(rendered) // 4]
+        spectrum = np.abs(np.fft.rfft(inner * np.hanning(len(inner))))
+        pitch = np.argmax(spectrum) * rate / len(inner)
+        ok = ok and length_ok and diff < 1e-5
+        print(f"{text:<68} {seconds * 1000:>6.1f} ms {args.seconds / seconds:>8.0f}x "
+              f"{'ok' if length_ok else 'wrong':>8} {diff:>12.2e} {pitch:>5.0f} Hz")
+    print(f"\nstreamed and rendered chains match: {'✅' if ok else '❌'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
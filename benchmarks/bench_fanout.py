@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+What the virtual mic gets while the speakers hang now and then, against the fake tools in benchmarks/fakebin.
+The fake speakers stop reading for --stall-ms after every second of audio (FAKE_STALL), both players consume
+in real time. A tone is played once with the speakers on the "block" policy (the mixer waits for them, like the
+old single writer thread) and once on "drop" (the default).
+    mic gap      longest time the virtual mic player got nothing while the tone played
+    mic audio    seconds of the tone that reached the virtual mic
+    dropped      seconds the speaker writer dropped to keep up
+
+Run from the repository root:
+    python3 benchmarks/bench_fanout.py --seconds 5 --stall-ms 800
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio
+from bench_latency import PlaybackLog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of the tone")
+    parser.add_argument("--stall-ms", type=float, default=800.0, help="how long the speakers stop reading")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(0.0)
+    os.environ["FAKE_PLAY_REALTIME"] = "1"
+    os.environ["FAKE_STALL"] = f"fake_speakers:{args.stall_ms}"
+    try:
+        import soundfile as sf
+        from model.sound_effect import SoundEffect
+        from service.pipewire_hijack_service import sb
+        from service.audio_state_service import audio_state
+
+        sb.setup()
+        rate = sb.mixer.sample_rate
+        path = os.path.join(state_dir, "tone.wav")
+        t = np.arange(int(rate * args.seconds)) / rate
+        # Never exactly zero, so every chunk of the tone counts as sound in the player log
+        sf.write(path, (0.3 + 0.1 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), rate)
+        log = PlaybackLog(os.path.join(state_dir, "playback-virtual_mic_sink.log"))
+        sb.load_sound(SoundEffect(Path(path)))
+
+        print(f"\n{args.seconds:.0f} s tone, speakers stall {args.stall_ms:.0f} ms every second, "
+              f"ring of {sb.ring_slots} blocks of {sb.mixer.block_size}")
+        print(f"{'speakers':<10} {'mic gap':>10} {'mic audio':>10} {'mic underruns':>14} {'dropped':>9} "
+              f"{'overflows':>10}")
+        gaps = {}
+        for policy in ("block", "drop"):
+            # New streams and writers with this policy
+            sb._close_streams()
+            sb.monitor_policy = policy
+            sb._open_streams()
+            log.wait_quiet()
+            log.entries.clear()
+            start = time.monotonic_ns()
+            sb.play(SoundEffect(Path(path)))
+            while sb.mixer.voices:
+                time.sleep(0.05)
+            time.sleep(0.5)
+            log.poll()
+
+            sounding = [ns for ns, _, non_zero, _ in log.entries if ns >= start and non_zero]
+            gap = max(np.diff(sounding), default=0) / 1e6
+            audio = sum(non_zero for ns, _, non_zero, _ in log.entries if ns >= start) / rate
+            mic, speakers = (writer.stats() for writer in sb.sink_writers)
+            gaps[policy] = gap
+            print(f"{policy:<10} {gap:>7.1f} ms {audio:>8.2f} s {mic['underruns']:>14} "
+                  f"{speakers['frames_dropped'] / rate:>7.2f} s {speakers['overflows']:>10}")
+
+        sb.cleanup()
+        audio_state.stop()
+        # The player reads 10 ms chunks, a bit more is scheduling noise
+        ok = gaps["drop"] < 50
+        print(f"\nthe virtual mic keeps playing while the speakers hang: {'✅' if ok else '❌'}")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
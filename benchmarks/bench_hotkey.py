@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Measures the hotkey trigger path: keypress -> voice queued in the mixer -> first block mixed.
+The listener callback is called directly, so no X server or pynput is needed. Uses the fake tools in benchmarks/fakebin.
+
+Run from the repository root:
+    python3 benchmarks/bench_hotkey.py path/to/sound.wav --presses 200
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from bench_setup import use_fake_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sound", help="sound file to trigger")
+    parser.add_argument("--presses", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=20.0, help="time between two presses")
+    args = parser.parse_args()
+
+    use_fake_audio(0)
+    from service.hotkey_service import HotkeyService
+    from service.pipewire_hijack_service import sb
+    from service.audio_state_service import audio_state
+
+    sb.setup()
+    path = os.path.abspath(args.sound)
+    # A throwaway bindings file, the user's hotkeys.json isn't touched
+    hotkeys = HotkeyService(Path(os.environ["FAKE_AUDIO_DIR"]) / "hotkeys.json")
+    hotkeys.bindings[path] = "<ctrl>+<alt>+b"
+    hotkeys._preload([path])
+    while sb.audio_cache.stats()["entries"] == 0:
+        time.sleep(0.01)
+
+    for _ in range(args.presses):
+        hotkeys.trigger(path)
+        time.sleep(args.interval_ms / 1000)
+        sb.mixer.stop_all()
+
+    stats = hotkeys.latency_stats()
+    print(f"{stats['count']} presses")
+    for name in ("queued_ms", "first_block_ms"):
+        print(f"  {name:<16} p50 {stats[name][50]:7.3f} ms   p99 {stats[name][99]:7.3f} ms")
+
+    sb.cleanup()
+    audio_state.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
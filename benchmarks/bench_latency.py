@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency of the soundboard against the fake tools in benchmarks/fakebin.
+
+Measures from the call into SoundboardHijacker to the moment the fake player reads the first non-silent sample:
+    setup      sb.setup() (includes the cleanup of the previous run)
+    teardown   sb.cleanup()
+    cold       play() of a sound that is in neither cache (decode + resample)
+    warm       play() of a sound that is in the memory cache, while nothing else is playing
+    retrigger  play() of the same sound every --retrigger-ms while the earlier ones are still playing
+    stop       stop() until the player stops receiving audio
+The test sounds are a single click followed by silence, so the arrival of every new voice is visible in the output.
+
+Run from the repository root:
+    python3 benchmarks/bench_latency.py --plays 50
+    python3 benchmarks/bench_latency.py --save-baseline baseline.json
+    python3 benchmarks/bench_latency.py --baseline baseline.json --tolerance 0.5    (exit code 1 on a regression)
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio
+
+# Regressions smaller than this are noise, whatever the tolerance says
+MIN_REGRESSION_MS = 2.0
+
+
+class PlaybackLog:
+    """Follows the log the fake player writes for one target."""
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.entries: list[tuple[int, int, int, int]] = []#(monotonic ns, bytes, non-zero samples, onsets)
+
+    def poll(self):
+        try:
+            with open(self.path) as f:
+                f.seek(self.offset)
+                lines = f.read()
+        except FileNotFoundError:
+            return
+        # Only complete lines. The rest is read on the next poll.
+        complete = lines[:lines.rfind("\n") + 1]
+        self.offset += len(complete.encode())
+        for line in complete.splitlines():
+            self.entries.append(tuple(int(value) for value in line.split()))
+
+    def first_sound_after(self, start_ns: int, timeout: float = 2.0) -> int | None:
+        """Returns the time the first non-silent chunk arrived after start_ns."""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.poll()
+            for ns, _, non_zero, _ in self.entries:
+                if ns >= start_ns and non_zero:
+                    return ns
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.0005)
+
+    def clicks(self) -> list[int]:
+        """Arrival times of every click. Clicks that arrived in the same chunk get the same time."""
+        times = []
+        for ns, _, _, onsets in self.entries:
+            times += [ns] * onsets
+        return times
+
+    def wait_quiet(self, quiet: float = 0.05, timeout: float = 5.0) -> int:
+        """
+        Waits until nothing arrived for a while, i.e. the player has played everything that was queued.
+        Forgets everything that arrived so far and returns the arrival time of the last click.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.poll()
+            last = self.entries[-1][0] if self.entries else 0
+            if time.monotonic_ns() - last > quiet * 1e9:
+                break
+            time.sleep(0.005)
+        last_click = max((ns for ns, _, non_zero, _ in self.entries if non_zero), default=0)
+        self.entries.clear()
+        return last_click
+
+
+def make_click(path: str, sample_rate: int, seconds: float, seed: int):
+    import soundfile as sf
+    data = np.zeros(int(sample_rate * seconds), dtype=np.float32)
+    # A few samples, so the click survives resampling. Every file gets different ones, nothing can be shared.
+    data[:8] = np.random.default_rng(seed).uniform(0.5, 1.0, 8)
+    sf.write(path, data, sample_rate)
+
+
+def percentiles(values: list[float]) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p99": None, "n": 0}
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p / 100))]
+    return {"p50": pick(50), "p99": pick(99), "n": len(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plays", type=int, default=30, help="measurements per play scenario")
+    parser.add_argument("--runs", type=int, default=5, help="setup/teardown measurements")
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="simulated pactl round trip")
+    parser.add_argument("--retrigger-ms", type=float, default=30.0, help="time between two retriggers")
+    parser.add_argument("--sound-seconds", type=float, default=0.3, help="length of the test sounds")
+    parser.add_argument("--no-realtime", action="store_true",
+                        help="let the fake player read as fast as possible instead of at the sample rate")
+    parser.add_argument("--tool", choices=["pw-play", "paplay"], default="pw-play")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save-baseline", help="write the results as a baseline for later runs")
+    parser.add_argument("--baseline", help="compare with a baseline and exit with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown against the baseline (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(args.delay_ms)
+    if not args.no_realtime:
+        os.environ["FAKE_PLAY_REALTIME"] = "1"
+    if args.tool == "paplay":
+        os.environ["FAKE_NO_PW_PLAY"] = "1"
+
+    try:
+        results = run(args, state_dir)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    print(f"\n{'scenario':<12} {'n':>4} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, stats in results.items():
+        if stats["n"]:
+            print(f"{name:<12} {stats['n']:>4} {stats['p50']:>10.2f} {stats['p99']:>10.2f}")
+        else:
+            print(f"{name:<12} {0:>4} {'-':>10} {'-':>10}")
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        return compare(results, args.baseline, args.tolerance)
+    return 0
+
+
+def run(args, state_dir: str) -> dict:
+    from model.sound_effect import SoundEffect
+    from service.pipewire_hijack_service import sb
+    from service.audio_state_service import audio_state
+
+    rate = 44100
+    sound_dir = os.path.join(state_dir, "sounds")
+    os.makedirs(sound_dir)
+    cold_sounds = []
+    for i in range(args.plays):
+        path = os.path.join(sound_dir, f"cold_{i}.wav")
+        make_click(path, rate, args.sound_seconds, i)
+        cold_sounds.append(SoundEffect(Path(path)))
+    warm_path = os.path.join(sound_dir, "warm.wav")
+    make_click(warm_path, rate, args.sound_seconds, args.plays)
+    warm_sound = SoundEffect(Path(warm_path))
+
+    mic_log = PlaybackLog(os.path.join(state_dir, "playback-virtual_mic_sink.log"))
+    results = {}
+
+    # Setup and teardown. One setup first, so every teardown has something to undo.
+    sb.setup()
+    setup_ms, teardown_ms = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        sb.cleanup()
+        teardown_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        sb.setup()
+        setup_ms.append((time.perf_counter() - start) * 1000)
+    results["setup"] = percentiles(setup_ms)
+    results["teardown"] = percentiles(teardown_ms)
+
+    def play_and_wait(sound) -> float | None:
+        start = time.monotonic_ns()
+        sb.play(sound)
+        arrived = mic_log.first_sound_after(start)
+        return None if arrived is None else (arrived - start) / 1e6
+
+    def measure(sounds) -> list[float]:
+        latencies = []
+        for sound in sounds:
+            mic_log.wait_quiet()
+            latency = play_and_wait(sound)
+            if latency is not None:
+                latencies.append(latency)
+        mic_log.wait_quiet()
+        return latencies
+
+    # The first play opens the helpers. It isn't part of any scenario.
+    sb.play(warm_sound)
+    mic_log.first_sound_after(0)
+    mic_log.wait_quiet()
+
+    results["cold"] = percentiles(measure(cold_sounds))
+    results["warm"] = percentiles(measure([warm_sound] * args.plays))
+
+    # Retrigger: every press lands while earlier presses are still playing.
+    # The clicks arrive in the order of the presses, so the n-th click belongs to the n-th press.
+    presses = []
+    for _ in range(args.plays):
+        start = time.monotonic_ns()
+        sb.play(warm_sound)
+        presses.append(start)
+        time.sleep(max(0.0, args.retrigger_ms / 1000 - (time.monotonic_ns() - start) / 1e9))
+    mic_log.poll()
+    deadline = time.monotonic() + 5
+    while len(mic_log.clicks()) < len(presses) and time.monotonic() < deadline:
+        time.sleep(0.01)
+        mic_log.poll()
+    clicks = mic_log.clicks()
+    if len(clicks) != len(presses):
+        print(f"Warning: {len(presses)} retriggers but {len(clicks)} clicks arrived")
+    results["retrigger"] = percentiles([(c - p) / 1e6 for p, c in zip(presses, clicks)])
+    mic_log.wait_quiet()
+
+    # Stop: how long until no audio arrives anymore
+    stop = []
+    for _ in range(min(args.plays, 10)):
+        sb.play(warm_sound)
+        mic_log.first_sound_after(0)
+        start = time.monotonic_ns()
+        sb.stop()
+        returned = time.monotonic_ns()
+        last_click = mic_log.wait_quiet()
+        stop.append((max(last_click, returned) - start) / 1e6)
+    results["stop"] = percentiles(stop)
+
+    sb.cleanup()
+    audio_state.stop()
+    return results
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if not old or not stats["n"] or not old["n"]:
+            continue
+        for key in ("p50", "p99"):
+            allowed = max(old[key] * (1 + tolerance), old[key] + MIN_REGRESSION_MS)
+            if stats[key] > allowed:
+                regressions.append(f"{name} {key}: {stats[key]:.2f} ms (baseline {old[key]:.2f} ms, allowed {allowed:.2f} ms)")
+
+    if regressions:
+        print("\n❌ Regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n✅ No regressions against", baseline_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
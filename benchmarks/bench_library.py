@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Startup of the sound list from the library index against a generated library of small files.
+    grid       update_sounds_from_folder() until the grid has its sounds (sounds_list_changed)
+    reconcile  until the background walk was compared with the index and the folder is watched
+The first refresh starts with an empty index, the others with the index of the run before.
+Between the runs a file is renamed, one deleted, one added and one rewritten, and the diff is checked.
+
+Run from the repository root:
+    python3 benchmarks/bench_library.py --files 5000
+"""
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--folders", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3, help="refreshes with a filled index")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(0.0)
+    try:
+        import soundfile as sf
+        from PySide6.QtCore import QCoreApplication
+        from service.settings_service import settings_service
+
+        sound_path = Path(settings_service.settings["sound_path"])
+        data = np.zeros(441, dtype=np.float32)
+        for i in range(args.files):
+            folder = sound_path / f"folder_{i % args.folders}"
+            folder.mkdir(exist_ok=True)
+            sf.write(folder / f"sound_{i}.wav", data, 44100)
+
+        app = QCoreApplication([])
+        from service.signal_service import signals
+        from service.sounds_service import sound_service
+        from service.predecode_service import predecode_service
+        from service.library_index_service import library_index
+
+        diffs = []
+        signals.sounds_list_diff.connect(lambda a, r, n: diffs.append(([s.name for s in a], [s.name for s in r],
+                                                                        [s.name for s in n])))
+        reconciled = []
+        signals.predecode_progress.connect(lambda done, total: reconciled.append(time.perf_counter()))
+
+        def refresh() -> tuple[float, float]:
+            # Progress of the run before may still be queued
+            app.processEvents()
+            diffs.clear()
+            reconciled.clear()
+            start = time.perf_counter()
+            sound_service.update_sounds_from_folder()
+            shown = time.perf_counter()
+            while not reconciled:
+                app.processEvents()
+                time.sleep(0.0005)
+            # Only the listing is measured. The pre-decoding it starts would compete with the next run.
+            predecode_service.cancel()
+            return (shown - start) * 1000, (reconciled[0] - start) * 1000
+
+        print(f"\n{args.files} files in {args.folders} folders")
+        print(f"{'index':<8} {'grid ms':>10} {'reconcile ms':>14}")
+        grid, reconcile = refresh()
+        print(f"{'empty':<8} {grid:>10.1f} {reconcile:>14.1f}")
+        for _ in range(args.runs):
+            grid, reconcile = refresh()
+            print(f"{'filled':<8} {grid:>10.1f} {reconcile:>14.1f}")
+
+        # Changes while the soundboard isn't running, so the watcher must not see them
+        sound_service._watcher.removePaths(sound_service._watcher.directories())
+        (sound_path / "folder_0" / "sound_0.wav").rename(sound_path / "folder_1" / "moved.wav")
+        (sound_path / "folder_2" / "sound_2.wav").unlink()
+        sf.write(sound_path / "folder_3" / "new.wav", data, 44100)
+        sf.write(sound_path / "folder_4" / "sound_4.wav", np.ones(882, dtype=np.float32) * 0.1, 44100)
+        refresh()
+        added, removed, renamed = diffs[0] if diffs else ([], [], [])
+        ok = added == ["new"] and removed == ["sound_2"] and renamed == ["moved"]
+        rows = library_index.sounds_under(sound_path)
+        ok = ok and len(rows) == args.files and len(sound_service.sounds_list) == args.files
+        print(f"\nchanges: added {added}, removed {removed}, renamed {renamed}, {len(rows)} rows "
+              f"{'✅' if ok else '❌'}")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Measures what apps recording from Hijacked_Mic see when the mic is changed, against the fake pactl in benchmarks/fakebin.
+A watcher thread samples the loaded modules of the fake server every few hundred microseconds. A stretch counts
+from the last sample that saw a module to the next one, if a sample in between saw it missing:
+    device down  longest time without the Hijacked_Mic remap source (the device vanished for recording apps)
+    mic gap      longest time without a loopback from a real mic into virtual_mic_sink
+    switch       duration of the call
+"rebuild" is the old way (setup() again), "hot-swap" is switch_mic().
+
+Run from the repository root:
+    python3 benchmarks/bench_mic_swap.py --runs 10 --delay-ms 5
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+from bench_setup import use_fake_audio
+
+
+class ModuleWatcher:
+    """Samples state.json of the fake pactl and records the longest stretch without each kind of module."""
+    def __init__(self, state_dir: str):
+        self.state_path = os.path.join(state_dir, "state.json")
+        self._stop = threading.Event()
+        self._thread = None
+        self.device_down = 0.0
+        self.mic_gap = 0.0
+
+    def __enter__(self):
+        self._stop.clear()
+        self.device_down = self.mic_gap = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> tuple[bool, bool] | None:
+        try:
+            with open(self.state_path + ".lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                with open(self.state_path) as f:
+                    modules = json.load(f)["modules"]
+        except (OSError, ValueError):
+            return None
+        device = any(m["name"] == "module-remap-source" and "hijacked_mic" in m["argument"] for m in modules)
+        mic = any(m["name"] == "module-loopback" and "sink=virtual_mic_sink" in m["argument"] for m in modules)
+        return device, mic
+
+    def _run(self):
+        # A stretch counts from the last sample that saw the module to the next one, if a sample in between saw it
+        # missing. Stalls of the sampling thread alone don't count.
+        seen = {"device": time.perf_counter(), "mic": time.perf_counter()}
+        missing = {"device": False, "mic": False}
+        longest = {"device": 0.0, "mic": 0.0}
+        while not self._stop.is_set():
+            sample = self._sample()
+            now = time.perf_counter()
+            if sample is not None:
+                for name, present in zip(("device", "mic"), sample):
+                    if present:
+                        if missing[name]:
+                            longest[name] = max(longest[name], now - seen[name])
+                        seen[name] = now
+                        missing[name] = False
+                    else:
+                        missing[name] = True
+            time.sleep(0.0002)
+        self.device_down, self.mic_gap = longest["device"], longest["mic"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="simulated pactl round trip")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(args.delay_ms)
+    try:
+        from service.pipewire_hijack_service import sb
+        from service.audio_state_service import audio_state
+        from service.settings_service import settings_service
+
+        mics = ["Fake Headset", "Fake Microphone"]
+        settings_service.settings["output_device"] = mics[1]
+        sb.setup()
+
+        results = {}
+        ok = True
+        for mode, switch in (("rebuild", sb.setup), ("hot-swap", sb.switch_mic)):
+            down, gaps, durations = [], [], []
+            for run in range(args.runs):
+                settings_service.settings["output_device"] = mics[run % 2]
+                watcher = ModuleWatcher(state_dir)
+                with watcher:
+                    time.sleep(0.005)
+                    start = time.perf_counter()
+                    switch()
+                    durations.append(time.perf_counter() - start)
+                    time.sleep(0.005)
+                down.append(watcher.device_down)
+                gaps.append(watcher.mic_gap)
+                ok = ok and sb.original_mic == ("fake_headset" if run % 2 == 0 else "fake_mic")
+            results[mode] = (down, gaps, durations)
+
+        modules = [m["name"] for m in json.load(open(os.path.join(state_dir, "state.json")))["modules"]]
+        ok = ok and modules.count("module-loopback") == 1 and len(sb.module_ids) == 3
+        sb.cleanup()
+        audio_state.stop()
+
+        print(f"\n{args.runs} switches, {args.delay_ms} ms per pactl call, "
+              f"loopback latency {sb.loopback_latency_ms} ms")
+        print(f"{'mode':<10} {'device down':>12} {'mic gap':>10} {'switch':>10}   (max / median ms)")
+        for mode, (down, gaps, durations) in results.items():
+            print(f"{mode:<10} {max(down) * 1000:>12.1f} {max(gaps) * 1000:>10.1f} "
+                  f"{statistics.median(durations) * 1000:>10.1f}")
+        hot_down, hot_gaps, _ = results["hot-swap"]
+        ok = ok and max(hot_down) == 0 and max(hot_gaps) * 1000 < sb.loopback_latency_ms
+        print(f"hot-swap keeps the device and the gap under one loopback period: {'✅' if ok else '❌'}")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the per-chunk cost of the playback hot path.
+Compares the old chunk loop (slice, multiply, astype, tobytes) with Mixer.render() and measures the temporary memory allocated per chunk.
+
+Run from the repository root:
+    python3 benchmarks/bench_mixer.py
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.mixer_service import Mixer
+
+
+def legacy_chunks(audio_data, chunk_samples, effect_volume, settings):
+    """The loop _play_thread used before: three new arrays and a bytes copy per chunk."""
+    for i in range(0, len(audio_data), chunk_samples):
+        chunk = audio_data[i:i + chunk_samples]
+        current_global_vol = settings.get("global_volume", 1.0)
+        final_chunk = (chunk * 0.9 * effect_volume * current_global_vol).astype(np.float32)
+        yield final_chunk.tobytes()
+
+
+def mixer_chunks(mixer: Mixer, audio_data, voices, effect_volume, master_gain):
+    for _ in range(voices):
+        mixer.add_voice(audio_data, effect_volume)
+    while True:
+        block = mixer.render(master_gain)
+        if block is None:
+            return
+        yield memoryview(block).cast('B')
+
+
+def time_per_chunk(chunks) -> tuple[float, int]:
+    count = 0
+    start = time.perf_counter()
+    for _ in chunks:
+        count += 1
+    return (time.perf_counter() - start) / max(count, 1), count
+
+
+def allocated_bytes_per_chunk(chunks, skip: int = 10) -> float:
+    """Average peak of temporary memory allocated while producing one chunk, after a few warm-up chunks."""
+    for _ in range(skip):
+        next(chunks)
+    tracemalloc.start()
+    count = 0
+    total = 0
+    while True:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        _, peak = tracemalloc.get_traced_memory()
+        del chunk
+        total += peak - current
+        count += 1
+    tracemalloc.stop()
+    return total / max(count, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the test sound")
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--block", type=int, default=1024)
+    parser.add_argument("--voices", type=int, default=1, help="overlapping voices for the mixer run")
+    args = parser.parse_args()
+
+    audio = np.random.uniform(-0.5, 0.5, int(args.seconds * args.rate))
+    audio32 = audio.astype(np.float32)
+    settings = {"global_volume": 0.8}
+
+    legacy_time, chunks = time_per_chunk(legacy_chunks(audio, args.block, 1.0, settings))
+    mixer = Mixer(args.rate, max_voices=max(16, args.voices), block_size=args.block)
+    mixer_time, _ = time_per_chunk(mixer_chunks(mixer, audio32, args.voices, 1.0, 0.72))
+
+    mixer = Mixer(args.rate, max_voices=max(16, args.voices), block_size=args.block)
+    mixer_allocs = allocated_bytes_per_chunk(mixer_chunks(mixer, audio32, args.voices, 1.0, 0.72))
+    legacy_allocs = allocated_bytes_per_chunk(legacy_chunks(audio, args.block, 1.0, settings))
+
+    print(f"{chunks} chunks of {args.block} samples")
+    print(f"legacy loop      : {legacy_time * 1e6:8.2f} us/chunk, {legacy_allocs:9.0f} bytes allocated/chunk")
+    print(f"mixer, {args.voices:2d} voice(s): {mixer_time * 1e6:8.2f} us/chunk, {mixer_allocs:9.0f} bytes allocated/chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Speed and accuracy of the resample qualities in decode_service.
+Resamples sine tones and compares them with the exact tone at the target rate (SNR in dB, higher is better).
+
+Run from the repository root:
+    python3 benchmarks/bench_resample.py --seconds 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.decode_service import resample, resample_qualities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the test tones")
+    args = parser.parse_args()
+
+    print(f"\n{'conversion':<16} {'tone':>8} {'quality':<8} {'time':>9} {'SNR':>9}")
+    for source_rate, target_rate in [(44100, 48000), (48000, 44100), (22050, 48000)]:
+        t = np.arange(int(source_rate * args.seconds)) / source_rate
+        # A tone in the middle of the band and one close to the lower Nyquist frequency
+        for frequency in (1000, 0.45 * min(source_rate, target_rate)):
+            tone = np.sin(2 * np.pi * frequency * t).astype(np.float32)
+            for quality in resample_qualities:
+                start = time.perf_counter()
+                result = resample(tone, source_rate, target_rate, quality)
+                seconds = time.perf_counter() - start
+
+                expected = np.sin(2 * np.pi * frequency * np.arange(len(result)) / target_rate)
+                # The edges are ignored, the filters see silence beyond them
+                inner = slice(target_rate // 10, -target_rate // 10)
+                error = np.sum((result[inner] - expected[inner]) ** 2)
+                snr = 10 * np.log10(np.sum(expected[inner] ** 2) / error)
+                print(f"{source_rate:>6}->{target_rate:<8} {frequency:>6.0f}Hz {quality:<8} "
+                      f"{seconds * 1000:>7.1f}ms {snr:>7.1f}dB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Times SoundboardHijacker.setup() and cleanup() against the fake pactl in benchmarks/fakebin
+and checks that a failing step is rolled back completely.
+
+Run from the repository root:
+    python3 benchmarks/bench_setup.py --runs 10 --delay-ms 5
+    python3 benchmarks/bench_setup.py --fail module-loopback
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKEBIN = os.path.join(ROOT, "benchmarks", "fakebin")
+
+
+def use_fake_audio(delay_ms: float) -> str:
+    """
+    Puts the fake tools first on PATH and gives the soundboard a throwaway home directory,
+    so the user's settings and caches aren't touched. Must run before anything from service/ is imported.
+    """
+    state_dir = tempfile.mkdtemp(prefix="fake-audio-")
+    os.environ["FAKE_AUDIO_DIR"] = state_dir
+    os.environ["HOME"] = os.path.join(state_dir, "home")
+    os.environ.pop("XDG_MUSIC_DIR", None)
+    os.environ["FAKE_PACTL_DELAY_MS"] = str(delay_ms)
+    os.environ["PATH"] = FAKEBIN + os.pathsep + os.environ["PATH"]
+    sys.path.insert(0, ROOT)
+    return state_dir
+
+
+def read_state(state_dir: str) -> dict:
+    with open(os.path.join(state_dir, "state.json")) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="simulated pactl round trip")
+    parser.add_argument("--fail", help="make pactl calls containing this text fail and check the rollback")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(args.delay_ms)
+    try:
+        from service.pipewire_hijack_service import sb
+        from service.audio_state_service import audio_state
+
+        if args.fail:
+            os.environ["FAKE_PACTL_FAIL"] = args.fail
+            ok = sb.setup()
+            os.environ.pop("FAKE_PACTL_FAIL")
+            state = read_state(state_dir)
+            leftovers = [m for m in state["modules"] if "virtual_mic_sink" in m["argument"]]
+            print(f"setup returned {ok}, leftover modules: {len(leftovers)}, default source: {state['default_source']}")
+            audio_state.stop()
+            return 0 if not ok and not leftovers and state["default_source"] != "hijacked_mic" else 1
+
+        setup_times = []
+        cleanup_times = []
+        steps = defaultdict(list)
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            sb.setup()
+            setup_times.append(time.perf_counter() - start)
+            for name, seconds in sb.setup_timings:
+                steps[name].append(seconds)
+
+            start = time.perf_counter()
+            sb.cleanup()
+            cleanup_times.append(time.perf_counter() - start)
+        audio_state.stop()
+
+        print(f"\n{args.runs} runs, {args.delay_ms} ms per pactl call")
+        for name, values in steps.items():
+            print(f"  {name:<28} {statistics.median(values) * 1000:8.1f} ms")
+        print(f"  {'setup (median)':<28} {statistics.median(setup_times) * 1000:8.1f} ms")
+        print(f"  {'cleanup (median)':<28} {statistics.median(cleanup_times) * 1000:8.1f} ms")
+        return 0
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Time to first sound and peak memory of a long file, played through the cached path and the streaming path.
+Plays against the fake tools in benchmarks/fakebin. Memory is the peak of the allocations traced by tracemalloc
+(numpy's buffers included) while the sound is loaded and played.
+
+Run from the repository root:
+    python3 benchmarks/bench_streaming.py --minutes 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from bench_setup import use_fake_audio
+from bench_latency import PlaybackLog
+
+
+def make_long_file(path: str, sample_rate: int, minutes: float):
+    import soundfile as sf
+    # Written in pieces, so making the test file doesn't need the memory that is measured
+    with sf.SoundFile(path, "w", sample_rate, 2, "PCM_16") as f:
+        rng = np.random.default_rng(0)
+        for _ in range(int(minutes * 60)):
+            f.write(rng.uniform(-0.3, 0.3, (sample_rate, 2)).astype(np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=5.0, help="length of the test file")
+    parser.add_argument("--play-seconds", type=float, default=1.0, help="how long every mode plays before stop()")
+    args = parser.parse_args()
+
+    state_dir = use_fake_audio(0.0)
+    # At the sample rate like a sound card, so a decoder that falls behind shows up as starved blocks
+    os.environ["FAKE_PLAY_REALTIME"] = "1"
+    try:
+        from model.sound_effect import SoundEffect
+        from service.pipewire_hijack_service import sb
+        from service.audio_state_service import audio_state
+        from service.settings_service import settings_service
+        from service.trace_service import tracer
+
+        sb.setup()
+        path = os.path.join(state_dir, "long.wav")
+        make_long_file(path, 44100, args.minutes)
+        size_mb = os.path.getsize(path) / 2**20
+        log = PlaybackLog(os.path.join(state_dir, "playback-virtual_mic_sink.log"))
+
+        # Opens the helpers, so neither mode pays for it
+        sb.play(SoundEffect(Path(path)))
+        sb.stop()
+        sb.audio_cache.clear()
+        sb.mixer.starved = 0
+
+        print(f"\n{args.minutes:.1f} min, {size_mb:.0f} MB file")
+        print(f"{'mode':<10} {'first sound':>12} {'peak memory':>12} {'starved':>8}   phases (ms)")
+        for mode, threshold in (("cached", size_mb * 2), ("streaming", 1)):
+            settings_service.settings["streaming_threshold_mb"] = threshold
+            log.wait_quiet()
+            tracemalloc.start()
+            start = time.monotonic_ns()
+            sb.play(SoundEffect(Path(path)))
+            arrived = log.first_sound_after(start, timeout=60)
+            time.sleep(args.play_seconds)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            phases = tracer.recent(1)[0]["phases"]
+            sb.stop()
+            first = f"{(arrived - start) / 1e6:.1f} ms" if arrived else "-"
+            print(f"{mode:<10} {first:>12} {peak / 2**20:>9.1f} MB {sb.mixer.starved:>8}   "
+                  + ", ".join(f"{name} {ms:.1f}" for name, ms in phases.items() if ms >= 0.1))
+            sb.audio_cache.clear()
+
+        sb.cleanup()
+        audio_state.stop()
+        return 0
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,116 @@
 #!/usr/bin/env python3
 import sys
 
-from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout
+# Everything else is imported in main(), so --profile-startup sees every import
 
-from views.control_row import ControlRow
-from views.overview_grid import GridWidget
-from views.menu_bar import setup_menu_bar
-from service.pipewire_hijack_service import sb
+def run_daemon() -> int:
+    """--daemon: the soundboard without a window, controlled over a Unix socket (see SoundboardDaemon)."""
+    import signal
+    from PySide6.QtCore import QCoreApplication, QTimer
 
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Linux Soundboard")
-        self.setGeometry(100, 100, 800, 600)
+    app = QCoreApplication(sys.argv)
+    from service.daemon_client_service import socket_path
+    from service.daemon_service import SoundboardDaemon
+    from service.pipewire_hijack_service import sb
+    from service.audio_state_service import audio_state
+    from service.hotkey_service import hotkey_service
+    from service.sounds_service import sound_service
+    from service.disk_cache_service import disk_cache
 
-        # Create a central widget and main layout
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        main_layout = QVBoxLayout(central_widget)
+    daemon = SoundboardDaemon(socket_path())
+    if not daemon.start():
+        print(f"❌ A soundboard daemon is already running at {daemon.path}")
+        return 1
+    app.aboutToQuit.connect(daemon.stop)
+    app.aboutToQuit.connect(sb.shutdown)
+    app.aboutToQuit.connect(audio_state.stop)
+    app.aboutToQuit.connect(hotkey_service.stop)
+    app.aboutToQuit.connect(disk_cache.flush)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: app.quit())
+    # Python only runs the signal handlers when it gets control. The timer gives it that while Qt waits.
+    timer = QTimer()
+    timer.timeout.connect(lambda: None)
+    timer.start(200)
 
-        # Control Row
-        main_layout.addWidget(ControlRow(self))
+    sb.start_setup()
+    sound_service.update_sounds_from_folder()
+    hotkey_service.start()
+    return app.exec()
 
-        #Grid Widget
-        self.grid_widget = GridWidget(self)
-        main_layout.addWidget(self.grid_widget)
-
-        setup_menu_bar(self)
 
 def main():
+    if "--daemon" in sys.argv:
+        sys.exit(run_daemon())
+
+    profile = "--profile-startup" in sys.argv
+    if profile:
+        sys.argv.remove("--profile-startup")
+        from service.startup_profile_service import startup_profiler
+        startup_profiler.start()
+
+    import threading
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+
     app = QApplication(sys.argv)
-    app.aboutToQuit.connect(sb.cleanup)
+    if profile:
+        startup_profiler.mark("QApplication created")
+
+    from views.main_window import MainWindow
+    from service.pipewire_hijack_service import sb
+    from service.signal_service import signals
+    from service.audio_state_service import audio_state
+    from service.hotkey_service import hotkey_service
+    from service.predecode_service import predecode_service
+    from service.player_service import player
+    from service.daemon_client_service import daemon_client
+    from service.disk_cache_service import disk_cache
+
+    # With a daemon running the window is only its client. The daemon has the virtual mic, the caches and the hotkeys.
+    remote = daemon_client.connect()
+    if remote:
+        print(f"🔌 Using the soundboard daemon at {daemon_client.path}")
+        player.use(daemon_client)
+        hotkey_service.remote = daemon_client
+        predecode_service.enabled = False
+    else:
+        app.aboutToQuit.connect(sb.shutdown)
+        app.aboutToQuit.connect(hotkey_service.stop)
+        app.aboutToQuit.connect(disk_cache.flush)
+    app.aboutToQuit.connect(audio_state.stop)
     window = MainWindow()
+    if profile:
+        startup_profiler.mark("window created")
+
+        def report(phase: str):
+            startup_profiler.mark(phase)
+            startup_profiler.stop()
+            print(startup_profiler.report())
+
+        def audio_done(state):
+            if state != "starting":
+                report(f"audio {state}")
+                signals.audio_setup_changed.disconnect(audio_done)
+
+        def event_loop_running():
+            startup_profiler.mark("event loop running")
+            # The daemon set up the audio long ago, the startup ends with the window on screen
+            if remote:
+                report("window shown")
+        if not remote:
+            signals.audio_setup_changed.connect(audio_done)
+        QTimer.singleShot(0, event_loop_running)
+
     window.show()
+    if not remote:
+        # The virtual mic and the device list are set up on a background thread, the window is usable meanwhile
+        sb.start_setup()
+        hotkey_service.start()
+    else:
+        # Only for the device list, the daemon does the routing
+        threading.Thread(target=audio_state.start, name="audio-state", daemon=True).start()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
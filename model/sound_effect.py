@@ -2,12 +2,24 @@ from pathlib import Path
 
 
 class SoundEffect:
-    def __init__(self, mp3_path: Path, name:str = None, volume=1.0):
+    def __init__(self, mp3_path: Path, name:str = None, volume=1.0, tags: list[str] = None,
+                 duration: float = None, sample_rate: int = None, effects: list[dict] = None):
         self.mp3_path = mp3_path
         #if no name is set generates the name from the mp3 path
         if name is None: name = self.make_name_from_dir()
         self.name = name
         self.volume = volume
+        #e.g. the folders the sound is in, used for searching
+        self.tags = tags if tags is not None else []
+        #from the library index. None until the file was read once
+        self.duration = duration
+        self.sample_rate = sample_rate
+        #effect chain applied when playing, e.g. [{"type": "highpass", "hz": 120}]. See effects_service
+        self.effects = effects if effects is not None else []
+        #whether the file is decoded while it plays. None lets play() look at the file size
+        self.streamed = None
+        #where the file was before its last rename, so what is stored by path (e.g. hotkeys) can follow it
+        self.previous_path: Path | None = None
 
     def make_name_from_dir(self, path: str = None) -> str:
         if path is None: path = str(self.mp3_path)
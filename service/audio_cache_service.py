@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class CachedSound:
+    """A decoded sound as it is kept in memory. Multiply the samples with scale to get float audio in [-1, 1]."""
+    def __init__(self, data: np.ndarray, scale: float = 1.0):
+        self.data = data
+        self.scale = scale
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+
+class AudioCache:
+    """
+    In-memory LRU cache of decoded sounds with a byte budget.
+    Samples are kept as float32 by default. The int16 format halves the memory again for a small loss in precision.
+    Pinned files (e.g. sounds bound to a hotkey) are never evicted.
+    """
+    sample_formats = ["float32", "int16"]
+
+    def __init__(self, max_bytes: int, sample_format: str = "float32"):
+        if sample_format not in self.sample_formats:
+            raise ValueError(f"Unknown cache sample format: {sample_format}")
+        self.max_bytes = max_bytes
+        self.sample_format = sample_format
+        self._entries: OrderedDict[tuple, CachedSound] = OrderedDict()
+        self._pinned: set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+
+    def get(self, key: tuple) -> CachedSound | None:
+        with self._lock:
+            sound = self._entries.get(key)
+            if sound is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return sound
+
+    def put(self, key: tuple, data: np.ndarray, gain: float = 1.0) -> CachedSound:
+        """
+        Stores float audio in the configured sample format and evicts the least recently used sounds if needed.
+        The gain (e.g. the loudness normalization) is folded into the scale, so the samples aren't touched.
+        """
+        sound = self._compact(data)
+        sound.scale *= gain
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.resident_bytes -= old.nbytes
+            self._entries[key] = sound
+            self.resident_bytes += sound.nbytes
+            self._evict_to_fit()
+        return sound
+
+    def _compact(self, data: np.ndarray) -> CachedSound:
+        if self.sample_format == "int16":
+            samples = np.clip(data, -1.0, 1.0) * 32767
+            return CachedSound(samples.astype(np.int16), 1.0 / 32767)
+        return CachedSound(np.asarray(data, dtype=np.float32))
+
+    def _evict_to_fit(self):
+        # The newest entry always stays, even if it alone is bigger than the budget
+        if self.resident_bytes <= self.max_bytes:
+            return
+        newest = next(reversed(self._entries))
+        for key in list(self._entries):
+            if self.resident_bytes <= self.max_bytes:
+                break
+            if key == newest or key[0] in self._pinned:
+                continue
+            self.resident_bytes -= self._entries.pop(key).nbytes
+            self.evictions += 1
+
+    def pin(self, path: str):
+        with self._lock:
+            self._pinned.add(path)
+
+    def unpin(self, path: str):
+        with self._lock:
+            self._pinned.discard(path)
+            self._evict_to_fit()
+
+    def remove_path(self, path: str):
+        """Drops every entry of a file, whatever processing options it was cached with."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self.resident_bytes -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned),
+                "sample_format": self.sample_format,
+            }
@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+
+class AudioStateService(QObject):
+    """
+    Keeps an in-memory view of the audio server: default sink, default source, available microphones, the sample
+    rates of the sinks and loaded modules. A long-lived `pactl subscribe` process tells us when something changes, so reading the state never
+    needs a subprocess call.
+    """
+    default_sink_changed = Signal(str)
+    default_source_changed = Signal(str)
+    sources_changed = Signal(dict)#description -> technical name
+    modules_changed = Signal(list)
+
+    _event_pattern = re.compile(r"Event '(\w+)' on ([\w-]+) #(\d+)")
+    _rate_pattern = re.compile(r"(\d+)\s*Hz")
+    # Events that arrive within this time are handled with a single refresh
+    _debounce_seconds = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.default_sink = ""
+        self.default_source = ""
+        self.sources: dict[str, str] = {}
+        self.sink_rates: dict[str, int] = {}
+        self.modules: list[dict] = []
+        self._lock = threading.Lock()
+        self._process = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Reads the current state once and starts watching for changes. Does nothing if already running."""
+        if self._running:
+            return
+        self._running = True
+        self.refresh(server=True, sources=True, modules=True)
+        self._thread = threading.Thread(target=self._watch_loop, name="audio-state", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+
+    def get_sources(self) -> dict[str, str]:
+        with self._lock:
+            return dict(self.sources)
+
+    def get_sink_rate(self, sink: str) -> int | None:
+        """The native sample rate of a sink, or None if it isn't known."""
+        with self._lock:
+            return self.sink_rates.get(sink)
+
+    def get_modules(self) -> list[dict]:
+        with self._lock:
+            return list(self.modules)
+
+    def _watch_loop(self):
+        while self._running:
+            try:
+                # Unbuffered, select() only knows about what is still in the pipe and not about a Python buffer
+                self._process = subprocess.Popen(['pactl', 'subscribe'], stdout=subprocess.PIPE, bufsize=0)
+            except FileNotFoundError:
+                print("❌ Error: pactl not found. Audio devices won't be updated.")
+                return
+
+            # The subscription might have missed events while it wasn't running
+            self.refresh(server=True, sources=True, modules=True)
+            self._read_events(self._process)
+
+            if self._running:
+                print("Audio event stream ended. Restarting it...")
+                time.sleep(1)
+
+    def _read_events(self, process):
+        pending = set()
+        fd = process.stdout.fileno()
+        # pactl writes several events at once. Whatever came after the last newline waits for the next read.
+        partial = b""
+        while self._running:
+            timeout = self._debounce_seconds if pending else None
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                self.refresh(server="server" in pending or "sink" in pending,
+                             sources="source" in pending,
+                             modules="module" in pending)
+                pending.clear()
+                continue
+
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return
+            *lines, partial = (partial + chunk).split(b"\n")
+            for line in lines:
+                match = self._event_pattern.search(line.decode(errors="replace"))
+                if match and match.group(2) in ("server", "sink", "source", "module"):
+                    pending.add(match.group(2))
+
+    def refresh(self, server=False, sources=False, modules=False):
+        if server:
+            self._refresh_defaults()
+            self._refresh_sinks()
+        if sources:
+            self._refresh_sources()
+        if modules:
+            self._refresh_modules()
+
+    def _refresh_defaults(self):
+        info = self._pactl_json('info')
+        if not isinstance(info, dict):
+            return
+        sink = info.get("default_sink_name", "")
+        source = info.get("default_source_name", "")
+        with self._lock:
+            sink_changed = sink != self.default_sink
+            source_changed = source != self.default_source
+            self.default_sink = sink
+            self.default_source = source
+        if sink_changed:
+            self.default_sink_changed.emit(sink)
+        if source_changed:
+            self.default_source_changed.emit(source)
+
+    def _refresh_sources(self):
+        sources = self._pactl_json('list', 'sources')
+        if sources is None:
+            return
+
+        # Map of Description -> Technical Name
+        device_map = {}
+        for s in sources:
+            name = s.get("name", "")
+            # Get the best available description
+            description = s.get("description") or s.get("properties", {}).get("device.description") or name
+
+            # Filter logic
+            if ".monitor" in name or name == "hijacked_mic":
+                continue
+
+            # PulseAudio JSON structure puts device.class inside 'properties'
+            props = s.get("properties", {})
+            device_class = props.get("device.class")
+            media_class = props.get("media.class")
+
+            if device_class == "sound" or media_class == "Audio/Source":
+                device_map[description] = name
+
+        with self._lock:
+            changed = device_map != self.sources
+            self.sources = device_map
+        if changed:
+            self.sources_changed.emit(dict(device_map))
+
+    def _refresh_sinks(self):
+        sinks = self._pactl_json('list', 'sinks')
+        if sinks is None:
+            return
+        rates = {}
+        for s in sinks:
+            # e.g. "float32le 2ch 48000Hz"
+            match = self._rate_pattern.search(s.get("sample_specification", ""))
+            if match:
+                rates[s.get("name", "")] = int(match.group(1))
+        with self._lock:
+            self.sink_rates = rates
+
+    def _refresh_modules(self):
+        modules = self._pactl_json('list', 'modules')
+        if modules is None:
+            return
+        with self._lock:
+            self.modules = modules
+        self.modules_changed.emit(list(modules))
+
+    @staticmethod
+    def _pactl_json(*args):
+        try:
+            result = subprocess.run(['pactl', '--format=json', *args], capture_output=True, text=True, check=True)
+            return json.loads(result.stdout)
+        except Exception as e:
+            print(f"Error reading audio state ({' '.join(args)}): {e}")
+            return None
+
+
+audio_state = AudioStateService()
@@ -0,0 +1,131 @@
+import json
+import os
+import shlex
+import socket
+import threading
+from pathlib import Path
+
+from service.settings_service import settings_service
+
+
+def socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "linux-soundboard.sock"
+    return settings_service.settings_path / "daemon.sock"
+
+
+class DaemonError(Exception):
+    """The daemon answered a command with an error."""
+
+
+class DaemonClient:
+    """
+    One connection to the soundboard daemon (main.py --daemon). The protocol is described in SoundboardDaemon.
+    Offers the playback calls of SoundboardHijacker the UI uses, so the window can play through the daemon
+    instead of its own soundboard (see player_service).
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._socket = None
+        self._reader = None
+        # One command and its reply at a time, the UI calls from several threads
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._socket is not None
+
+    def connect(self, timeout: float = 1.0) -> bool:
+        """False if no daemon is listening."""
+        self.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(self.path))
+        except OSError:
+            sock.close()
+            return False
+        # A cold play decodes before it replies
+        sock.settimeout(30)
+        self._socket = sock
+        self._reader = sock.makefile("r", encoding="utf-8", newline="\n")
+        return True
+
+    def close(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None
+            self._reader = None
+
+    def pipeline(self, commands: list[str]) -> list[str]:
+        """Sends all commands at once and then reads their replies. The replies are returned as they came."""
+        with self._lock:
+            if self._socket is None and not self.connect():
+                raise DaemonError(f"No soundboard daemon at {self.path}")
+            try:
+                self._socket.sendall("".join(f"{command}\n" for command in commands).encode())
+                replies = [self._reader.readline().rstrip("\n") for _ in commands]
+            except OSError as e:
+                self.close()
+                raise DaemonError(f"Connection to the daemon lost: {e}")
+            if any(not reply for reply in replies):
+                self.close()
+                raise DaemonError("Connection to the daemon lost")
+            return replies
+
+    def request(self, command: str) -> str:
+        """Sends one command and returns what came after "ok". Raises DaemonError for "err"."""
+        reply = self.pipeline([command])[0]
+        status, _, value = reply.partition(" ")
+        if status != "ok":
+            raise DaemonError(value)
+        return value
+
+    def play(self, effect) -> int | None:
+        voice_id = self._send(f"play {shlex.quote(str(effect.mp3_path))} {effect.volume}", effect.name)
+        return int(voice_id) if voice_id is not None else None
+
+    def stop(self, voice_id: int = None):
+        self._send("stop" if voice_id is None else f"stop {voice_id}")
+
+    def set_volume(self, volume: float):
+        self._send(f"volume {volume}")
+
+    def start_mic_switch(self):
+        self._send(f"mic {shlex.quote(settings_service.settings['output_device'])}")
+
+    def reload_hotkeys(self):
+        self._send("hotkeys")
+
+    def _send(self, command: str, name: str = "") -> str | None:
+        """request() for the calls of the UI, which print errors instead of raising them like the soundboard does."""
+        try:
+            return self.request(command)
+        except DaemonError as e:
+            print(f"❌ Daemon error{f' for {name}' if name else ''}: {e}")
+            return None
+
+    def list(self) -> list[dict]:
+        return json.loads(self.request("list"))
+
+    def stats(self) -> dict:
+        return json.loads(self.request("stats"))
+
+    @property
+    def setup_state(self) -> str:
+        try:
+            return self.stats()["setup_state"]
+        except DaemonError:
+            return "failed"
+
+    @property
+    def setup_error(self) -> str:
+        try:
+            return self.stats()["setup_error"]
+        except DaemonError as e:
+            return str(e)
+
+
+daemon_client = DaemonClient(socket_path())
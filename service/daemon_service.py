@@ -0,0 +1,249 @@
+import json
+import os
+import selectors
+import shlex
+import socket
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from model.sound_effect import SoundEffect
+from service.settings_service import settings_service
+from service.pipewire_hijack_service import sb
+from service.library_index_service import library_index
+from service.sounds_service import sound_service
+from service.hotkey_service import hotkey_service
+from service.signal_service import signals
+from service.trace_service import tracer
+
+
+class SoundboardDaemon:
+    """
+    Serves the soundboard on a Unix socket when it runs without a window (main.py --daemon).
+    The protocol is line based UTF-8. Every command is one line, arguments are split like a shell does
+    (paths with spaces are quoted), and every command gets exactly one reply line, in the order they were sent:
+        play <id|name|path> [volume]   ok <voice id>           without a volume the sound plays at its own
+        stop [voice id]                ok
+        volume <volume>                ok
+        mic [device]                   ok                      switches the mic, without a device to the default
+        list                           ok [{"id", "name", "path"}, ...]
+        stats                          ok {...}                SoundboardHijacker.stats(), the dispatch times and
+                                                               the timings of the recent plays (tracer.recent())
+        hotkeys                        ok                      reads the hotkey bindings again
+        ping                           ok pong
+    Errors are "err <message>". Ids are positions in the sound list. A client may send any number of commands
+    without waiting for the replies, e.g. printf 'play airhorn\n' | socat - UNIX-CONNECT:<socket>
+    One thread serves all connections. Commands run right there, so playing a cached sound is answered in well under
+    a millisecond. The replies to everything that arrived in one read go out in one write.
+    """
+    _dispatch_history = 1024
+    # A client that sends a longer line without a newline is disconnected
+    _max_line = 65536
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._server = None
+        self._selector = None
+        self._thread = None
+        self._shutdown = threading.Event()
+        self._buffers: dict[socket.socket, bytes] = {}
+        # Snapshots of the sound list for the daemon thread, see _index_sounds
+        self._sounds: tuple[SoundEffect, ...] = ()
+        self._by_name: dict[str, SoundEffect] = {}
+        self._by_path: dict[str, SoundEffect] = {}
+        self.commands = 0
+        self._dispatch_ns = deque(maxlen=self._dispatch_history)
+        self._handlers = {
+            "play": self._play,
+            "stop": self._stop_sound,
+            "volume": self._volume,
+            "mic": self._mic,
+            "list": self._list,
+            "stats": self._stats,
+            "hotkeys": self._hotkeys,
+            "ping": lambda args: "pong",
+        }
+        signals.sounds_list_changed.connect(self._index_sounds)
+        signals.sounds_list_diff.connect(lambda *_: self._index_sounds(sound_service.sounds_list))
+
+    def start(self) -> bool:
+        """Starts listening. False if another daemon is listening on the socket already."""
+        if self.path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.path))
+                return False
+            except OSError:
+                # Left behind by a daemon that crashed
+                self.path.unlink(missing_ok=True)
+            finally:
+                probe.close()
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(str(self.path))
+        # Only this user may play sounds into the mic
+        os.chmod(self.path, 0o600)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._shutdown.clear()
+        self._thread = threading.Thread(target=self._run, name="daemon", daemon=True)
+        self._thread.start()
+        print(f"🔌 Daemon listening on {self.path}")
+        return True
+
+    def stop(self):
+        self._shutdown.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._server is not None:
+            for conn in list(self._buffers):
+                self._drop(conn)
+            self._selector.close()
+            self._server.close()
+            self._server = None
+            self.path.unlink(missing_ok=True)
+
+    def _run(self):
+        while not self._shutdown.is_set():
+            for key, _ in self._selector.select(timeout=0.5):
+                if key.fileobj is self._server:
+                    self._accept()
+                else:
+                    self._serve(key.fileobj)
+
+    def _accept(self):
+        try:
+            conn, _ = self._server.accept()
+        except OSError:
+            return
+        # Blocking with a timeout, so a client that doesn't read its replies can't hold up the others for long
+        conn.settimeout(1.0)
+        self._buffers[conn] = b""
+        self._selector.register(conn, selectors.EVENT_READ)
+
+    def _drop(self, conn: socket.socket):
+        self._buffers.pop(conn, None)
+        try:
+            self._selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+    def _serve(self, conn: socket.socket):
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        *lines, rest = (self._buffers[conn] + data).split(b"\n")
+        if len(rest) > self._max_line:
+            self._drop(conn)
+            return
+        self._buffers[conn] = rest
+        if not lines:
+            return
+        replies = "".join(f"{self.dispatch(line.decode('utf-8', 'replace'))}\n" for line in lines)
+        try:
+            conn.sendall(replies.encode())
+        except OSError:
+            self._drop(conn)
+
+    def dispatch(self, line: str) -> str:
+        """Runs one command line and returns its reply line."""
+        start = time.perf_counter_ns()
+        try:
+            name, *args = shlex.split(line)
+            handler = self._handlers.get(name)
+            if handler is None:
+                raise ValueError(f"Unknown command: {name}")
+            value = handler(args)
+            reply = f"ok {value}" if value else "ok"
+        except Exception as e:
+            # e.g. shlex.split() of an empty line leaves nothing to unpack
+            message = str(e) or type(e).__name__
+            reply = "err " + message.replace("\n", " ")
+        self.commands += 1
+        self._dispatch_ns.append(time.perf_counter_ns() - start)
+        return reply
+
+    def _index_sounds(self, sounds: list[SoundEffect]):
+        # Runs on the GUI thread. Replaced in one go, the daemon thread only reads these and never sounds_list.
+        self._sounds = tuple(sounds)
+        self._by_name = {sound.name.casefold(): sound for sound in self._sounds}
+        self._by_path = {str(sound.mp3_path): sound for sound in self._sounds}
+
+    def _find(self, key: str) -> SoundEffect:
+        """A sound given by id, name or path."""
+        if key.isdigit():
+            sounds = self._sounds
+            if int(key) >= len(sounds):
+                raise ValueError(f"No sound with id {key}")
+            return sounds[int(key)]
+        sound = self._by_name.get(key.casefold()) or self._by_path.get(key)
+        if sound is not None:
+            return sound
+        path = Path(key).expanduser()
+        if path.is_file():
+            return SoundEffect(path)
+        raise ValueError(f"No sound named {key}")
+
+    def _play(self, args: list[str]) -> str:
+        if not 1 <= len(args) <= 2:
+            raise ValueError("Usage: play <id|name|path> [volume]")
+        sound = self._find(args[0])
+        # Volume and effects are read from the index every time, a client may have changed them
+        row = library_index.get(sound.mp3_path)
+        volume = row["volume"] if row is not None else sound.volume
+        effects = json.loads(row["effects"]) if row is not None and row["effects"] else []
+        if len(args) > 1:
+            volume = float(args[1])
+        voice_id = sb.play(SoundEffect(sound.mp3_path, sound.name, volume, effects=effects))
+        if voice_id is None:
+            raise ValueError(f"Could not play {sound.name}")
+        return str(voice_id)
+
+    def _stop_sound(self, args: list[str]) -> str:
+        if len(args) > 1:
+            raise ValueError("Usage: stop [voice id]")
+        sb.stop(int(args[0]) if args else None)
+        return ""
+
+    def _volume(self, args: list[str]) -> str:
+        if len(args) != 1 or float(args[0]) < 0:
+            raise ValueError("Usage: volume <volume>, 1.0 is 100%")
+        sb.set_volume(float(args[0]))
+        return ""
+
+    def _mic(self, args: list[str]) -> str:
+        if len(args) > 1:
+            raise ValueError("Usage: mic [device]")
+        settings_service.settings["output_device"] = args[0] if args else ""
+        sb.start_mic_switch()
+        return ""
+
+    def _list(self, args: list[str]) -> str:
+        return json.dumps([{"id": i, "name": sound.name, "path": str(sound.mp3_path)}
+                           for i, sound in enumerate(self._sounds)], ensure_ascii=False)
+
+    def _stats(self, args: list[str]) -> str:
+        stats = sb.stats()
+        dispatch = sorted(self._dispatch_ns)
+        stats["daemon"] = {
+            "commands": self.commands,
+            "clients": len(self._buffers),
+            "dispatch_us": {p: dispatch[min(len(dispatch) - 1, len(dispatch) * p // 100)] / 1000
+                            for p in (50, 99)} if dispatch else {},
+        }
+        stats["hotkeys"] = hotkey_service.latency_stats()
+        stats["traces"] = tracer.recent()
+        return json.dumps(stats)
+
+    def _hotkeys(self, args: list[str]) -> str:
+        hotkey_service.reload()
+        return ""
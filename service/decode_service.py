@@ -0,0 +1,260 @@
+import queue
+import threading
+from functools import lru_cache
+from math import gcd
+from pathlib import Path
+
+import numpy as np
+
+from service.trace_service import tracer
+
+# Windowed-sinc settings per quality: (zero crossings on each side of the kernel, Kaiser window beta)
+# "linear" is plain linear interpolation. It is the fastest, but lets through some aliasing.
+resample_qualities = {
+    "linear": None,
+    "medium": (16, 6.0),
+    "high": (32, 8.6),
+}
+
+# Fractional positions between two input samples that get their own precomputed filter
+_max_phases = 1024
+# Output samples computed at once. Bounds the memory of the gathered input windows.
+_chunk_size = 16384
+
+
+def decode_sound(path: Path, sample_rate: int, quality: str = "medium") -> np.ndarray:
+    """
+    Decodes a sound file into a float32 mono buffer at the given sample rate.
+    The level isn't touched. Playback applies the gain from the loudness analysis instead.
+    """
+    # Only imported when the first sound is decoded. libsndfile isn't needed to show the window.
+    import soundfile as sf
+    with tracer.span("read file"):
+        data, fs = sf.read(str(path), dtype='float32')
+
+    # Convert to mono
+    with tracer.span("downmix"):
+        if len(data.shape) > 1:
+            data = np.mean(data, axis=1, dtype=np.float32)
+
+    with tracer.span("resample"):
+        return resample(data, fs, sample_rate, quality).astype(np.float32, copy=False)
+
+
+class StreamDecoder:
+    """
+    Decodes a long file block by block on its own thread, for sounds too big to be decoded up front.
+    Every block is read, downmixed, resampled and run through the effect chain (see effects_service) on its own.
+    At most max_blocks processed blocks wait in the queue, so the memory use doesn't depend on the length of the file.
+    """
+    def __init__(self, path: Path, sample_rate: int, quality: str = "medium", block_frames: int = 8192,
+                 max_blocks: int = 16, effects: list[dict] = ()):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.quality = quality
+        self.block_frames = block_frames
+        self.effects = list(effects)
+        self._blocks = queue.Queue(maxsize=max_blocks)
+        self._closed = threading.Event()
+        self._ready = threading.Event()
+        # Playback starts once this much audio is decoded. The mix thread fills the empty output pipes in a burst
+        # at first (64 KiB, about a third of a second), so a single block would run out right away.
+        self._prebuffer = int(sample_rate * 0.4)
+        self._buffered = 0
+        self._done = False
+        self.error: Exception | None = None
+        # Times the mixer wanted a block that wasn't decoded yet
+        self.starved = 0
+        self._thread = threading.Thread(target=self._run, name="stream-decode", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import soundfile as sf
+        from service.effects_service import EffectChain
+        try:
+            with sf.SoundFile(str(self.path)) as f:
+                resampler = StreamResampler(f.samplerate, self.sample_rate, self.quality)
+                # The length after resampling is known from the header. Fade-outs need it.
+                length = int(round(f.frames * self.sample_rate / f.samplerate))
+                chain = EffectChain(self.effects, self.sample_rate, length, self.quality)
+                for block in f.blocks(self.block_frames, dtype='float32', always_2d=True):
+                    if self._closed.is_set():
+                        return
+                    mono = block[:, 0] if block.shape[1] == 1 else np.mean(block, axis=1, dtype=np.float32)
+                    self._put(chain.process(resampler.process(mono)))
+                self._put(chain.process(resampler.flush()))
+                self._put(chain.flush())
+        except Exception as e:
+            self.error = e
+            print(f"❌ Error while streaming {self.path}: {e}")
+        finally:
+            self._put(None)
+
+    def _put(self, block: np.ndarray | None):
+        # Empty blocks happen while the resampler fills its window. The mixer doesn't need them.
+        if block is not None and not len(block):
+            return
+        while not self._closed.is_set():
+            try:
+                self._blocks.put(block, timeout=0.1)
+                if not self._ready.is_set():
+                    self._buffered += len(block) if block is not None else self._prebuffer
+                    if self._buffered >= self._prebuffer or self._blocks.full():
+                        self._ready.set()
+                return
+            except queue.Full:
+                continue
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Waits until the start (or the whole file, if it is shorter) is decoded, so playback doesn't start with a gap."""
+        return self._ready.wait(timeout)
+
+    def next_block(self) -> np.ndarray | None:
+        """The next decoded block, or None if there is none right now or the file ended (see finished)."""
+        if self._done:
+            return None
+        try:
+            block = self._blocks.get_nowait()
+        except queue.Empty:
+            self.starved += 1
+            return None
+        if block is None:
+            self._done = True
+        return block
+
+    @property
+    def finished(self) -> bool:
+        return self._done
+
+    def close(self):
+        """Stops decoding, e.g. because the voice was stopped. The thread ends within a tenth of a second."""
+        self._closed.set()
+
+
+def resample(data: np.ndarray, source_rate: int, target_rate: int, quality: str = "medium") -> np.ndarray:
+    """Converts a mono buffer to another sample rate so every voice can share the same output streams."""
+    if quality not in resample_qualities:
+        raise ValueError(f"Unknown resample quality: {quality}")
+    if source_rate == target_rate or len(data) == 0:
+        return data
+    if resample_qualities[quality] is None:
+        return resample_linear(data, source_rate, target_rate)
+    zero_crossings, beta = resample_qualities[quality]
+    return resample_sinc(data, source_rate, target_rate, zero_crossings, beta)
+
+
+def resample_linear(data: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    if source_rate == target_rate or len(data) == 0:
+        return data
+    target_length = int(round(len(data) * target_rate / source_rate))
+    source_positions = np.arange(target_length) * (source_rate / target_rate)
+    return np.interp(source_positions, np.arange(len(data)), data)
+
+
+def resample_sinc(data: np.ndarray, source_rate: int, target_rate: int, zero_crossings: int, beta: float) -> np.ndarray:
+    """
+    Band-limited polyphase resampling with a Kaiser-windowed sinc.
+    The rates are reduced to up/down, so output sample n lies at input position n * down / up. Its integer part picks
+    the input window and its fraction picks one of the precomputed filters. Each chunk of output samples is then a
+    single gather and a row-wise dot product.
+    """
+    up, down, table = _polyphase_filter(source_rate, target_rate, zero_crossings, beta)
+    half = table.shape[1] // 2
+
+    data = np.asarray(data, dtype=np.float32)
+    padded = np.concatenate([np.zeros(half, dtype=np.float32), data, np.zeros(half + 1, dtype=np.float32)])
+    out = np.empty(int(round(len(data) * up / down)), dtype=np.float32)
+    _polyphase(padded, -half, 0, out, up, down, table)
+    return out
+
+
+def _polyphase_filter(source_rate: int, target_rate: int, zero_crossings: int, beta: float):
+    """Returns (up, down, phase table) for converting between two rates."""
+    divisor = gcd(source_rate, target_rate)
+    up = target_rate // divisor
+    down = source_rate // divisor
+    # When going down in rate, the filter has to cut below the new Nyquist frequency
+    cutoff = min(1.0, up / down)
+    return up, down, _sinc_table(min(up, _max_phases), zero_crossings, cutoff, beta)
+
+
+def _polyphase(buffer: np.ndarray, origin: int, first: int, out: np.ndarray, up: int, down: int, table: np.ndarray):
+    """
+    Computes the output samples first ... first + len(out) into out.
+    buffer[0] is input sample number origin. It has to hold every input sample the windows of these outputs touch.
+    """
+    phases, taps = table.shape
+    half = taps // 2
+    offsets = np.arange(taps)
+    for start in range(0, len(out), _chunk_size):
+        positions = np.arange(first + start, first + min(start + _chunk_size, len(out)), dtype=np.int64) * down
+        index = positions // up
+        phase = (positions % up) * phases // up
+        # Input samples index - half + 1 ... index + half
+        windows = buffer[index[:, None] - half + 1 - origin + offsets]
+        np.einsum('ij,ij->i', windows, table[phase], out=out[start:start + len(index)])
+
+
+class StreamResampler:
+    """
+    The resampler for audio that arrives in blocks. Gives the same samples as resample() on the whole buffer
+    (linear interpolation fades the very last sample to zero instead of holding it), but only keeps the input
+    that the next windows still need.
+    """
+    def __init__(self, source_rate: int, target_rate: int, quality: str = "medium", kernel: tuple = None):
+        """kernel is a (zero crossings, Kaiser beta) pair that replaces the filter of the quality."""
+        if quality not in resample_qualities:
+            raise ValueError(f"Unknown resample quality: {quality}")
+        self.passthrough = source_rate == target_rate
+        # Linear interpolation is a 2-tap filter in the same scheme
+        kernel = kernel or resample_qualities[quality]
+        zero_crossings, beta = kernel or (1, 0.0)
+        self.up, self.down, self.table = _polyphase_filter(source_rate, target_rate, zero_crossings, beta)
+        if kernel is None:
+            phases = min(self.up, _max_phases)
+            fraction = (np.arange(phases) / phases).astype(np.float32)
+            self.table = np.stack([1 - fraction, fraction], axis=1)
+        self.half = self.table.shape[1] // 2
+        self._buffer = np.zeros(self.half, dtype=np.float32)
+        self._origin = -self.half
+        self._consumed = 0#input samples seen
+        self._produced = 0#output samples computed
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self.passthrough:
+            return block
+        self._consumed += len(block)
+        self._buffer = np.concatenate([self._buffer, block.astype(np.float32, copy=False)])
+        # Output n needs the input up to n * down // up + half
+        last_index = self._origin + len(self._buffer) - 1 - self.half
+        return self._render(((last_index + 1) * self.up + self.down - 1) // self.down if last_index >= 0 else 0)
+
+    def flush(self) -> np.ndarray:
+        """Returns the rest of the output once all input was processed."""
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.half + 1, dtype=np.float32)])
+        return self._render(int(round(self._consumed * self.up / self.down)))
+
+    def _render(self, end: int) -> np.ndarray:
+        out = np.empty(max(0, end - self._produced), dtype=np.float32)
+        _polyphase(self._buffer, self._origin, self._produced, out, self.up, self.down, self.table)
+        self._produced += len(out)
+        # Drop the input no later window reaches
+        drop = self._produced * self.down // self.up - self.half + 1 - self._origin
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._origin += drop
+        return out
+
+
+@lru_cache(maxsize=16)
+def _sinc_table(phases: int, zero_crossings: int, cutoff: float, beta: float) -> np.ndarray:
+    """One row of filter weights per fractional position. Rows are normalized so a constant signal stays the same."""
+    half = int(np.ceil(zero_crossings / cutoff))
+    # Distance of every tap to the wanted position, for every phase
+    distance = (np.arange(2 * half) - half + 1)[None, :] - (np.arange(phases) / phases)[:, None]
+    window = np.i0(beta * np.sqrt(np.clip(1 - (distance / half) ** 2, 0, None))) / np.i0(beta)
+    table = cutoff * np.sinc(cutoff * distance) * window
+    table /= table.sum(axis=1, keepdims=True)
+    return table.astype(np.float32)
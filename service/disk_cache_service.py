@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from service.decode_service import decode_sound
+from service.settings_service import settings_service
+from service.trace_service import tracer
+
+
+class DiskAudioCache:
+    """
+    Keeps decoded float32 mono buffers on disk as .npy files so they can be memory-mapped after a restart.
+    Entries are keyed by path, mtime, size, sample rate and resample quality. If a file changes, its old entry is evicted.
+    The least recently used entries are evicted when the cache grows over its size cap.
+    The index is kept in least recently used order, and written to index.json a moment after it changed,
+    so a burst of puts (e.g. pre-decoding the library) writes it once. flush() writes it right away.
+    """
+    # Bump this when the processing in decode_sound changes so old entries are not reused
+    format_version = 3
+    # Changes within this time are written to index.json together
+    _save_delay = 2.0
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = cache_dir / "index.json"
+        self._lock = threading.Lock()
+        self._loading_locks: dict[str, threading.Lock] = {}
+        # Only one thread writes index.json at a time, without holding _lock
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self._load_index()
+        entries = self.index["entries"]
+        # Oldest first, get() moves an entry to the end
+        self.index["entries"] = {k: entries[k] for k in sorted(entries, key=lambda k: entries[k]["last_used"])}
+        self._key_by_path = {e["path"]: k for k, e in self.index["entries"].items()}
+        self._total_bytes = sum(e["bytes"] for e in self.index["entries"].values())
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("version") == self.format_version:
+                return index
+            print("Audio cache format changed. Clearing it...")
+        except (OSError, ValueError):
+            pass
+        self._clear_files()
+        return {"version": self.format_version, "entries": {}}
+
+    def _clear_files(self):
+        for file in self.cache_dir.glob("*.npy"):
+            file.unlink(missing_ok=True)
+
+    def _schedule_save(self):
+        """Called with _lock held after the index changed."""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self._save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes index.json if it changed. The entries are copied under the lock and written outside of it."""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is None:
+                    return
+                self._save_timer.cancel()
+                self._save_timer = None
+                index = {"version": self.index["version"],
+                         "entries": {k: dict(e) for k, e in self.index["entries"].items()}}
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+
+    def _make_key(self, path: Path, sample_rate: int, quality: str) -> str | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        raw = f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{sample_rate}|{quality}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _file_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def get(self, path: Path, sample_rate: int, quality: str = "medium") -> np.ndarray | None:
+        """Returns a read-only memory map of the cached buffer, or None if there is no valid entry."""
+        key = self._make_key(path, sample_rate, quality)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self.index["entries"].get(key)
+            if entry is None:
+                return None
+            try:
+                data = np.load(self._file_for(key), mmap_mode='r')
+            except (OSError, ValueError):
+                self._remove_entry(key)
+                return None
+            entry["last_used"] = time.time()
+            # Most recently used last
+            self.index["entries"][key] = self.index["entries"].pop(key)
+            self._schedule_save()
+            return data
+
+    def put(self, path: Path, sample_rate: int, data: np.ndarray, quality: str = "medium"):
+        key = self._make_key(path, sample_rate, quality)
+        if key is None:
+            return
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        file = self._file_for(key)
+        # Written before taking the lock, get() of other sounds doesn't wait for the disk
+        tmp_file = file.with_name(f"{key}.partial.{threading.get_ident()}.npy")
+        np.save(tmp_file, data)
+        size = tmp_file.stat().st_size
+        resolved = str(path.resolve())
+        with self._lock:
+            os.replace(tmp_file, file)
+
+            # Anything else cached for this path is stale now
+            old_key = self._key_by_path.get(resolved)
+            if old_key is not None and old_key != key:
+                self._remove_entry(old_key)
+
+            self._remove_entry(key, keep_file=True)
+            self.index["entries"][key] = {
+                "path": resolved,
+                "bytes": size,
+                "last_used": time.time(),
+            }
+            self._key_by_path[resolved] = key
+            self._total_bytes += size
+            self._evict_to_fit()
+            self._schedule_save()
+
+    def load(self, path: Path, sample_rate: int, quality: str = "medium") -> np.ndarray:
+        """
+        Returns the cached buffer for a sound, decoding and storing it first if needed.
+        If another thread is already decoding the same file, this waits for its result instead of decoding twice.
+        """
+        with tracer.span("disk cache lookup"):
+            data = self.get(path, sample_rate, quality)
+        if data is not None:
+            return data
+
+        with self._loading_lock_for(path):
+            data = self.get(path, sample_rate, quality)
+            if data is not None:
+                return data
+            with tracer.span("decode"):
+                data = decode_sound(path, sample_rate, quality)
+            try:
+                with tracer.span("disk cache write"):
+                    self.put(path, sample_rate, data, quality)
+            except OSError as e:
+                print(f"Could not write audio cache for {path}: {e}")
+            return data
+
+    def contains(self, path: Path, sample_rate: int, quality: str = "medium") -> bool:
+        key = self._make_key(path, sample_rate, quality)
+        with self._lock:
+            return key is not None and key in self.index["entries"]
+
+    def _loading_lock_for(self, path: Path) -> threading.Lock:
+        with self._lock:
+            return self._loading_locks.setdefault(str(path), threading.Lock())
+
+    def _remove_entry(self, key: str, keep_file: bool = False):
+        entry = self.index["entries"].pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["bytes"]
+            if self._key_by_path.get(entry["path"]) == key:
+                del self._key_by_path[entry["path"]]
+        if not keep_file:
+            self._file_for(key).unlink(missing_ok=True)
+
+    def _evict_to_fit(self):
+        # The entries are in least recently used order
+        entries = self.index["entries"]
+        while self._total_bytes > self.max_bytes and entries:
+            self._remove_entry(next(iter(entries)))
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            self._clear_files()
+            self.index = {"version": self.format_version, "entries": {}}
+            self._key_by_path.clear()
+            self._total_bytes = 0
+            self._schedule_save()
+        self.flush()
+
+
+disk_cache = DiskAudioCache(settings_service.settings_path / "audio_cache",
+                            settings_service.settings["disk_cache_max_mb"] * 1024 * 1024)
@@ -0,0 +1,435 @@
+import hashlib
+import json
+from fractions import Fraction
+
+import numpy as np
+
+from service.decode_service import StreamResampler
+
+_empty = np.zeros(0, dtype=np.float32)
+# Samples a whole buffer is processed in by EffectChain.render(), like the blocks of a stream
+_render_block = 65536
+# Stopband attenuation of the FIR filters in dB
+_filter_attenuation = 60.0
+_max_filter_taps = 8191
+
+
+class Effect:
+    """
+    One stage of an effect chain. It gets the blocks of one sound in order and carries whatever has to continue
+    from one block to the next (filter history, fade position, ...). flush() returns what is still held back at the end.
+    length is the number of frames this stage will get in total, if it is known.
+    """
+    def __init__(self, sample_rate: int, length: int | None, quality: str):
+        self.sample_rate = sample_rate
+        self.length = length
+        self.quality = quality
+
+    def output_length(self, length: int) -> int:
+        """How many frames come out of the stage for length frames going in."""
+        return length
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def flush(self) -> np.ndarray:
+        return _empty
+
+
+class Gain(Effect):
+    def __init__(self, sample_rate, length, quality, db: float):
+        super().__init__(sample_rate, length, quality)
+        self.factor = np.float32(10 ** (db / 20))
+
+    def process(self, block):
+        return block * self.factor
+
+
+class FadeIn(Effect):
+    def __init__(self, sample_rate, length, quality, ms: float):
+        super().__init__(sample_rate, length, quality)
+        if ms < 0:
+            raise ValueError(f"Fade length can't be negative, not {ms}")
+        self.frames = max(1, int(sample_rate * ms / 1000))
+        self.position = 0
+
+    def process(self, block):
+        start = self.position
+        self.position += len(block)
+        if start >= self.frames:
+            return block
+        ramp = np.minimum((np.arange(start, start + len(block), dtype=np.float32) + 1) / self.frames, 1)
+        return block * ramp
+
+
+class FadeOut(Effect):
+    """Needs the length of the sound. Streams get it from the file header, see EffectChain."""
+    def __init__(self, sample_rate, length, quality, ms: float):
+        super().__init__(sample_rate, length, quality)
+        if ms < 0:
+            raise ValueError(f"Fade length can't be negative, not {ms}")
+        self.frames = max(1, int(sample_rate * ms / 1000))
+        self.position = 0
+
+    def process(self, block):
+        start = self.position
+        self.position += len(block)
+        if self.length is None or self.position <= self.length - self.frames:
+            return block
+        remaining = self.length - np.arange(start, start + len(block), dtype=np.float32)
+        return block * np.clip(remaining / self.frames, 0, 1)
+
+
+class NoisePrefix(Effect):
+    """Puts a short burst of quiet noise in front of the sound, e.g. so noise suppression (Krisp) lets it through."""
+    def __init__(self, sample_rate, length, quality, ms: float = 100.0, level: float = 0.005):
+        super().__init__(sample_rate, length, quality)
+        if ms < 0:
+            raise ValueError(f"Noise length can't be negative, not {ms}")
+        if level < 0:
+            raise ValueError(f"Noise level can't be negative, not {level}")
+        self.frames = int(sample_rate * ms / 1000)
+        self.level = level
+        self._pending = True
+
+    def output_length(self, length):
+        return length + self.frames
+
+    def _noise(self) -> np.ndarray:
+        self._pending = False
+        return np.random.normal(0, self.level, self.frames).astype(np.float32)
+
+    def process(self, block):
+        if self._pending:
+            return np.concatenate([self._noise(), block])
+        return block
+
+    def flush(self):
+        # A sound without samples still gets its noise
+        return self._noise() if self._pending else _empty
+
+
+class _FirFilter(Effect):
+    """
+    Linear-phase FIR filter (Kaiser-windowed sinc), applied by FFT convolution (overlap-save).
+    The input is cut into segments of a fixed size counted from the start of the sound, whatever the blocks are,
+    so a stream gives exactly the samples of the rendered buffer. What doesn't fill a segment yet is carried over.
+    The delay of the filter is removed, so the output lines up with the input and has the same length.
+    A cutoff too close to the Nyquist frequency of the output rate is lowered to the highest one the filter can do.
+    The output rate follows the speakers, so a chain that was made at 48 kHz still plays on a 44.1 kHz sink.
+    """
+    def __init__(self, sample_rate, length, quality, hz: float):
+        super().__init__(sample_rate, length, quality)
+        nyquist = sample_rate / 2
+        if hz < 10:
+            raise ValueError(f"Cutoff has to be at least 10 Hz, not {hz}")
+        hz = min(hz, self.max_cutoff(sample_rate))
+        # Transition band of half the distance to the nearest edge, so low cutoffs stay steep
+        width = max(min(hz, nyquist - hz) / 2, 5.0)
+        taps = int(np.ceil((_filter_attenuation - 8) / (2.285 * 2 * np.pi * width / sample_rate)))
+        taps = min(taps, _max_filter_taps) | 1
+        beta = 0.1102 * (_filter_attenuation - 8.7)
+        n = np.arange(taps) - taps // 2
+        kernel = 2 * hz / sample_rate * np.sinc(2 * hz / sample_rate * n) * np.kaiser(taps, beta)
+        kernel /= kernel.sum()
+        self.taps = taps
+        self._size = max(4096, 1 << (2 * taps - 1).bit_length())
+        self._step = self._size - (taps - 1)
+        self._spectrum = np.fft.rfft(self._shape(kernel), self._size)
+        # Input not filtered yet, after the taps - 1 samples the next output still reaches back to
+        self._signal = np.zeros(taps - 1, dtype=np.float32)
+        self._consumed = 0
+        self._produced = 0
+        self._skip = taps // 2
+
+    @staticmethod
+    def max_cutoff(sample_rate: int) -> float:
+        return sample_rate / 2 * 0.95
+
+    @staticmethod
+    def _shape(lowpass: np.ndarray) -> np.ndarray:
+        return lowpass
+
+    def _filter_segments(self) -> np.ndarray:
+        count = (len(self._signal) - (self.taps - 1)) // self._step
+        if count <= 0:
+            return _empty
+        # All complete segments at once, one row each
+        starts = np.arange(count) * self._step
+        segments = self._signal[starts[:, None] + np.arange(self._size)]
+        out = np.fft.irfft(np.fft.rfft(segments, axis=1) * self._spectrum, self._size, axis=1)
+        self._signal = self._signal[count * self._step:]
+        return out[:, self.taps - 1:].astype(np.float32).ravel()
+
+    def _emit(self, out: np.ndarray) -> np.ndarray:
+        if self._skip:
+            skipped = min(self._skip, len(out))
+            self._skip -= skipped
+            out = out[skipped:]
+        self._produced += len(out)
+        return out
+
+    def process(self, block):
+        self._consumed += len(block)
+        self._signal = np.concatenate([self._signal, block.astype(np.float32, copy=False)])
+        return self._emit(self._filter_segments())
+
+    def flush(self):
+        # The delayed tail of the input, then zeros up to the end of the last segment
+        missing = self.taps // 2 + self._step
+        self._signal = np.concatenate([self._signal, np.zeros(missing, dtype=np.float32)])
+        out = self._emit(self._filter_segments())
+        over = self._produced - self._consumed
+        self._produced -= max(over, 0)
+        return out[:len(out) - over] if over > 0 else out
+
+
+class LowPass(_FirFilter):
+    pass
+
+
+class HighPass(_FirFilter):
+    @staticmethod
+    def _shape(lowpass):
+        # Spectral inversion: everything minus the low pass
+        highpass = -lowpass
+        highpass[len(highpass) // 2] += 1
+        return highpass
+
+
+class Speed(Effect):
+    """Plays faster or slower like a tape: the pitch goes up and down with the speed."""
+    def __init__(self, sample_rate, length, quality, factor: float):
+        super().__init__(sample_rate, length, quality)
+        if not 0.25 <= factor <= 4:
+            raise ValueError(f"Speed has to be between 0.25 and 4, not {factor}")
+        # Only the ratio matters for the resampler. A small fraction keeps its phase table small.
+        ratio = Fraction(factor).limit_denominator(1000)
+        self.resampler = StreamResampler(ratio.numerator, ratio.denominator, quality)
+        self.ratio = ratio
+
+    def output_length(self, length):
+        return int(round(length / self.ratio))
+
+    def process(self, block):
+        return self.resampler.process(block)
+
+    def flush(self):
+        return self.resampler.flush()
+
+
+class _TimeStretch(Effect):
+    """
+    Makes a sound longer or shorter without changing its pitch (WSOLA).
+    Output frames of 40 ms overlap by half. Each one is taken from the input around the position that matches
+    the stretch, shifted by up to a quarter frame to where it continues the previous frame best. The shift is
+    found by an FFT cross-correlation.
+    """
+    def __init__(self, sample_rate, length, quality, stretch: float):
+        super().__init__(sample_rate, length, quality)
+        self.stretch = stretch
+        self.frame = 2 * int(0.02 * sample_rate)
+        self.hop = self.frame // 2
+        self.analysis_hop = self.hop / stretch
+        self.tolerance = self.hop // 2
+        # Periodic Hann window: two of them at half a frame distance add up to one
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame) / self.frame)).astype(np.float32)
+        size = 1 << int(self.frame + 2 * self.tolerance - 1).bit_length()
+        self._fft_size = size
+        # Half a frame of silence in front, so the first frame doesn't fade the sound in. Its output is dropped.
+        self._input = np.zeros(self.hop, dtype=np.float32)
+        self._input_origin = 0
+        self._output = np.zeros(self.frame, dtype=np.float32)
+        self._output_origin = 0
+        self._frames_done = 0
+        self._previous = None#input position of the last frame
+        self._consumed = 0
+        self._skip = self.hop
+        self._produced = 0
+
+    def output_length(self, length):
+        return int(round(length * self.stretch))
+
+    def _next_frame(self, final: bool) -> bool:
+        """Adds the next output frame if enough input is there. Returns False otherwise."""
+        target = int(round(self._frames_done * self.analysis_hop))
+        low = max(target - self.tolerance, 0)
+        high = target + self.tolerance
+        end = self._input_origin + len(self._input)
+        natural = None if self._previous is None else self._previous + self.hop
+        if max(high, natural or 0) + self.frame > end and not final:
+            return False
+        if self._previous is None:
+            start = target
+        else:
+            # The input right after the previous frame is what a seamless continuation looks like
+            template = self._slice(natural, self.frame)
+            region = self._slice(low, high - low + self.frame)
+            correlation = np.fft.irfft(np.fft.rfft(region, self._fft_size)
+                                       * np.conj(np.fft.rfft(template, self._fft_size)), self._fft_size)
+            start = low + int(np.argmax(correlation[:high - low + 1]))
+        position = self._frames_done * self.hop - self._output_origin
+        if position + self.frame > len(self._output):
+            self._output = np.concatenate([self._output, np.zeros(position + self.frame - len(self._output),
+                                                                  dtype=np.float32)])
+        self._output[position:position + self.frame] += self._slice(start, self.frame) * self.window
+        self._previous = start
+        self._frames_done += 1
+        return True
+
+    def _slice(self, start: int, count: int) -> np.ndarray:
+        """Input samples start ... start + count, zeros past the end."""
+        part = self._input[start - self._input_origin:start - self._input_origin + count]
+        if len(part) < count:
+            part = np.concatenate([part, np.zeros(count - len(part), dtype=np.float32)])
+        return part
+
+    def _take(self, final: bool) -> np.ndarray:
+        while self._next_frame(final):
+            if final and self._frames_done * self.hop >= self._skip + self.output_length(self._consumed) + self.frame:
+                break
+        # Samples before the next frame don't change anymore
+        ready = self._frames_done * self.hop - self._output_origin
+        out, self._output = self._output[:ready], self._output[ready:].copy()
+        self._output_origin += ready
+        # Input before what the next frame can reach isn't needed anymore
+        keep_from = min(int(round(self._frames_done * self.analysis_hop)) - self.tolerance,
+                        (self._previous + self.hop) if self._previous is not None else 0)
+        drop = keep_from - self._input_origin
+        if drop > 0:
+            self._input = self._input[drop:]
+            self._input_origin += drop
+
+        if self._skip:
+            skipped = min(self._skip, len(out))
+            self._skip -= skipped
+            out = out[skipped:]
+        return out
+
+    def process(self, block):
+        self._consumed += len(block)
+        self._input = np.concatenate([self._input, block.astype(np.float32, copy=False)])
+        out = self._take(final=False)
+        self._produced += len(out)
+        return out
+
+    def flush(self):
+        out = self._take(final=True)
+        # Exactly the expected length, the last frame may reach past it
+        wanted = self.output_length(self._consumed) - self._produced
+        if len(out) < wanted:
+            out = np.concatenate([out, np.zeros(wanted - len(out), dtype=np.float32)])
+        self._produced += wanted
+        return out[:max(wanted, 0)]
+
+
+class Pitch(Effect):
+    """Shifts the pitch by semitones and keeps the length: the sound is stretched in time and then sped up to fit."""
+    def __init__(self, sample_rate, length, quality, semitones: float):
+        super().__init__(sample_rate, length, quality)
+        if not -24 <= semitones <= 24:
+            raise ValueError(f"Pitch has to be between -24 and 24 semitones, not {semitones}")
+        factor = 2 ** (semitones / 12)
+        self.speed = Speed(sample_rate, None, quality, factor)
+        self.stretch = _TimeStretch(sample_rate, length, quality, float(self.speed.ratio))
+
+    def output_length(self, length):
+        return self.speed.output_length(self.stretch.output_length(length))
+
+    def process(self, block):
+        return self.speed.process(self.stretch.process(block))
+
+    def flush(self):
+        return np.concatenate([self.speed.process(self.stretch.flush()), self.speed.flush()])
+
+
+# Effect name -> (class, name of its parameter in the short text form)
+effect_types = {
+    "gain": (Gain, "db"),
+    "fade_in": (FadeIn, "ms"),
+    "fade_out": (FadeOut, "ms"),
+    "noise": (NoisePrefix, "ms"),
+    "highpass": (HighPass, "hz"),
+    "lowpass": (LowPass, "hz"),
+    "speed": (Speed, "factor"),
+    "pitch": (Pitch, "semitones"),
+}
+
+
+class EffectChain:
+    """
+    The effects of one sound, applied in order to the blocks of a stream or to a whole decoded buffer.
+    A chain is described by a list of dicts like {"type": "highpass", "hz": 120}, see effect_types.
+    Every stage keeps its state between blocks, so a stream sounds the same as the rendered buffer.
+    A chain object is used for one playback. Make a new one for every stream.
+    """
+    def __init__(self, specs: list[dict], sample_rate: int, length: int = None, quality: str = "medium"):
+        self.effects: list[Effect] = []
+        for spec in specs:
+            params = {key: value for key, value in spec.items() if key != "type"}
+            try:
+                effect_class = effect_types[spec["type"]][0]
+            except KeyError:
+                raise ValueError(f"Unknown effect: {spec.get('type')}")
+            effect = effect_class(sample_rate, length, quality, **params)
+            self.effects.append(effect)
+            if length is not None:
+                length = effect.output_length(length)
+        self.length = length
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        for effect in self.effects:
+            block = effect.process(block)
+        return block
+
+    def flush(self) -> np.ndarray:
+        """Everything still held back by the stages. Each stage flushes after the rest of the stage before it."""
+        tail = _empty
+        for effect in self.effects:
+            tail = np.concatenate([effect.process(tail), effect.flush()]) if len(tail) else effect.flush()
+        return tail
+
+    def render(self, data: np.ndarray) -> np.ndarray:
+        """Runs a whole buffer through the chain in blocks."""
+        parts = [self.process(np.asarray(data[start:start + _render_block], dtype=np.float32))
+                 for start in range(0, len(data), _render_block)]
+        parts.append(self.flush())
+        return np.concatenate(parts).astype(np.float32, copy=False)
+
+    @staticmethod
+    def chain_hash(specs: list[dict]) -> str:
+        """Identifies a chain in cache keys. Equal chains have equal hashes, however their dicts are ordered."""
+        if not specs:
+            return ""
+        return hashlib.blake2b(json.dumps(specs, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def parse_chain(text: str, sample_rate: int = 48000) -> list[dict]:
+    """
+    Reads the short form of a chain as typed in the sound settings, e.g. "highpass=120 gain=-3 fade_out=500".
+    Raises ValueError for unknown effects or values. Cutoffs are checked against sample_rate, the rate of the output.
+    """
+    specs = []
+    for part in text.replace(",", " ").split():
+        name, _, value = part.partition("=")
+        if name not in effect_types:
+            raise ValueError(f"Unknown effect: {name}. Known effects: {', '.join(effect_types)}")
+        try:
+            specs.append({"type": name, effect_types[name][1]: float(value)})
+        except ValueError:
+            raise ValueError(f"{name} needs a number, like {name}=1")
+    # Invalid values fail here and not on the first play
+    EffectChain(specs, sample_rate)
+    for spec in specs:
+        if spec["type"] in ("highpass", "lowpass") and spec["hz"] > _FirFilter.max_cutoff(sample_rate):
+            raise ValueError(f"Cutoff has to be below {_FirFilter.max_cutoff(sample_rate):.0f} Hz at the output rate "
+                             f"of {sample_rate} Hz, not {spec['hz']:g}")
+    return specs
+
+
+def format_chain(specs: list[dict]) -> str:
+    parts = []
+    for spec in specs:
+        value = spec.get(effect_types[spec["type"]][1])
+        parts.append(f"{spec['type']}={value:g}")
+    return " ".join(parts)
@@ -0,0 +1,181 @@
+import threading
+import time
+
+import numpy as np
+
+
+class BlockRing:
+    """
+    Fixed number of block slots shared by all sinks. The mixer writes every block once, each SinkWriter reads it
+    with its own cursor. push() waits while a "block" writer has `lead` blocks queued or being written.
+    A "drop" writer never holds it up, its oldest blocks are dropped once it is a whole ring behind.
+    """
+    def __init__(self, slots: int, block_size: int, lead: int = 1):
+        self.slots = slots
+        # Kept small: every block queued for the virtual mic delays a sound that is triggered now
+        self.lead = min(lead, slots)
+        self.block_size = block_size
+        self.buffer = np.zeros((slots, block_size), dtype=np.float32)
+        self.lengths = np.zeros(slots, dtype=np.int64)
+        # Stretch of continuous playback each slot belongs to. A writer starts its underrun count over on a new one.
+        self.sessions = np.zeros(slots, dtype=np.int64)
+        # Blocks pushed so far. Slot of block n is n % slots.
+        self.head = 0
+        self.session = 0
+        self.writers: list["SinkWriter"] = []
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def new_session(self):
+        """Called by the producer when playback starts again after a pause."""
+        with self._cond:
+            self.session += 1
+
+    def push(self, block: np.ndarray, timeout: float = None) -> bool:
+        """Copies a block into the ring. False if a blocking writer didn't catch up within the timeout."""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.closed and any(w.policy == "block" and self.head - w.tail + w.writing >= self.lead
+                                          for w in self.writers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if self.closed:
+                return False
+
+            slot = self.head % self.slots
+            for writer in self.writers:
+                if self.head - writer.tail >= self.slots:
+                    writer.drop_oldest()
+            self.buffer[slot, :len(block)] = block
+            self.lengths[slot] = len(block)
+            self.sessions[slot] = self.session
+            self.head += 1
+            self._cond.notify_all()
+            return True
+
+    def clear(self):
+        """Forgets every block that wasn't written yet, e.g. when playback is stopped."""
+        with self._cond:
+            for writer in self.writers:
+                writer.tail = self.head
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class SinkWriter:
+    """
+    Drains a BlockRing into one OutputStream on its own thread, so a sink that stops reading only stalls itself.
+    policy "block": the mixer waits for this sink, nothing is lost (the virtual mic).
+    policy "drop": when the sink falls a whole ring behind, its oldest blocks are dropped (the speakers).
+    """
+    def __init__(self, ring: BlockRing, stream, policy: str = "block"):
+        self.ring = ring
+        self.stream = stream
+        self.policy = policy
+        # Next block to write, and 1 while the one before is still being written
+        self.tail = ring.head
+        self.writing = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.blocks_dropped = 0
+        # Times the sink fell a whole ring behind, a run of dropped blocks counts once
+        self.overflows = 0
+        # Times the sink ran dry while a session was playing
+        self.underruns = 0
+        self.failed_writes = 0
+        # Most blocks that were waiting for this sink at once
+        self.max_lag = 0
+        self._overflowing = False
+        self._block = np.zeros(ring.block_size, dtype=np.float32)
+        self._thread = None
+
+    def start(self):
+        with self.ring._cond:
+            self.tail = self.ring.head
+            self.ring.writers.append(self)
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.stream.target}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float = 1.0):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def drop_oldest(self):
+        """Called by the producer with the ring locked, when this writer is a whole ring behind."""
+        slot = self.tail % self.ring.slots
+        self.frames_dropped += int(self.ring.lengths[slot])
+        self.blocks_dropped += 1
+        if not self._overflowing:
+            self.overflows += 1
+            self._overflowing = True
+        self.tail += 1
+
+    def stats(self) -> dict:
+        return {
+            "target": self.stream.target,
+            "policy": self.policy,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "blocks_dropped": self.blocks_dropped,
+            "overflows": self.overflows,
+            "underruns": self.underruns,
+            "failed_writes": self.failed_writes,
+            "max_lag": self.max_lag,
+        }
+
+    def _next_block(self) -> tuple[np.ndarray, int] | None:
+        ring = self.ring
+        with ring._cond:
+            while self.tail >= ring.head and not ring.closed:
+                ring._cond.wait(0.5)
+            if ring.closed:
+                return None
+            self.max_lag = max(self.max_lag, ring.head - self.tail)
+            slot = self.tail % ring.slots
+            length = int(ring.lengths[slot])
+            # Copied out, so the producer can reuse the slot while the sink is still being written to
+            self._block[:length] = ring.buffer[slot, :length]
+            session = int(ring.sessions[slot])
+            self.tail += 1
+            self.writing = 1
+            self._overflowing = False
+            return self._block[:length], session
+
+    def _written(self):
+        with self.ring._cond:
+            self.writing = 0
+            self.ring._cond.notify_all()
+
+    def _run(self):
+        session = None
+        session_start = 0.0
+        written = 0.0
+        while True:
+            item = self._next_block()
+            if item is None:
+                return
+            block, block_session = item
+            ok = self.stream.write(block)
+            self._written()
+            if not ok:
+                self.failed_writes += 1
+                continue
+            self.frames_written += len(block)
+
+            # The sink plays in real time. If more time passed than we have written audio, it ran dry.
+            block_seconds = len(block) / self.stream.sample_rate
+            now = time.monotonic()
+            if block_session != session or now - session_start > written + block_seconds:
+                if block_session == session:
+                    self.underruns += 1
+                session = block_session
+                session_start = now
+                written = 0.0
+            written += block_seconds
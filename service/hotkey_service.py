@@ -0,0 +1,281 @@
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from model.sound_effect import SoundEffect
+from service.pipewire_hijack_service import sb
+from service.library_index_service import library_index
+from service.settings_service import settings_service
+from service.signal_service import signals
+
+
+class HotkeyService:
+    """
+    Global hotkeys that play a sound even when the window isn't focused.
+    Bindings are stored as sound path -> pynput hotkey (e.g. "<ctrl>+<alt>+1") in hotkeys.json in the config dir.
+    The keys are handled on pynput's listener thread and bound sounds are pinned in the memory cache. The SoundEffect
+    of every binding is built once, so a keypress goes straight to the mixer without the Qt event loop, the disk,
+    the library index or pactl.
+    """
+    # How many trigger latencies are kept for latency_stats()
+    _latency_history = 200
+
+    # Qt key names (QKeySequence.toString()) -> pynput key names
+    _qt_keys = {
+        "ctrl": "<ctrl>", "alt": "<alt>", "shift": "<shift>", "meta": "<cmd>",
+        "space": "<space>", "return": "<enter>", "enter": "<enter>", "esc": "<esc>", "tab": "<tab>",
+        "backspace": "<backspace>", "del": "<delete>", "ins": "<insert>", "home": "<home>", "end": "<end>",
+        "pgup": "<page_up>", "pgdown": "<page_down>", "left": "<left>", "right": "<right>", "up": "<up>",
+        "down": "<down>", "print": "<print_screen>", "pause": "<pause>",
+    }
+
+    def __init__(self, bindings_file: Path):
+        self.bindings_file = bindings_file
+        self.bindings: dict[str, str] = self._load()
+        self._listener = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+        # A DaemonClient when the window is a client of the daemon. The daemon listens then, changes are sent to it.
+        self.remote = None
+        # Sound path -> the SoundEffect a keypress plays, with its volume, effects and whether it is streamed
+        self._effects: dict[str, SoundEffect] = {}
+        # (keypress time, voice queued time, the voice) of the last triggers
+        self._latencies = deque(maxlen=self._latency_history)
+
+    def _load(self) -> dict[str, str]:
+        try:
+            with open(self.bindings_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"❌ Error reading hotkeys from {self.bindings_file}: {e}")
+            return {}
+
+    def _save(self):
+        tmp = self.bindings_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.bindings, f, indent=2)
+        tmp.replace(self.bindings_file)
+
+    def hotkey_for(self, sound: SoundEffect) -> str:
+        return self.bindings.get(str(sound.mp3_path), "")
+
+    def bind(self, sound: SoundEffect, hotkey: str):
+        """Binds a hotkey to a sound. A hotkey that was bound to another sound is moved. An empty hotkey unbinds."""
+        path = str(sound.mp3_path)
+        with self._lock:
+            if not hotkey:
+                if self.bindings.pop(path, None) is not None:
+                    sb.audio_cache.unpin(path)
+                    self._effects.pop(path, None)
+            else:
+                self._validate(hotkey)
+                for other in [p for p, h in self.bindings.items() if h == hotkey and p != path]:
+                    del self.bindings[other]
+                    sb.audio_cache.unpin(other)
+                    self._effects.pop(other, None)
+                self.bindings[path] = hotkey
+            self._save()
+        if hotkey:
+            print(f"⌨️ Bound {hotkey} to {sound.name}")
+        if self.remote is not None:
+            self.remote.reload_hotkeys()
+            return
+        if hotkey:
+            self._preload([path])
+        self._restart_listener()
+
+    @staticmethod
+    def _validate(hotkey: str):
+        try:
+            from pynput import keyboard
+        except ImportError:
+            # Without a display we can't check it. It is checked again when the listener starts.
+            return
+        keyboard.HotKey.parse(hotkey)
+
+    @classmethod
+    def hotkey_from_qt(cls, sequence: str) -> str:
+        """Converts a Qt key sequence like "Ctrl+Alt+H" or "Ctrl+F5" to pynput's format ("<ctrl>+<alt>+h")."""
+        if not sequence:
+            return ""
+        # "Ctrl++" ends with the plus key itself
+        parts = sequence.split("+")
+        if sequence.endswith("++"):
+            parts = parts[:-2] + ["+"]
+        keys = []
+        for part in parts:
+            name = part.lower()
+            if name in cls._qt_keys:
+                keys.append(cls._qt_keys[name])
+            elif len(name) > 1 and name[0] == "f" and name[1:].isdigit():
+                keys.append(f"<{name}>")
+            else:
+                keys.append(name)
+        return "+".join(keys)
+
+    @classmethod
+    def hotkey_to_qt(cls, hotkey: str) -> str:
+        """The other way around, to show a stored hotkey in a QKeySequenceEdit."""
+        if not hotkey:
+            return ""
+        qt_names = {}
+        for qt_name, pynput_name in cls._qt_keys.items():
+            qt_names.setdefault(pynput_name, qt_name)
+        parts = hotkey.split("+")
+        if hotkey.endswith("++"):
+            parts = parts[:-2] + ["+"]
+        keys = []
+        for part in parts:
+            if part in qt_names:
+                keys.append(qt_names[part].capitalize())
+            else:
+                keys.append(part.strip("<>").upper())
+        return "+".join(keys)
+
+    def start(self):
+        """Pins and preloads every bound sound and starts listening. Does nothing useful without X11/pynput."""
+        self._preload(list(self.bindings))
+        self._restart_listener()
+
+    def reload(self):
+        """Reads the bindings file again, e.g. after a client of the daemon changed it."""
+        with self._lock:
+            for path in self.bindings:
+                sb.audio_cache.unpin(path)
+            self._effects.clear()
+            self.bindings = self._load()
+        self.start()
+
+    def stop(self):
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+
+    def _restart_listener(self):
+        self.stop()
+        with self._lock:
+            if not self.bindings or self._unavailable:
+                return
+            try:
+                # pynput needs a display connection as soon as it is imported, so it is only imported here
+                from pynput import keyboard
+                mapping = {hotkey: (lambda p=path: self.trigger(p)) for path, hotkey in self.bindings.items()}
+                self._listener = keyboard.GlobalHotKeys(mapping)
+                self._listener.start()
+            except Exception as e:
+                #e.g. no X server. This won't change while running, so it is only tried once
+                self._unavailable = True
+                print(f"❌ Error: Global hotkeys are not available: {str(e).splitlines()[0]}")
+                return
+        print(f"⌨️ Listening for {len(self.bindings)} global hotkeys")
+
+    def _preload(self, paths: list[str]):
+        """
+        Builds the SoundEffect of every binding, pins the sounds and decodes them in the background,
+        so the first keypress is already a cache hit.
+        """
+        effects = [self._effect_for(path) for path in paths]
+        with self._lock:
+            for effect in effects:
+                sb.audio_cache.pin(str(effect.mp3_path))
+                self._effects[str(effect.mp3_path)] = effect
+
+        def load():
+            sb.ready.wait()
+            for effect in effects:
+                # Long files are decoded while they play and never cached
+                if effect.streamed:
+                    continue
+                try:
+                    sb.load_sound(effect)
+                except Exception as e:
+                    print(f"❌ Error preloading hotkey sound {effect.mp3_path}: {e}")
+
+        threading.Thread(target=load, name="hotkey-preload", daemon=True).start()
+
+    @staticmethod
+    def _effect_for(path: str) -> SoundEffect:
+        """The sound as the library index has it: name, its own volume and effects."""
+        row = library_index.get(Path(path))
+        if row is None:
+            effect = SoundEffect(Path(path))
+        else:
+            effect = SoundEffect(Path(path), row["name"], row["volume"],
+                                 effects=json.loads(row["effects"]) if row["effects"] else None)
+        effect.streamed = sb.is_streamed(effect.mp3_path)
+        return effect
+
+    def _sound_changed(self, sound: SoundEffect):
+        """The volume or effects of a sound changed. A bound sound is built and decoded again."""
+        if self.remote is not None:
+            self.remote.reload_hotkeys()
+        elif str(sound.mp3_path) in self.bindings:
+            self._preload([str(sound.mp3_path)])
+
+    def _sounds_changed(self, added: list[SoundEffect], removed: list[SoundEffect], renamed: list[SoundEffect]):
+        """Bindings follow renamed sounds and are dropped with deleted ones."""
+        dropped = []
+        moved = []
+        with self._lock:
+            for sound in removed:
+                path = str(sound.mp3_path)
+                if self.bindings.pop(path, None) is not None:
+                    sb.audio_cache.unpin(path)
+                    self._effects.pop(path, None)
+                    dropped.append(sound.name)
+            for sound in renamed:
+                old_path, path = str(sound.previous_path), str(sound.mp3_path)
+                hotkey = self.bindings.pop(old_path, None)
+                if hotkey is None:
+                    continue
+                self.bindings[path] = hotkey
+                sb.audio_cache.unpin(old_path)
+                self._effects.pop(old_path, None)
+                moved.append(path)
+            if not (dropped or moved):
+                return
+            self._save()
+        if dropped:
+            print(f"⌨️ Removed the hotkeys of deleted sounds: {', '.join(dropped)}")
+        if self.remote is not None:
+            self.remote.reload_hotkeys()
+            return
+        self._preload(moved)
+        self._restart_listener()
+
+    def trigger(self, path: str):
+        """Plays the sound bound to a hotkey. Runs on the listener thread."""
+        pressed_at = time.monotonic()
+        effect = self._effects.get(path)
+        if effect is None:
+            return
+        voice_id = sb.play(effect)
+        if voice_id is not None:
+            self._latencies.append((pressed_at, time.monotonic(), sb.mixer.get_voice(voice_id)))
+
+    def latency_stats(self) -> dict:
+        """
+        Percentiles in ms of keypress -> voice queued in the mixer, and keypress -> first block mixed.
+        The time the block spends in the pipe to the playback helper isn't included.
+        """
+        triggers = list(self._latencies)
+        queued = sorted(queued_at - pressed_at for pressed_at, queued_at, _ in triggers)
+        mixed = sorted(v.first_block_at - pressed_at for pressed_at, _, v in triggers
+                       if v is not None and v.first_block_at is not None)
+
+        def percentiles(values):
+            if not values:
+                return {}
+            return {p: values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in (50, 99)}
+
+        return {"count": len(queued), "queued_ms": percentiles(queued), "first_block_ms": percentiles(mixed)}
+
+
+hotkey_service = HotkeyService(settings_service.settings_path / "hotkeys.json")
+signals.sound_settings_changed.connect(hotkey_service._sound_changed)
+signals.sounds_list_diff.connect(hotkey_service._sounds_changed)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from service.settings_service import settings_service
+
+
+class LibraryIndex:
+    """
+    Everything known about the sounds in the library, kept in library.sqlite3 in the config dir:
+    path, inode, mtime, size, content hash, display name, per-sound volume and effects, duration, sample rate and
+    loudness.
+    Startup shows the sounds from here and only compares them with the folder afterwards (see SoundsService).
+    The content hash, duration and sample rate are filled in lazily in the background. Everything derived from the
+    content is dropped when the mtime or size of a file changes.
+    """
+    # Bump this when the table changes. Older databases are rebuilt, the folder is scanned again anyway.
+    schema_version = 2
+    _hash_chunk_size = 1024 * 1024
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Used from the GUI thread, the pre-decode workers and the metadata thread. The lock serializes them.
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._db:
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != self.schema_version:
+                self._db.execute("DROP TABLE IF EXISTS sounds")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sounds (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_hash TEXT,
+                    name TEXT NOT NULL,
+                    volume REAL NOT NULL DEFAULT 1.0,
+                    effects TEXT,
+                    duration REAL,
+                    sample_rate INTEGER,
+                    lufs REAL,
+                    true_peak REAL,
+                    peak REAL
+                )""")
+            self._db.execute(f"PRAGMA user_version={self.schema_version}")
+
+    # The values that only stay valid while the content is the same. Reset when mtime or size change.
+    _content_columns = ["content_hash", "duration", "sample_rate", "lufs", "true_peak", "peak"]
+    _upsert = f"""
+        INSERT INTO sounds (path, inode, mtime_ns, size, name) VALUES (:path, :inode, :mtime_ns, :size, :name)
+        ON CONFLICT(path) DO UPDATE SET
+            inode = excluded.inode, name = excluded.name, mtime_ns = excluded.mtime_ns, size = excluded.size,
+            {", ".join(f"{column} = CASE WHEN mtime_ns = excluded.mtime_ns AND size = excluded.size THEN {column} END"
+                       for column in _content_columns)}
+    """
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return str(path.absolute())
+
+    def sounds_under(self, root: Path) -> list[sqlite3.Row]:
+        """Every indexed sound below a folder, sorted by path."""
+        prefix = self._key(root).rstrip("/") + "/"
+        with self._lock:
+            # A range instead of LIKE, so the primary key index is used and no characters need escaping
+            return self._db.execute("SELECT * FROM sounds WHERE path >= ? AND path < ? ORDER BY path",
+                                    (prefix, prefix[:-1] + "0")).fetchall()
+
+    def get(self, path: Path) -> sqlite3.Row | None:
+        with self._lock:
+            return self._db.execute("SELECT * FROM sounds WHERE path = ?", (self._key(path),)).fetchone()
+
+    def update(self, files: list[tuple[Path, str, tuple[int, int, int]]], removed: list[Path] = (),
+               renamed: list[tuple[Path, Path]] = ()):
+        """
+        Applies what changed in the folder in one transaction.
+        files are (path, display name, (inode, mtime, size)) of new or possibly changed files.
+        Renamed rows keep everything else.
+        """
+        with self._lock, self._db:
+            for old_path, new_path in renamed:
+                self._db.execute("DELETE FROM sounds WHERE path = ?", (self._key(new_path),))
+                self._db.execute("UPDATE sounds SET path = ? WHERE path = ?", (self._key(new_path), self._key(old_path)))
+            self._db.executemany(self._upsert, [
+                {"path": self._key(path), "inode": inode, "mtime_ns": mtime_ns, "size": size, "name": name}
+                for path, name, (inode, mtime_ns, size) in files])
+            self._db.executemany("DELETE FROM sounds WHERE path = ?", [(self._key(path),) for path in removed])
+
+    def set_volume(self, path: Path, volume: float):
+        with self._lock, self._db:
+            self._db.execute("UPDATE sounds SET volume = ? WHERE path = ?", (volume, self._key(path)))
+
+    def effects(self, path: Path) -> list[dict]:
+        row = self.get(path)
+        return json.loads(row["effects"]) if row is not None and row["effects"] else []
+
+    def set_effects(self, path: Path, effects: list[dict]):
+        with self._lock, self._db:
+            self._db.execute("UPDATE sounds SET effects = ? WHERE path = ?",
+                             (json.dumps(effects) if effects else None, self._key(path)))
+
+    def loudness(self, path: Path) -> dict | None:
+        """The stored loudness of a file, if it was analyzed with the content the file has now."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        row = self.get(path)
+        if row is None or row["lufs"] is None or (row["mtime_ns"], row["size"]) != (stat.st_mtime_ns, stat.st_size):
+            return None
+        return {"lufs": row["lufs"], "true_peak": row["true_peak"], "peak": row["peak"]}
+
+    def set_loudness(self, path: Path, result: dict):
+        try:
+            stat = path.stat()
+        except OSError:
+            return
+        with self._lock, self._db:
+            # Files that aren't indexed yet (e.g. played before the folder was compared) get their row now.
+            # An existing row keeps its name and metadata, the reconcile is the one that updates it.
+            self._db.execute("""
+                INSERT INTO sounds (path, inode, mtime_ns, size, name) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO NOTHING""",
+                             (self._key(path), stat.st_ino, stat.st_mtime_ns, stat.st_size, path.stem))
+            # A row that doesn't match the file yet gets reset by the next reconcile, nothing is stored for it
+            self._db.execute("""
+                UPDATE sounds SET lufs = ?, true_peak = ?, peak = ?
+                WHERE path = ? AND mtime_ns = ? AND size = ?""",
+                             (result["lufs"], result["true_peak"], result["peak"], self._key(path),
+                              stat.st_mtime_ns, stat.st_size))
+
+    def missing_metadata(self, root: Path) -> list[Path]:
+        prefix = self._key(root).rstrip("/") + "/"
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM sounds WHERE path >= ? AND path < ? AND content_hash IS NULL",
+                                    (prefix, prefix[:-1] + "0")).fetchall()
+        return [Path(row["path"]) for row in rows]
+
+    def fill_metadata(self, path: Path) -> sqlite3.Row | None:
+        """Hashes a file and reads its duration and sample rate. Returns the updated row."""
+        import soundfile as sf
+        stat = path.stat()
+        content_hash = self.content_hash(path)
+        info = sf.info(str(path))
+        with self._lock, self._db:
+            # If the file changed meanwhile, the next reconcile resets the row. Nothing is written for it then.
+            self._db.execute("""
+                UPDATE sounds SET content_hash = ?, duration = ?, sample_rate = ?
+                WHERE path = ? AND mtime_ns = ? AND size = ?""",
+                             (content_hash, info.duration, info.samplerate, self._key(path), stat.st_mtime_ns,
+                              stat.st_size))
+            return self._db.execute("SELECT * FROM sounds WHERE path = ?", (self._key(path),)).fetchone()
+
+    @classmethod
+    def content_hash(cls, path: Path) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(cls._hash_chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+library_index = LibraryIndex(settings_service.settings_path / "library.sqlite3")
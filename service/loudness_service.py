@@ -0,0 +1,310 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from service.decode_service import StreamResampler
+from service.library_index_service import LibraryIndex, library_index
+from service.settings_service import settings_service
+
+# Gain limits for the loudness normalization. Quiet files aren't boosted without end
+# and nothing is allowed to go over -1 dBTP after the gain.
+_max_gain_db = 20.0
+_true_peak_ceiling_db = -1.0
+# Files quieter than this are treated as silence (the absolute gate of BS.1770)
+_silence_lufs = -70.0
+# Samples oversampled at once for the true peak, and its interpolation filter.
+# 12 taps per phase like the 48-tap filter of BS.1770 annex 2. Playback quality isn't needed to find a peak.
+_true_peak_block = 65536
+_true_peak_kernel = (6, 5.0)
+# Length of the FIR version of the K-weighting used on streams. Long enough to resolve the 38 Hz high pass.
+_k_weighting_taps = 16384
+# Frames read from a file at once by analyze_file()
+_file_block = 65536
+
+
+def _k_weighting_response(sample_rate: int, n: int) -> np.ndarray:
+    """
+    Magnitude of the BS.1770 K-weighting filter (high shelf + RLB high pass) on the bins of an rfft of length n.
+    The coefficients are the sample rate independent ones from libebur128.
+    """
+    # Stage 1: high shelf, about +4 dB above 1.5 kHz
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # Stage 2: high pass at 38 Hz
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    pass_b = [1.0, -2.0, 1.0]
+    pass_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    z = np.exp(-1j * np.pi * np.arange(n // 2 + 1) / (n / 2))
+    response = np.ones(len(z), dtype=np.complex128)
+    for b, a in ((shelf_b, shelf_a), (pass_b, pass_a)):
+        response *= (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response)
+
+
+def integrated_loudness(data: np.ndarray, sample_rate: int) -> float:
+    """
+    Gated integrated loudness of a mono buffer in LUFS (EBU R128 / ITU-R BS.1770).
+    The K-weighting is applied in the frequency domain. Only the power per block matters here, so the
+    zero-phase version gives the same result as the recursive filter without a Python loop over the samples.
+    """
+    if len(data) == 0:
+        return _silence_lufs
+    n = len(data)
+    weighted = np.fft.irfft(np.fft.rfft(data, n) * _k_weighting_response(sample_rate, n), n)
+
+    # Mean square of 400 ms blocks with 75% overlap. Clips shorter than one block are a single block.
+    block = min(n, int(0.4 * sample_rate))
+    hop = max(1, block // 4)
+    energy = np.concatenate([[0.0], np.cumsum(weighted.astype(np.float64) ** 2)])
+    starts = np.arange(0, n - block + 1, hop)
+    powers = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(powers)
+    # Absolute gate, then the relative gate 10 LU under the loudness of what is left
+    gated = powers[loudness > _silence_lufs]
+    if len(gated) == 0:
+        return _silence_lufs
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = powers[loudness > max(_silence_lufs, relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def true_peak(data: np.ndarray, sample_rate: int) -> float:
+    """Peak in dBTP, measured on a 4x oversampled copy so peaks between the samples are caught."""
+    if len(data) == 0:
+        return -np.inf
+    # In blocks, so a long file isn't held four times in memory
+    resampler = StreamResampler(sample_rate, sample_rate * 4, kernel=_true_peak_kernel)
+    peak = float(np.max(np.abs(data)))
+    for start in range(0, len(data), _true_peak_block):
+        block = resampler.process(data[start:start + _true_peak_block])
+        if len(block):
+            peak = max(peak, float(np.max(np.abs(block))))
+    block = resampler.flush()
+    if len(block):
+        peak = max(peak, float(np.max(np.abs(block))))
+    return 20 * np.log10(peak) if peak > 0 else -np.inf
+
+
+def analyze(data: np.ndarray, sample_rate: int) -> dict:
+    peak = float(np.max(np.abs(data))) if len(data) else 0.0
+    return {
+        "lufs": integrated_loudness(data, sample_rate),
+        "true_peak": true_peak(data, sample_rate),
+        "peak": peak,
+    }
+
+
+class LoudnessMeter:
+    """
+    analyze() for audio that arrives block by block, e.g. a file that is too long to hold in memory.
+    The K-weighting is a zero-phase FIR made from the same response, applied with overlap-add. Only the energy of
+    every 100 ms is kept, which is all the 400 ms gating blocks with 75% overlap need.
+    """
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        taps = _k_weighting_taps
+        kernel = np.roll(np.fft.irfft(_k_weighting_response(sample_rate, taps), taps), taps // 2) * np.hanning(taps)
+        self._kernel = kernel
+        self._kernel_spectra: dict[int, np.ndarray] = {}
+        # The filter output is delayed by half the kernel. That much is skipped, so the energy lines up with the input.
+        self._skip = taps // 2
+        self._tail = np.zeros(taps - 1)
+        self._hop = max(1, int(0.4 * sample_rate) // 4)
+        self._hop_energies: list[float] = []
+        self._hop_energy = 0.0
+        self._hop_fill = 0
+        self._frames = 0
+        self._weighted = 0#filter output that was counted, at most _frames
+        self._total_energy = 0.0
+        self._resampler = StreamResampler(sample_rate, sample_rate * 4, kernel=_true_peak_kernel)
+        self._peak = 0.0
+        self._true_peak = 0.0
+
+    def process(self, block: np.ndarray):
+        if len(block) == 0:
+            return
+        self._frames += len(block)
+        peak = float(np.max(np.abs(block)))
+        self._peak = max(self._peak, peak)
+        self._true_peak = max(self._true_peak, peak)
+        oversampled = self._resampler.process(block)
+        if len(oversampled):
+            self._true_peak = max(self._true_peak, float(np.max(np.abs(oversampled))))
+
+        taps = len(self._kernel)
+        size = 1 << (len(block) + taps - 2).bit_length()
+        spectrum = self._kernel_spectra.get(size)
+        if spectrum is None:
+            spectrum = self._kernel_spectra[size] = np.fft.rfft(self._kernel, size)
+        filtered = np.fft.irfft(np.fft.rfft(block.astype(np.float64), size) * spectrum, size)[:len(block) + taps - 1]
+        filtered[:taps - 1] += self._tail
+        self._tail = filtered[len(block):].copy()
+        self._count(filtered[:len(block)])
+
+    def _count(self, weighted: np.ndarray):
+        if self._skip:
+            skipped = min(self._skip, len(weighted))
+            self._skip -= skipped
+            weighted = weighted[skipped:]
+        weighted = weighted[:self._frames - self._weighted]
+        self._weighted += len(weighted)
+        squares = weighted * weighted
+        self._total_energy += float(squares.sum())
+        while len(squares):
+            take = min(self._hop - self._hop_fill, len(squares))
+            self._hop_energy += float(squares[:take].sum())
+            self._hop_fill += take
+            squares = squares[take:]
+            if self._hop_fill == self._hop:
+                self._hop_energies.append(self._hop_energy)
+                self._hop_energy = 0.0
+                self._hop_fill = 0
+
+    def result(self) -> dict:
+        """Call once, after the last block."""
+        self._count(self._tail)
+        block = self._resampler.flush()
+        if len(block):
+            self._true_peak = max(self._true_peak, float(np.max(np.abs(block))))
+        return {
+            "lufs": self._integrated_loudness(),
+            "true_peak": 20 * np.log10(self._true_peak) if self._true_peak > 0 else -np.inf,
+            "peak": self._peak,
+        }
+
+    def _integrated_loudness(self) -> float:
+        if self._frames == 0:
+            return _silence_lufs
+        hops = np.array(self._hop_energies)
+        if len(hops) < 4:
+            # Clips shorter than one block are a single block
+            powers = np.array([self._total_energy / self._frames])
+        else:
+            powers = (hops[:-3] + hops[1:-2] + hops[2:-1] + hops[3:]) / (4 * self._hop)
+        with np.errstate(divide="ignore"):
+            loudness = -0.691 + 10 * np.log10(powers)
+        gated = powers[loudness > _silence_lufs]
+        if len(gated) == 0:
+            return _silence_lufs
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10
+        gated = powers[loudness > max(_silence_lufs, relative_gate)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def analyze_file(path: str) -> dict:
+    """
+    Reads a file at its own sample rate block by block and analyzes it, so a long file never is in memory at once.
+    Runs in the worker processes of analyze_library() and for streamed files in the pre-decode workers.
+    """
+    import soundfile as sf
+    with sf.SoundFile(path) as f:
+        meter = LoudnessMeter(f.samplerate)
+        for block in f.blocks(_file_block, dtype='float32', always_2d=True):
+            meter.process(block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0])
+    return meter.result()
+
+
+class LoudnessStore:
+    """
+    Loudness of every analyzed file. It is stored in the library index, next to the rest of what is known about a
+    sound, and only valid while the mtime and size of the file match.
+    The analysis runs once per file. Playback only turns the stored values into a gain.
+    """
+    def __init__(self, index: LibraryIndex):
+        self.index = index
+
+    def get(self, path: Path) -> dict | None:
+        return self.index.loudness(path)
+
+    def put(self, path: Path, result: dict):
+        self.index.set_loudness(path, result)
+
+    def ensure(self, path: Path, data: np.ndarray, sample_rate: int) -> dict:
+        """Returns the stored loudness of a file, analyzing the already decoded samples if there is none."""
+        entry = self.get(path)
+        if entry is None:
+            entry = analyze(data, sample_rate)
+            self.put(path, entry)
+        return entry
+
+    @staticmethod
+    def gain_for(entry: dict, mode: str, target_lufs: float) -> float:
+        """
+        The scalar gain a voice is played with.
+        "loudness" moves the file to the target loudness without pushing the true peak over -1 dBTP,
+        "peak" scales the sample peak to full scale like the old per-load normalization, "none" keeps the file as is.
+        """
+        if mode == "none":
+            return 1.0
+        if mode == "peak":
+            return 1.0 / entry["peak"] if entry["peak"] > 0 else 1.0
+        if mode != "loudness":
+            raise ValueError(f"Unknown normalization: {mode}")
+        if entry["lufs"] <= _silence_lufs:
+            return 1.0
+        gain_db = min(target_lufs - entry["lufs"], _max_gain_db, _true_peak_ceiling_db - entry["true_peak"])
+        return float(10 ** (gain_db / 20))
+
+    def analyze_library(self, paths: list[Path], workers: int = None, force: bool = False,
+                        progress=None) -> tuple[int, int]:
+        """
+        Analyzes every file that has no valid entry yet in parallel worker processes.
+        Returns (analyzed, failed). progress(done, total) is called after every file.
+        """
+        todo = [path for path in paths if force or self.get(path) is None]
+        failed = 0
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(analyze_file, str(path)): path for path in todo}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        self.put(path, future.result())
+                    except Exception as e:
+                        failed += 1
+                        print(f"❌ Loudness analysis failed for {path}: {e}")
+                    if progress:
+                        progress(done, len(todo))
+        return len(todo) - failed, failed
+
+
+loudness_store = LoudnessStore(library_index)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Analyzes the loudness of every sound in the library once.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="analyze files again that already have valid data")
+    parser.add_argument("folder", nargs="?", help="folder to analyze (default: the sound folder)")
+    args = parser.parse_args()
+
+    folder = Path(args.folder or settings_service.settings["sound_path"])
+    formats = settings_service.supported_formates
+    paths = [p.absolute() for p in sorted(folder.rglob("*")) if p.is_file() and p.suffix[1:].lower() in formats]
+    print(f"Analyzing {len(paths)} sounds in {folder}...")
+
+    def report(done, total):
+        print(f"\r{done}/{total}", end="" if done < total else "\n", flush=True)
+
+    start = time.perf_counter()
+    analyzed, failed = loudness_store.analyze_library(paths, args.workers, args.force, report)
+    print(f"✅ Analyzed {analyzed} sounds in {time.perf_counter() - start:.1f}s"
+          f" ({len(paths) - analyzed - failed} already up to date, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+class Voice:
+    """One playing sound inside the mixer."""
+    def __init__(self, voice_id: int, data: np.ndarray, gain: float, name: str = "", scale: float = 1.0,
+                 trace_id: int = 0):
+        self.voice_id = voice_id
+        self.data = data
+        self.gain = gain
+        # Converts the stored samples (float32 or int16) to float audio
+        self.scale = scale
+        self.name = name
+        # The trace of the play() call that started the voice (see trace_service)
+        self.trace_id = trace_id
+        self.position = 0
+        self.started_at = time.monotonic()
+        # Set when the first block of the voice is mixed. Used to measure the trigger latency.
+        self.first_block_at: float | None = None
+        # Set by a stop with fade. The next block fades the voice out and ends it.
+        self.fading = False
+
+    @property
+    def remaining(self) -> int:
+        return len(self.data) - self.position
+
+    @property
+    def done(self) -> bool:
+        return self.remaining <= 0
+
+    def read(self, count: int) -> np.ndarray:
+        """The next up to count samples. Fewer means the voice has nothing more right now."""
+        segment = self.data[self.position:self.position + count]
+        self.position += len(segment)
+        return segment
+
+    def close(self):
+        pass
+
+
+class StreamingVoice(Voice):
+    """A voice that gets its samples block by block from a StreamDecoder instead of a decoded buffer."""
+    def __init__(self, voice_id: int, decoder, gain: float, name: str = "", scale: float = 1.0, trace_id: int = 0):
+        super().__init__(voice_id, np.zeros(0, dtype=np.float32), gain, name, scale, trace_id)
+        self.decoder = decoder
+
+    @property
+    def done(self) -> bool:
+        return self.remaining <= 0 and self.decoder.finished
+
+    def read(self, count: int) -> np.ndarray:
+        if self.remaining <= 0:
+            # The mix thread never waits for the decoder. If the next block isn't there, this block stays silent.
+            block = self.decoder.next_block()
+            if block is None:
+                return self.data[:0]
+            self.data = block
+            self.position = 0
+        return super().read(count)
+
+    def close(self):
+        self.decoder.close()
+
+
+class Mixer:
+    """
+    Sums any number of active voices into one float32 mono block.
+    When the voice cap is reached a voice is stolen according to the steal policy:
+    "oldest" replaces the longest playing voice, "quietest" the one with the lowest gain
+    and "none" refuses the new voice.
+    """
+    steal_policies = ["oldest", "quietest", "none"]
+
+    def __init__(self, sample_rate: int, max_voices: int = 16, steal_policy: str = "oldest", block_size: int = 1024):
+        if steal_policy not in self.steal_policies:
+            raise ValueError(f"Unknown voice steal policy: {steal_policy}")
+        self.sample_rate = sample_rate
+        self.max_voices = max_voices
+        self.steal_policy = steal_policy
+        self.block_size = block_size
+        self.voices: dict[int, Voice] = {}
+        # Output and work buffers are allocated once and reused for every block
+        self._out = np.zeros(block_size, dtype=np.float32)
+        self._scratch = np.zeros(block_size, dtype=np.float32)
+        self._scratch2 = np.zeros(block_size, dtype=np.float32)
+        # Gain changes and fade-outs are spread over one block, a jump from one sample to the next clicks
+        self._ramp_up = np.arange(1, block_size + 1, dtype=np.float32) / block_size
+        self._ramp_down = 1.0 - self._ramp_up
+        # Master gain of the last block
+        self._gain = None
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._woken = False
+        # Voices that started and finished in the last rendered block
+        self.started: list[Voice] = []
+        self.finished: list[Voice] = []
+        # Blocks in which a streaming voice had no decoded audio ready
+        self.starved = 0
+
+    def add_voice(self, data: np.ndarray, gain: float = 1.0, name: str = "", scale: float = 1.0,
+                  trace_id: int = 0) -> int | None:
+        """Starts a new voice and returns its id, or None if the cap is reached and nothing may be stolen."""
+        return self._add(lambda voice_id: Voice(voice_id, data, gain, name, scale, trace_id))
+
+    def add_stream(self, decoder, gain: float = 1.0, name: str = "", scale: float = 1.0,
+                   trace_id: int = 0) -> int | None:
+        """Like add_voice, but for a sound that is decoded while it plays (see StreamDecoder)."""
+        voice_id = self._add(lambda voice_id: StreamingVoice(voice_id, decoder, gain, name, scale, trace_id))
+        if voice_id is None:
+            decoder.close()
+        return voice_id
+
+    def _add(self, make_voice) -> int | None:
+        with self._condition:
+            voice = make_voice(next(self._ids))
+            if len(self.voices) >= self.max_voices:
+                victim = self._pick_victim()
+                if victim is None:
+                    print(f"Voice limit of {self.max_voices} reached. Ignoring {voice.name}.")
+                    return None
+                print(f"Voice limit reached. Stealing voice {victim.voice_id} ({victim.name}).")
+                del self.voices[victim.voice_id]
+                victim.close()
+
+            self.voices[voice.voice_id] = voice
+            self._condition.notify_all()
+            return voice.voice_id
+
+    def get_voice(self, voice_id: int) -> Voice | None:
+        with self._condition:
+            return self.voices.get(voice_id)
+
+    def _pick_victim(self) -> Voice | None:
+        if not self.voices or self.steal_policy == "none":
+            return None
+        if self.steal_policy == "quietest":
+            return min(self.voices.values(), key=lambda v: (v.gain, v.started_at))
+        return min(self.voices.values(), key=lambda v: v.started_at)
+
+    def stop_voice(self, voice_id: int, fade: bool = False) -> bool:
+        """Ends a voice right away, or with fade over the next block."""
+        with self._condition:
+            if fade:
+                voice = self.voices.get(voice_id)
+                if voice is not None:
+                    voice.fading = True
+                return voice is not None
+            voice = self.voices.pop(voice_id, None)
+        if voice is None:
+            return False
+        voice.close()
+        return True
+
+    def stop_all(self, fade: bool = False):
+        with self._condition:
+            if fade:
+                for voice in self.voices.values():
+                    voice.fading = True
+                return
+            voices = list(self.voices.values())
+            self.voices.clear()
+        for voice in voices:
+            voice.close()
+
+    def has_voices(self) -> bool:
+        with self._condition:
+            return bool(self.voices)
+
+    def wait_for_voices(self, timeout: float = None) -> bool:
+        with self._condition:
+            self._condition.wait_for(lambda: bool(self.voices) or self._woken, timeout)
+            self._woken = False
+            return bool(self.voices)
+
+    def wake(self):
+        """Wakes up anyone blocked in wait_for_voices (e.g. on shutdown)."""
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def render(self, master_gain: float = 1.0) -> np.ndarray | None:
+        """
+        Mixes the next block of all voices. Returns None if nothing is playing.
+        The returned array is the mixer's own output buffer. It is only valid until the next call to render().
+        """
+        with self._condition:
+            self.started.clear()
+            self.finished.clear()
+            if not self.voices:
+                return None
+
+            out = self._out
+            scratch = self._scratch
+            block_size = self.block_size
+            if self._gain is None:
+                self._gain = master_gain
+            # Without a gain change the master gain is part of the voice gain, that saves a pass over the block
+            ramp = master_gain != self._gain
+            voice_master = 1.0 if ramp else master_gain
+            mixed = False
+            now = time.monotonic()
+            for voice in self.voices.values():
+                if voice.first_block_at is None:
+                    voice.first_block_at = now
+                    self.started.append(voice)
+                gain = voice.gain * voice.scale * voice_master
+                segment = voice.read(block_size)
+                count = len(segment)
+                if count == block_size and not voice.fading:
+                    # The usual case: a whole block, so no slices are needed. The first voice is written directly.
+                    if mixed:
+                        np.multiply(segment, gain, out=scratch, casting='unsafe')
+                        np.add(out, scratch, out=out)
+                    else:
+                        np.multiply(segment, gain, out=out, casting='unsafe')
+                        mixed = True
+                    filled = count
+                else:
+                    if not mixed:
+                        out.fill(0.0)
+                        mixed = True
+                    filled = self._mix_partial(voice, segment, gain)
+                if voice.done or voice.fading:
+                    self.finished.append(voice)
+                elif filled < block_size:
+                    self.starved += 1
+
+            for voice in self.finished:
+                del self.voices[voice.voice_id]
+                voice.close()
+
+            if ramp:
+                # Goes from the old to the new gain over this block
+                np.multiply(self._ramp_up, master_gain - self._gain, out=scratch)
+                np.add(scratch, self._gain, out=scratch)
+                np.multiply(out, scratch, out=out)
+                self._gain = master_gain
+            soft_limit(out, self._scratch, self._scratch2)
+            return out
+
+    def _mix_partial(self, voice: Voice, segment: np.ndarray, gain: float) -> int:
+        """
+        Adds a voice that is fading or doesn't fill the block with one read to the output buffer.
+        A streaming voice can cross from one decoded block into the next, so this may take several reads.
+        Returns the number of samples mixed.
+        """
+        out = self._out
+        scratch = self._scratch
+        filled = 0
+        while True:
+            count = len(segment)
+            if not count:
+                break
+            # segment * gain goes into scratch and is added in place. No temporary arrays are created.
+            np.multiply(segment, gain, out=scratch[:count], casting='unsafe')
+            if voice.fading:
+                np.multiply(scratch[:count], self._ramp_down[filled:filled + count], out=scratch[:count])
+            np.add(out[filled:filled + count], scratch[:count], out=out[filled:filled + count])
+            filled += count
+            if filled >= self.block_size:
+                break
+            segment = voice.read(self.block_size - filled)
+        return filled
+
+
+def soft_limit(block: np.ndarray, scratch: np.ndarray, scratch2: np.ndarray, threshold: float = 0.8) -> np.ndarray:
+    """
+    Leaves samples below the threshold untouched and bends everything above it smoothly towards 1.0.
+    Works in place on block. The two scratch buffers must have the same size as the block.
+    """
+    # Most blocks never reach the threshold. One abs() into scratch checks that without allocating,
+    # and the absolute values are reused below. argmax() has much less per-call overhead than max().
+    magnitude = scratch2
+    np.abs(block, out=magnitude)
+    if magnitude[magnitude.argmax()] <= threshold:
+        return block
+
+    headroom = 1.0 - threshold
+    below = scratch
+    np.minimum(magnitude, threshold, out=below)
+    # What is left above the threshold, zero for the samples below it
+    over = magnitude
+    np.subtract(magnitude, below, out=over)
+    np.multiply(over, 1.0 / headroom, out=over)
+    np.tanh(over, out=over)
+    np.multiply(over, headroom, out=over)
+
+    np.add(below, over, out=below)
+    np.copysign(below, block, out=block)
+    return block
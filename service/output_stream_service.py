@@ -0,0 +1,158 @@
+import shutil
+import subprocess
+import threading
+
+from service.trace_service import tracer
+
+
+class PlaybackTool:
+    """Describes how to start the raw playback helper (pw-play or paplay) for a target sink."""
+    def __init__(self, command: str, target_flag: str, format_flag: str):
+        self.command = command
+        self.target_flag = target_flag
+        self.format_flag = format_flag
+
+    def build_command(self, target: str, sample_rate: int, channels: int = 1) -> list[str]:
+        return [
+            self.command,
+            f'{self.target_flag}={target}',
+            self.format_flag,
+            f'--rate={sample_rate}',
+            f'--channels={channels}',
+            '--raw',
+            '-'
+        ]
+
+
+_detected_tool = None
+_detect_lock = threading.Lock()
+
+
+def detect_playback_tool() -> PlaybackTool:
+    """Finds the playback helper once per session. pw-play is preferred, paplay is the fallback."""
+    global _detected_tool
+    with _detect_lock:
+        if _detected_tool is None:
+            use_pw = False
+            if shutil.which('pw-play'):
+                try:
+                    subprocess.run(['pw-play', '--version'], capture_output=True, check=True)
+                    use_pw = True
+                except (FileNotFoundError, subprocess.CalledProcessError):
+                    pass
+
+            if use_pw:
+                _detected_tool = PlaybackTool('pw-play', '--target', '--format=f32')
+            else:
+                _detected_tool = PlaybackTool('paplay', '--device', '--format=float32ne')
+            print(f"Using playback helper: {_detected_tool.command}")
+        return _detected_tool
+
+
+class OutputStream:
+    """
+    A long-lived helper process that plays raw float32 samples written to its stdin.
+    The process is started once and kept for the whole session. If it dies it is restarted on the next write.
+    """
+    def __init__(self, target: str, sample_rate: int, channels: int = 1):
+        self.target = target
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.process = None
+        self.restarts = 0
+        self._generation = 0
+        # The last helper killed on purpose. A write that only started after the kill fails on it, too.
+        self._killed = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            self._open_locked()
+
+    def _open_locked(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        tool = detect_playback_tool()
+        cmd = tool.build_command(self.target, self.sample_rate, self.channels)
+        # Unbuffered, so writes go straight from the caller's memory into the pipe
+        with tracer.span("spawn helper"):
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=0)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def reconfigure(self, target: str, sample_rate: int):
+        """Reopens the stream only if the target or the sample format actually changed."""
+        # Checked without the lock first. The mix thread holds it while it waits for room in the pipe.
+        if target == self.target and sample_rate == self.sample_rate and self.process is not None:
+            return
+        with self._lock:
+            if target == self.target and sample_rate == self.sample_rate and self.process is not None:
+                return
+            self._close_locked()
+            self.target = target
+            self.sample_rate = sample_rate
+            self._open_locked()
+
+    def write(self, data) -> bool:
+        """
+        Writes samples to the helper. Reopens the helper once if it died on its own.
+        Accepts anything with the buffer protocol (e.g. a float32 numpy array). The data is not copied.
+        """
+        view = memoryview(data).cast('B')
+        with self._lock:
+            generation = self._generation
+            for _ in range(2):
+                self._open_locked()
+                process = self.process
+                try:
+                    pipe = process.stdin
+                    written = 0
+                    while written < len(view):
+                        written += pipe.write(view[written:])
+                    return True
+                except (BrokenPipeError, OSError, ValueError, AttributeError):
+                    if generation != self._generation or process is self._killed:
+                        # restart() or close() killed the helper on purpose, the data is not wanted anymore
+                        return False
+                    print(f"Output stream to {self.target} died. Reopening...")
+                    self._close_locked()
+                    self.restarts += 1
+            return False
+
+    def _kill(self):
+        # Killing happens without the lock so a writer blocked on a full pipe gets released
+        self._generation += 1
+        proc = self.process
+        self._killed = proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+    def restart(self):
+        """Drops everything still buffered in the helper by replacing the process."""
+        self._kill()
+        with self._lock:
+            self._close_locked()
+            self._open_locked()
+
+    def close(self):
+        self._kill()
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        proc = self.process
+        self.process = None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.terminate()
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
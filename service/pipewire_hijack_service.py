@@ -1,220 +1,590 @@
 #!/usr/bin/env python3
 
-import json
 import subprocess
-import sys
 import threading
-import soundfile as sf
-import numpy as np
+import time
 
 from model.sound_effect import SoundEffect
 from service.settings_service import settings_service
+from service.output_stream_service import OutputStream
+from service.fanout_service import BlockRing, SinkWriter
+from service.mixer_service import Mixer
+from service.decode_service import StreamDecoder
+from service.disk_cache_service import disk_cache
+from service.loudness_service import loudness_store
+from service.effects_service import EffectChain
+from service.audio_cache_service import AudioCache, CachedSound
+from service.audio_state_service import audio_state
+from service.routing_transaction import RoutingTransaction, RoutingStep, RoutingError
+from service.trace_service import tracer
+from service.signal_service import signals
 
 class SoundboardHijacker:
+    # Buffer of the loopback that feeds the real mic into the virtual mic sink
+    loopback_latency_ms = 20
+    # Rate of the mixer and the output streams if the default sink doesn't tell us its own.
+    # Sounds are converted to the rate when they are loaded, so the sound server never has to resample.
+    stream_rate = 48000
+    # Mixer blocks the speakers may fall behind the virtual mic before their oldest blocks are dropped
+    ring_slots = 8
+    # What happens when the speakers can't keep up. "drop" keeps the virtual mic going, "block" waits for them.
+    monitor_policy = "drop"
+
     def __init__(self):
         self.original_mic = None
         self.def_sink = None
-        self.playback_processes = []
-        self._playback_lock = threading.Lock()
+        self.output_streams: list[OutputStream] = []
+        # The mixer renders each block once into the ring, one writer per stream drains it
+        self.ring = None
+        self.sink_writers: list[SinkWriter] = []
+        self._streams_lock = threading.Lock()
+        self.mixer = Mixer(self.stream_rate,
+                           max_voices=settings_service.settings["max_voices"],
+                           steal_policy=settings_service.settings["voice_steal_policy"])
+        self._mix_thread = None
+        self._mix_shutdown = threading.Event()
+        self.master_gain = 0.9 * settings_service.settings["global_volume"]
+        # Volume changes and stops the mix thread hasn't rendered yet, as (trace id, time ns)
+        self._pending_controls: list[tuple[int, int]] = []
+        self._controls_lock = threading.Lock()
+        # When everything the mix thread rendered so far will have been played, if the sinks play in real time
+        self.play_until = 0.0
+        self.resample_quality = settings_service.settings["resample_quality"]
+        self.set_volume(settings_service.settings["global_volume"])
         self.module_ids = []
-        self.audio_cache = {}
+        # The loopback is the only module that depends on the selected mic. switch_mic() replaces just this one.
+        self.loopback_id = None
+        # The default source before the virtual mic became the default. Only known if setup() used the default.
+        self.system_mic = None
+        self.mic_switch_timings: dict[str, float] = {}
+        # Serializes setup() and switch_mic(), which both change the modules
+        self._routing_lock = threading.Lock()
+        self.setup_report = ""
+        self.setup_error = ""
+        # Set when the setup started by start_setup() is done, successful or not. Nothing plays before.
+        self.ready = threading.Event()
+        self.setup_state = "not started"#not started, starting, ready or failed
+        self._setup_lock = threading.Lock()
+        self._setup_running = False
+        self._setup_pending = False
+        self.setup_timings: list[tuple[str, float]] = []
+        self.audio_cache = AudioCache(settings_service.settings["memory_cache_max_mb"] * 1024 * 1024,
+                                      settings_service.settings["cache_sample_format"])
+
+    def setup(self) -> bool:
+        """
+        Creates the virtual mic. Independent pactl calls run at the same time. If a required step fails,
+        everything done so far is rolled back. Returns False in that case.
+        Blocks until it is done. The app uses start_setup() instead.
+        """
+        with self._routing_lock:
+            ok = self._setup_routing()
+        with self._setup_lock:
+            if self._setup_pending:
+                #start_setup() was called meanwhile and runs it again
+                return ok
+            self.setup_state = "ready" if ok else "failed"
+            self.ready.set()
+        signals.audio_setup_changed.emit(self.setup_state)
+        return ok
+
+    def _setup_routing(self) -> bool:
+        transaction = RoutingTransaction()
+        self.setup_error = ""
+
+        # Starts watching the audio server. The first call reads the current devices and modules.
+        with transaction.timed("audio state"):
+            audio_state.start()
 
-    def setup(self):
         print("Cleaning up...")
-        self.cleanup()
+        with transaction.timed("cleanup"):
+            self.cleanup()
 
         print("Setting up virtual mic...")
-        try:
-            """Tries to get the original mic and default sink. This is not only useful for restoring the original mic but is also a test to see if pipewire/pulseaudio is running"""
-            output_device_setting = settings_service.settings["output_device"]
-            if output_device_setting == "":
-                print("No output device set. Using default.")
-                self.original_mic = subprocess.check_output(['pactl', 'get-default-source'], text=True).strip()
-                print("using default mic:", self.original_mic)
-            else:
-                print("using output device:", output_device_setting)
-                self.original_mic = self.get_source_by_name(output_device_setting)
-
-            self.def_sink = subprocess.check_output(['pactl', 'get-default-sink'], text=True).strip()
-        except subprocess.CalledProcessError:
-            print("❌ Error: Audio system not responding. Is PipeWire/PulseAudio running?")
-            sys.exit(1)
-
-        # 1. Create Routing Topology
-        # We create one null sink that acts as our "Virtual Microphone"
-        res = subprocess.run(['pactl', 'load-module', 'module-null-sink', 'sink_name=virtual_mic_sink',
-                        'sink_properties=device.description="Virtual_Mic_Sink"'], capture_output=True, text=True)
-        if res.returncode == 0:
-            self.module_ids.append(res.stdout.strip())
-        
-        # Expose the monitor of the null sink as a proper Microphone source
-        res = subprocess.run(
-            ['pactl', 'load-module', 'module-remap-source', 'master=virtual_mic_sink.monitor', 'source_name=hijacked_mic',
-             'source_properties=device.description="Hijacked_Mic"'], capture_output=True, text=True)
-        if res.returncode == 0:
-            self.module_ids.append(res.stdout.strip())
-
-        # 2. Patch Cables
-        # Route real mic into the virtual mic sink
-        res = subprocess.run(['pactl', 'load-module', 'module-loopback', f'source={self.original_mic}', 'sink=virtual_mic_sink',
-                        'latency_msec=20'], capture_output=True, text=True)
-        if res.returncode == 0:
-            self.module_ids.append(res.stdout.strip())
-
-        # Set the virtual mic as default system input
-        subprocess.run(['pactl', 'set-default-source', 'hijacked_mic'])
-
-        # Explicitly set volumes to 100% and unmute to avoid "lower volume" or "no sound" issues
-        subprocess.run(['pactl', 'set-sink-volume', 'virtual_mic_sink', '100%'], capture_output=True)
-        subprocess.run(['pactl', 'set-sink-mute', 'virtual_mic_sink', '0'], capture_output=True)
-        subprocess.run(['pactl', 'set-source-volume', 'hijacked_mic', '100%'], capture_output=True)
-        subprocess.run(['pactl', 'set-source-mute', 'hijacked_mic', '0'], capture_output=True)
+        with transaction.timed("query defaults"):
+            try:
+                """Tries to get the original mic and default sink. This is not only useful for restoring the original mic but is also a test to see if pipewire/pulseaudio is running"""
+                output_device_setting = settings_service.settings["output_device"]
+                if output_device_setting == "":
+                    print("No output device set. Using default.")
+                    self.original_mic = subprocess.check_output(['pactl', 'get-default-source'], text=True).strip()
+                    self.system_mic = self.original_mic
+                    print("using default mic:", self.original_mic)
+                else:
+                    print("using output device:", output_device_setting)
+                    self.original_mic = self.get_source_by_name(output_device_setting)
+                    self.system_mic = None
+
+                self.def_sink = subprocess.check_output(['pactl', 'get-default-sink'], text=True).strip()
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                self.setup_error = "Audio system not responding. Is PipeWire/PulseAudio running?"
+                print(f"❌ Error: {self.setup_error}")
+                return False
 
+        # Everything runs at the native rate of the speakers. The virtual mic sink is created with the same rate.
+        self._use_sample_rate(audio_state.get_sink_rate(self.def_sink) or self.stream_rate)
+
+        def unload(module_id):
+            return ['pactl', 'unload-module', module_id.strip()]
+
+        try:
+            # 1. Create Routing Topology
+            # We create one null sink that acts as our "Virtual Microphone"
+            self.module_ids += transaction.run_stage([
+                RoutingStep("load null sink", ['pactl', 'load-module', 'module-null-sink', 'sink_name=virtual_mic_sink',
+                                               f'rate={self.mixer.sample_rate}',
+                                               'sink_properties=device.description="Virtual_Mic_Sink"'], undo=unload),
+            ])
+
+            # Expose the monitor of the null sink as a proper Microphone source
+            # 2. Patch Cables
+            # Route real mic into the virtual mic sink. Both only need the sink, so they are loaded together.
+            remap_id, self.loopback_id = transaction.run_stage([
+                RoutingStep("load remap source", ['pactl', 'load-module', 'module-remap-source',
+                                                  'master=virtual_mic_sink.monitor', 'source_name=hijacked_mic',
+                                                  'source_properties=device.description="Hijacked_Mic"'], undo=unload),
+                RoutingStep("load loopback", self._loopback_args(self.original_mic), undo=unload),
+            ])
+            self.module_ids += [remap_id, self.loopback_id]
+
+            # Set the virtual mic as default system input
+            # Explicitly set volumes to 100% and unmute to avoid "lower volume" or "no sound" issues
+            original_mic = self.original_mic
+            transaction.run_stage([
+                RoutingStep("set default source", ['pactl', 'set-default-source', 'hijacked_mic'],
+                            undo=lambda _: ['pactl', 'set-default-source', original_mic] if original_mic else None),
+                RoutingStep("set sink volume", ['pactl', 'set-sink-volume', 'virtual_mic_sink', '100%'], required=False),
+                RoutingStep("unmute sink", ['pactl', 'set-sink-mute', 'virtual_mic_sink', '0'], required=False),
+                RoutingStep("set source volume", ['pactl', 'set-source-volume', 'hijacked_mic', '100%'], required=False),
+                RoutingStep("unmute source", ['pactl', 'set-source-mute', 'hijacked_mic', '0'], required=False),
+            ])
+        except RoutingError as e:
+            self.setup_error = f"Virtual mic setup failed at '{e.step}': {e}"
+            print(f"❌ Error: {self.setup_error}. Rolling back...")
+            transaction.rollback()
+            self.module_ids.clear()
+            self.loopback_id = None
+            self.setup_timings = transaction.timings
+            self.setup_report = transaction.report()
+            print(self.setup_report)
+            return False
+
+        # 3. Output Streams
+        # Start the playback helpers now so a trigger only has to push samples
+        with transaction.timed("open output streams"):
+            self._open_streams()
+            self._start_mix_thread()
+
+        self.setup_timings = transaction.timings
+        self.setup_report = transaction.report()
+        print(self.setup_report)
         print(f"✅ Setup complete. Virtual Mic Active.")
+        return True
+
+    def _loopback_args(self, source: str) -> list[str]:
+        return ['pactl', 'load-module', 'module-loopback', f'source={source}', 'sink=virtual_mic_sink',
+                f'latency_msec={self.loopback_latency_ms}']
+
+    def switch_mic(self) -> bool:
+        """
+        Feeds the mic from the "output_device" setting into the virtual mic without rebuilding it.
+        The new loopback is loaded before the old one is unloaded, so the virtual mic sink and Hijacked_Mic stay up
+        and the mic never drops out (both mics are heard for the moment in between). Falls back to a full setup if
+        the virtual mic isn't running. The timings of the switch are kept in mic_switch_timings.
+        """
+        with self._routing_lock:
+            device = settings_service.settings["output_device"]
+            source = self.system_mic if device == "" else self.get_source_by_name(device)
+            if self.setup_state != "ready" or self.loopback_id is None or not source:
+                switched = None
+            elif source == self.original_mic:
+                return True
+            else:
+                switched = self._replace_loopback(source)
+        if switched is None:
+            self.start_setup()
+            return True
+        return switched
+
+    def _replace_loopback(self, source: str) -> bool:
+        start = time.perf_counter()
+        result = subprocess.run(self._loopback_args(source), capture_output=True, text=True)
+        loaded = time.perf_counter()
+        if result.returncode != 0:
+            print(f"❌ Error: Could not switch the mic to {source}: {result.stderr.strip()}. Keeping {self.original_mic}.")
+            return False
+        new_id = result.stdout.strip()
+
+        old_id = self.loopback_id
+        subprocess.run(['pactl', 'unload-module', old_id], capture_output=True)
+        unloaded = time.perf_counter()
+        self.module_ids = [new_id if mid == old_id else mid for mid in self.module_ids]
+        self.loopback_id = new_id
+        self.original_mic = source
+
+        # The old loopback is only unloaded after the new one exists, so the sink is never without a mic.
+        # overlap is the longest time both mics were mixed (until the unload returned).
+        self.mic_switch_timings = {
+            "load": (loaded - start) * 1000,
+            "overlap": (unloaded - loaded) * 1000,
+            "total": (unloaded - start) * 1000,
+        }
+        print(f"🎤 Switched mic to {source} in {self.mic_switch_timings['total']:.1f} ms "
+              f"(overlap {self.mic_switch_timings['overlap']:.1f} ms)")
+        return True
+
+    def start_mic_switch(self):
+        """switch_mic() on a background thread, pactl calls don't block the UI."""
+        threading.Thread(target=self.switch_mic, name="mic-switch", daemon=True).start()
+
+    def start_setup(self):
+        """
+        Runs setup() on a background thread, so the window doesn't wait for the audio server.
+        signals.audio_setup_changed tells the UI. A request while a setup is running runs it again afterwards.
+        """
+        with self._setup_lock:
+            self.ready.clear()
+            self.setup_state = "starting"
+            self._setup_pending = True
+            running = self._setup_running
+            self._setup_running = True
+        signals.audio_setup_changed.emit(self.setup_state)
+        if running:
+            return
+        threading.Thread(target=self._setup_loop, name="audio-setup", daemon=True).start()
+
+    def _setup_loop(self):
+        while True:
+            with self._setup_lock:
+                if not self._setup_pending:
+                    self._setup_running = False
+                    return
+                self._setup_pending = False
+            self.setup()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Waits for a running setup (so nothing is left half created) and restores the audio state."""
+        with self._setup_lock:
+            self._setup_pending = False
+        if self.setup_state == "starting":
+            self.ready.wait(timeout)
+        self.cleanup()
 
-    def _play_thread(self, audio_data, sample_rate, effect_volume):
-        with self._playback_lock:
+    def _use_sample_rate(self, sample_rate: int):
+        if sample_rate != self.mixer.sample_rate:
+            print(f"Output rate: {sample_rate} Hz")
+            # Nothing is playing here (setup ran cleanup), so the mixer can simply switch
+            self.mixer.sample_rate = sample_rate
+
+    def _open_streams(self):
+        """
+        Opens (or keeps) one long-lived output stream per target: the virtual mic and the speakers.
+        Each gets its own writer thread, so speakers that stop reading never hold up the virtual mic.
+        """
+        targets = ['virtual_mic_sink', self.def_sink]
+        with self._streams_lock:
+            if not self.output_streams:
+                self.output_streams = [OutputStream(target, self.mixer.sample_rate) for target in targets]
+                self.ring = BlockRing(self.ring_slots, self.mixer.block_size)
+                self.sink_writers = [SinkWriter(self.ring, stream, policy)
+                                     for stream, policy in zip(self.output_streams, ["block", self.monitor_policy])]
+                for writer in self.sink_writers:
+                    writer.start()
+            for stream, target in zip(self.output_streams, targets):
+                stream.reconfigure(target, self.mixer.sample_rate)
+            return list(self.output_streams)
+
+    def _close_streams(self):
+        with self._streams_lock:
+            if self.ring is not None:
+                self.ring.close()
+            # Closing kills the helpers, which releases writers blocked on a full pipe
+            for stream in self.output_streams:
+                stream.close()
+            for writer in self.sink_writers:
+                writer.join()
+            self.output_streams = []
+            self.sink_writers = []
+            self.ring = None
+
+    @property
+    def underruns(self) -> int:
+        """Times the virtual mic ran dry while sounds were playing."""
+        return sum(writer.underruns for writer in self.sink_writers if writer.policy == "block")
+
+    def _start_mix_thread(self):
+        if self._mix_thread is not None and self._mix_thread.is_alive():
+            return
+        self._mix_shutdown.clear()
+        self._mix_thread = threading.Thread(target=self._mix_loop, daemon=True)
+        self._mix_thread.start()
+
+    def _stop_mix_thread(self):
+        self._mix_shutdown.set()
+        self.mixer.wake()
+        if self._mix_thread is not None:
+            self._mix_thread.join(timeout=1)
+        self._mix_thread = None
+
+    def _mix_loop(self):
+        """
+        Renders the mixer block by block into the ring the sink writers drain.
+        With paced output it stays at most output_lookahead_ms ahead of the clock, so a new volume or a stop
+        reaches the speakers after that instead of after everything the pipes and the sound server can hold.
+        """
+        playing = False
+        while not self._mix_shutdown.is_set():
+            if not self.mixer.wait_for_voices(timeout=0.5):
+                playing = False
+                with self._controls_lock:
+                    self._pending_controls.clear()
+                continue
             try:
-                # Define targets: our virtual mic and the user's speakers
-                targets = [
-                    ('pw-play', '--target=virtual_mic_sink'),
-                    ('pw-play', f'--target={self.def_sink}')
-                ]
-                
-                # Check if pw-play exists by trying to run it
-                subprocess.run(['pw-play', '--version'], capture_output=True, check=True)
-                use_pw = True
-            except (FileNotFoundError, subprocess.CalledProcessError):
-                use_pw = False
-                targets = [
-                    ('paplay', '--device=virtual_mic_sink'),
-                    ('paplay', f'--device={self.def_sink}')
-                ]
-
-            for cmd_base, target_flag in targets:
-                cmd = [
-                    cmd_base,
-                    target_flag,
-                    '--format=f32' if use_pw else '--format=float32ne',
-                    f'--rate={sample_rate}',
-                    '--channels=1',
-                    '--raw',
-                    '-'
-                ]
-                proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-                self.playback_processes.append(proc)
-
-        processes = list(self.playback_processes)
-        try:
-            # We work with chunks of the float32 array directly to apply volume in real-time
-            chunk_samples = 1024  # About 23ms at 44.1kHz
-            for i in range(0, len(audio_data), chunk_samples):
-                chunk = audio_data[i:i + chunk_samples]
-                
-                # Apply current volumes: 0.9 (headroom) * effect_volume * global_volume
-                current_global_vol = settings_service.settings.get("global_volume", 1.0)
-                final_chunk = (chunk * 0.9 * effect_volume * current_global_vol).astype(np.float32)
-                chunk_bytes = final_chunk.tobytes()
-
-                for proc in processes:
-                    if proc and proc.stdin:
-                        try:
-                            proc.stdin.write(chunk_bytes)
-                        except BrokenPipeError:
-                            pass
-            
-            for proc in processes:
-                if proc and proc.stdin:
-                    try:
-                        proc.stdin.close()
-                    except (BrokenPipeError, OSError):
-                        pass
-                proc.wait()
-                
-        except Exception as e:
-            print(f"❌ Error during playback streaming: {e}")
-        finally:
-            with self._playback_lock:
-                # Only clear if these are the same processes we started
-                if all(p in self.playback_processes for p in processes):
-                    for p in processes:
-                        if p in self.playback_processes:
-                            self.playback_processes.remove(p)
+                now = time.monotonic()
+                play_until = self.play_until = max(self.play_until, now)
+                if settings_service.settings["paced_output"]:
+                    ahead = play_until - now - settings_service.settings["output_lookahead_ms"] / 1000
+                    if ahead > 0 and self._mix_shutdown.wait(ahead):
+                        break
+
+                with self._controls_lock:
+                    controls, self._pending_controls = self._pending_controls, []
+                block = self.mixer.render(self.master_gain)
+                if block is None:
+                    playing = False
+                    continue
 
-    def play(self, effect: SoundEffect):
-        """Plays a SoundEffect object using its specific volume setting."""
-        path = effect.mp3_path
+                ring = self.ring
+                if ring is None:
+                    continue
+                if not playing:
+                    # The writers count underruns per stretch of continuous playback
+                    ring.new_session()
+                    playing = True
+                # Waits until the virtual mic writer has written the block before
+                while not ring.push(block, timeout=0.5):
+                    if self._mix_shutdown.is_set() or ring.closed:
+                        break
+
+                # This block is the first one with the change in it
+                audible_ns = int(play_until * 1e9)
+                for trace_id, at_ns in controls:
+                    tracer.record(trace_id, "audible", at_ns, max(at_ns, audible_ns))
+                self.play_until = play_until + len(block) / self.mixer.sample_rate
+
+                now_ns = time.monotonic_ns()
+                for voice in self.mixer.started:
+                    tracer.record(voice.trace_id, "first write", int(voice.started_at * 1e9), now_ns)
+                for voice in self.mixer.finished:
+                    tracer.record(voice.trace_id, "finish", int(voice.started_at * 1e9), now_ns)
+            except Exception as e:
+                print(f"❌ Error during playback streaming: {e}")
 
+    def play(self, effect: SoundEffect):
+        """
+        Plays a SoundEffect object using its specific volume setting.
+        The sound is layered on top of whatever is already playing. Returns the voice id or None.
+        """
+        if self.setup_state != "ready":
+            # Without the virtual mic there is nothing to play into
+            if self.setup_state == "starting":
+                print(f"⏳ Audio is still being set up. Ignoring {effect.name}.")
+            else:
+                print(f"❌ Audio isn't set up ({self.setup_error or self.setup_state}). Ignoring {effect.name}.")
+            return None
         try:
-            # 1. Check Cache first
-            if str(path) not in self.audio_cache:
-                data, fs = sf.read(str(path))
-
-                # Convert to mono
-                if len(data.shape) > 1:
-                    data = np.mean(data, axis=1)
-
-                # Normalize to peak
-                max_val = np.max(np.abs(data))
-                if max_val > 0:
-                    data = (data / max_val)
-
-                # Prepend the 'wake up' noise for Krisp (Optional)
-                if settings_service.settings["wakeup_noise"]:
-                    print("Adding wakeup noise...")
-                    noise_floor = np.random.normal(0, 0.005, int(fs * 0.1))
-                    processed_data = np.concatenate([noise_floor, data])
-
-                    self.audio_cache[str(path)] = (processed_data, fs)
+            with tracer.trace(effect.name) as trace_id:
+                # Long files are decoded while they play, everything else is decoded once and cached
+                decoder = None
+                streamed = effect.streamed if effect.streamed is not None else self.is_streamed(effect.mp3_path)
+                if streamed:
+                    decoder, gain = self.open_decoder(effect)
                 else:
-                    self.audio_cache[str(path)] = (data, fs)
-
-            audio_data, sample_rate = self.audio_cache[str(path)]
+                    sound = self.load_sound(effect)
+
+                # Follow output device changes. The audio state service keeps this up to date without a pactl call.
+                with tracer.span("sink query"):
+                    self.def_sink = audio_state.default_sink or self.def_sink
+                with tracer.span("stream open"):
+                    self._open_streams()
+                    self._start_mix_thread()
+
+                if decoder is not None:
+                    # The first block was decoded meanwhile. Starting before it is there would start with a gap.
+                    with tracer.span("first block"):
+                        decoder.wait_ready(timeout=2.0)
+                    with tracer.span("queue voice"):
+                        voice_id = self.mixer.add_stream(decoder, effect.volume, effect.name, gain, trace_id)
+                else:
+                    with tracer.span("queue voice"):
+                        voice_id = self.mixer.add_voice(sound.data, effect.volume, effect.name, sound.scale, trace_id)
+            if voice_id is not None:
+                print(f"🔊 Playing: {effect.name} (Vol: {effect.volume:.2f}, Voice: {voice_id})")
+            return voice_id
 
-            # Refresh default sink to handle output device changes
-            try:
-                self.def_sink = subprocess.check_output(['pactl', 'get-default-sink'], text=True).strip()
-            except subprocess.CalledProcessError:
-                pass
+        except Exception as e:
+            print(f"❌ Playback error for {effect.name}: {e}")
+            return None
 
-            self.stop() # Stop any current playback
+    def load_sound(self, effect: SoundEffect) -> CachedSound:
+        """Returns the decoded samples of a sound, ready for the mixer. Decodes (or maps from disk) on a cache miss."""
+        path = effect.mp3_path
 
-            print(f"🔊 Playing: {effect.name} (Vol: {effect.volume:.2f})")
+        # 1. Check Cache first. The key holds every processing option that changes the samples.
+        # The disk cache turns a cold decode into a memory map after restarts. The effects are rendered once per chain.
+        wakeup_noise = settings_service.settings["wakeup_noise"]
+        sample_rate = self.mixer.sample_rate
+        normalization = self._normalization()
+        cache_key = (str(path), wakeup_noise, sample_rate, self.resample_quality, normalization,
+                     EffectChain.chain_hash(effect.effects))
+        with tracer.span("cache lookup"):
+            sound = self.audio_cache.get(cache_key)
+        if sound is None:
+            data = disk_cache.load(path, sample_rate, self.resample_quality)
+
+            # The level is analyzed once per file and only applied as the scale of the cached sound
+            with tracer.span("loudness"):
+                gain = loudness_store.gain_for(loudness_store.ensure(path, data, sample_rate), *normalization)
+
+            effects = self._effect_chain(effect, gain)
+            if effects:
+                with tracer.span("effects"):
+                    data = EffectChain(effects, sample_rate, len(data), self.resample_quality).render(data)
+
+            sound = self.audio_cache.put(cache_key, data, gain)
+        return sound
 
-            thread = threading.Thread(target=self._play_thread, args=(audio_data, sample_rate, effect.volume))
-            thread.daemon = True
-            thread.start()
+    @staticmethod
+    def _effect_chain(effect: SoundEffect, gain: float) -> list[dict]:
+        """The effects of a sound, plus the global ones."""
+        effects = list(effect.effects)
+        # The 'wake up' noise for Krisp (Optional) plays before the sound. It is the last effect and divided by the
+        # gain, so neither the other effects nor the normalization change its level.
+        if settings_service.settings["wakeup_noise"]:
+            effects.append({"type": "noise", "ms": 100, "level": 0.005 / gain})
+        return effects
 
-        except Exception as e:
-            print(f"❌ Playback error for {effect.name}: {e}")
+    @staticmethod
+    def _normalization() -> tuple[str, float]:
+        settings = settings_service.settings
+        return settings["normalization"], settings["loudness_target_lufs"]
 
-    def stop(self):
-        """Immediately stops all playing sounds."""
-        with self._playback_lock:
-            if self.playback_processes:
-                for proc in self.playback_processes:
-                    proc.terminate()
-                self.playback_processes.clear()
-                print("🛑 Playback stopped.")
+    @staticmethod
+    def is_streamed(path) -> bool:
+        """Files over the streaming threshold aren't decoded up front, so their size doesn't matter."""
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return False
+        return size > settings_service.settings["streaming_threshold_mb"] * 1024 * 1024
+
+    def open_decoder(self, effect: SoundEffect) -> tuple[StreamDecoder, float]:
+        """Starts decoding a long file block by block. Returns the decoder and the gain to play it with."""
+        # Nothing is analyzed here. Without stored loudness data (see loudness_service) the file plays as it is.
+        entry = loudness_store.get(effect.mp3_path)
+        gain = loudness_store.gain_for(entry, *self._normalization()) if entry else 1.0
+
+        with tracer.span("open decoder"):
+            decoder = StreamDecoder(effect.mp3_path, self.mixer.sample_rate, self.resample_quality,
+                                    effects=self._effect_chain(effect, gain))
+        return decoder, gain
+
+    def set_volume(self, volume: float):
+        """Sets the global volume. The master gain is only recomputed here and not for every block."""
+        settings_service.settings["global_volume"] = volume
+        # 0.9 (headroom) * global_volume. The effect volume is applied per voice.
+        # The mixer ramps to a new gain over one block.
+        self._control("volume")
+        self.master_gain = 0.9 * volume
+
+    def _control(self, name: str):
+        """Starts a trace for a volume change or stop. The mix thread adds when it becomes audible."""
+        if not self.mixer.has_voices():
+            #Nothing to hear
+            return
+        with tracer.trace(name) as trace_id:
+            with self._controls_lock:
+                self._pending_controls.append((trace_id, time.monotonic_ns()))
+
+    def stats(self) -> dict:
+        """Snapshot of the playback state for the diagnostics and the daemon. Only plain values, so it fits in JSON."""
+        with self._streams_lock:
+            restarts = sum(stream.restarts for stream in self.output_streams)
+            sinks = [writer.stats() for writer in self.sink_writers]
+        return {
+            "setup_state": self.setup_state,
+            "setup_error": self.setup_error,
+            "sample_rate": self.mixer.sample_rate,
+            "voices": len(self.mixer.voices),
+            "max_voices": self.mixer.max_voices,
+            "underruns": self.underruns,
+            "starved": self.mixer.starved,
+            "restarts": restarts,
+            "cache": self.audio_cache.stats(),
+            "disk_cache": {"bytes": disk_cache.total_bytes(), "max_bytes": disk_cache.max_bytes},
+            "sinks": sinks,
+        }
+
+    def stop(self, voice_id: int = None):
+        """
+        Stops a single voice, or all playing sounds if no voice id is given.
+        With paced output only the lookahead is buffered, so the voices just fade out over the next block.
+        Otherwise the helpers are restarted to get rid of the audio already in the pipes.
+        """
+        paced = settings_service.settings["paced_output"]
+        self._control("stop")
+        if voice_id is not None:
+            if self.mixer.stop_voice(voice_id, fade=paced):
+                print(f"🛑 Voice {voice_id} stopped.")
+            return
+
+        if paced:
+            self.mixer.stop_all(fade=True)
+            print("🛑 Playback stopped.")
+            return
+
+        self.mixer.stop_all()
+        # Restarting the helpers drops the audio that is already buffered in the ring and the pipes
+        with self._streams_lock:
+            if self.ring is not None:
+                self.ring.clear()
+            for stream in self.output_streams:
+                stream.restart()
+        # The buffered audio is gone, it won't be played anymore
+        self.play_until = 0.0
+        print("🛑 Playback stopped.")
 
     def _unload_modules(self):
         if self.module_ids:
             for mid in reversed(self.module_ids):
                 subprocess.run(['pactl', 'unload-module', mid], capture_output=True)
             self.module_ids.clear()
+            self.loopback_id = None
         else:
-            # Fallback for when we don't have IDs (e.g. initial setup cleanup)
-            # We try to unload by name to be as specific as possible
-            # Note: pactl doesn't support unloading by name directly easily without grep/awk
-            # so we keep the type-based unload as a last resort for initial cleanup
-            print("Falling back to unloading modules by type. THERE MAY BE LINGERING MODULES.")
-            subprocess.run(['pactl', 'unload-module', 'module-loopback'], capture_output=True)
-            subprocess.run(['pactl', 'unload-module', 'module-null-sink'], capture_output=True)
-            subprocess.run(['pactl', 'unload-module', 'module-remap-source'], capture_output=True)
+            # Fallback for when we don't have IDs (e.g. initial setup cleanup or a previous crash)
+            # The audio state service knows the loaded modules, so we only unload the ones pointing at our devices
+            leftovers = self._find_our_modules()
+            if leftovers:
+                print(f"Unloading {len(leftovers)} leftover modules...")
+            for mid in leftovers:
+                subprocess.run(['pactl', 'unload-module', mid], capture_output=True)
+
+    @staticmethod
+    def _find_our_modules() -> list[str]:
+        our_modules = []
+        for module in audio_state.get_modules():
+            argument = module.get("argument") or ""
+            if "virtual_mic_sink" in argument or "hijacked_mic" in argument:
+                if "index" in module:
+                    our_modules.append(str(module["index"]))
+        # Unload in reverse order of loading: loopback and remap source before the null sink
+        return sorted(our_modules, key=int, reverse=True)
 
     def cleanup(self):
         print("Restoring original audio state...")
-        self.stop()
+        self.mixer.stop_all()
+        self._stop_mix_thread()
+        self._close_streams()
         
         # Ensure we set the default source back BEFORE unloading the module it belongs to
         if self.original_mic:
@@ -234,41 +604,7 @@ class SoundboardHijacker:
     @staticmethod
     def get_all_available_microphone_devices():
         """Returns a dict mapping 'Description' -> 'Technical Name'"""
-        try:
-            # Using JSON format here is much cleaner than manual string parsing
-            result = subprocess.run(
-                ['pactl', '--format=json', 'list', 'sources'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            sources = json.loads(result.stdout)
-
-            # Map of Description -> Technical Name
-            device_map = {}
-
-            for s in sources:
-                name = s.get("name", "")
-                # Get the best available description
-                description = s.get("description") or s.get("properties", {}).get("device.description") or name
-
-                # Filter logic
-                if ".monitor" in name or name == "hijacked_mic":
-                    continue
-
-                # PulseAudio JSON structure puts device.class inside 'properties'
-                props = s.get("properties", {})
-                device_class = props.get("device.class")
-                media_class = props.get("media.class")
-
-                if device_class == "sound" or media_class == "Audio/Source":
-                    device_map[description] = name
-
-            return device_map
-        except Exception as e:
-            print(f"Error getting microphones: {e}")
-            return {}
+        return audio_state.get_sources()
 
-# Soundboard Hijacker Object generation.(maybe there is a better way to do this?)
+# Soundboard Hijacker Object generation. The setup is started by the app (start_setup()), not on import.
 sb = SoundboardHijacker()
-sb.setup()
\ No newline at end of file
@@ -0,0 +1,23 @@
+from service.pipewire_hijack_service import sb
+
+
+class Player:
+    """
+    What the UI plays through: the soundboard in this process, or the daemon once use() was given a DaemonClient.
+    Offers the calls of SoundboardHijacker the UI needs (play, stop, set_volume, start_mic_switch, stats, ...).
+    """
+    def __init__(self):
+        self.backend = None
+
+    @property
+    def remote(self) -> bool:
+        return self.backend is not None
+
+    def use(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend if self.backend is not None else sb, name)
+
+
+player = Player()
@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+
+from model.sound_effect import SoundEffect
+from service.disk_cache_service import disk_cache
+from service.loudness_service import loudness_store, analyze_file
+from service.pipewire_hijack_service import sb
+from service.settings_service import settings_service
+from service.signal_service import signals
+
+
+class PredecodeService:
+    """
+    Warms the disk cache and the loudness data for the whole library in the background,
+    so the first press of a button doesn't decode or analyze.
+    Every call to warm() starts a new generation. Jobs of older generations are skipped, which cancels a running
+    warm-up when the folder is refreshed again. An on-demand play never waits in this queue: it decodes right away,
+    and if a worker is already decoding the same file, disk_cache.load() hands over that result.
+    """
+    _report_interval = 0.1
+
+    def __init__(self, worker_count: int):
+        self.worker_count = max(1, worker_count)
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+        self._total = 0
+        self._done = 0
+        self._last_report = 0.0
+        # Off when the window is a client of the daemon. The daemon warms the caches it plays from itself.
+        self.enabled = True
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"predecode-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def warm(self, sounds: list[SoundEffect]):
+        """Cancels the current warm-up and queues every sound. Sounds that are already cached are skipped quickly."""
+        if not self.enabled:
+            signals.predecode_progress.emit(0, 0)
+            return
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._total = len(sounds)
+            self._done = 0
+            self._ensure_workers()
+            for sound in sounds:
+                self._queue.put((generation, sound.mp3_path))
+
+        print(f"Pre-decoding {len(sounds)} sounds in the background...")
+        signals.predecode_progress.emit(0, len(sounds))
+
+    def add(self, sounds: list[SoundEffect]):
+        """Queues more sounds without cancelling the current warm-up (e.g. files that just appeared in the folder)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            generation = self._generation
+            self._total += len(sounds)
+            self._ensure_workers()
+            for sound in sounds:
+                self._queue.put((generation, sound.mp3_path))
+            done, total = self._done, self._total
+        signals.predecode_progress.emit(done, total)
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            self._total = 0
+            self._done = 0
+
+    def _worker_loop(self):
+        while True:
+            generation, path = self._queue.get()
+            try:
+                if generation != self._generation:
+                    continue
+                # Sounds are decoded at the rate of the output, which is only known once the audio is set up
+                sb.ready.wait()
+                # load() returns right away for cached files and waits instead of decoding twice
+                # if the same file is being decoded by an on-demand play
+                if sb.is_streamed(path):
+                    # Long files are never cached. Only their loudness is needed before they are played.
+                    if loudness_store.get(path) is None:
+                        loudness_store.put(path, analyze_file(str(path)))
+                else:
+                    data = disk_cache.load(path, sb.mixer.sample_rate, sb.resample_quality)
+                    # Files that were cached before their loudness was known get analyzed here, not on the first play
+                    loudness_store.ensure(path, data, sb.mixer.sample_rate)
+            except Exception as e:
+                print(f"❌ Pre-decoding failed for {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+            self._report_progress(generation)
+
+    def _report_progress(self, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._done += 1
+            done, total = self._done, self._total
+            # Cached sounds finish in microseconds. Reporting every one of them would flood the GUI thread.
+            now = time.monotonic()
+            if done < total and now - self._last_report < self._report_interval:
+                return
+            self._last_report = now
+        signals.predecode_progress.emit(done, total)
+        if done == total:
+            print("✅ Pre-decoding finished.")
+
+
+predecode_service = PredecodeService(settings_service.settings["predecode_workers"])
@@ -0,0 +1,95 @@
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class RoutingError(Exception):
+    """Raised when a required routing step fails. The transaction can then be rolled back."""
+    def __init__(self, step: str, message: str):
+        super().__init__(message)
+        self.step = step
+
+
+class RoutingStep:
+    """
+    A single pactl call of the routing setup.
+    undo gets the stdout of the call and returns the command that reverts it (or None if nothing has to be done).
+    Steps that aren't required only print a warning when they fail.
+    """
+    def __init__(self, name: str, args: list[str], undo=None, required: bool = True):
+        self.name = name
+        self.args = args
+        self.undo = undo
+        self.required = required
+
+
+class RoutingTransaction:
+    """
+    Runs routing steps in stages. Steps inside a stage don't depend on each other and run at the same time,
+    so the setup costs one round trip per stage instead of one per command.
+    Every successful step registers its undo command, and rollback() reverts them in reverse order.
+    """
+    def __init__(self):
+        self.timings: list[tuple[str, float]] = []
+        self._undo_stack: list[tuple[str, list[str]]] = []
+        self._started = time.perf_counter()
+
+    def run_stage(self, steps: list[RoutingStep]) -> list[str]:
+        """Runs all steps of a stage concurrently and returns their stdout in the same order."""
+        if len(steps) == 1:
+            results = [self._run_step(steps[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+                results = list(executor.map(self._run_step, steps))
+
+        failed = None
+        outputs = []
+        for step, (result, seconds) in zip(steps, results):
+            self.timings.append((step.name, seconds))
+            if result.returncode == 0:
+                if step.undo is not None:
+                    undo_args = step.undo(result.stdout)
+                    if undo_args:
+                        self._undo_stack.append((step.name, undo_args))
+            elif step.required:
+                failed = failed or (step.name, result.stderr.strip() or f"exit code {result.returncode}")
+            else:
+                print(f"Warning: {step.name} failed: {result.stderr.strip()}")
+            outputs.append(result.stdout.strip())
+
+        if failed is not None:
+            raise RoutingError(*failed)
+        return outputs
+
+    @staticmethod
+    def _run_step(step: RoutingStep):
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(step.args, capture_output=True, text=True)
+        except FileNotFoundError as e:
+            result = subprocess.CompletedProcess(step.args, 127, "", str(e))
+        return result, time.perf_counter() - start
+
+    @contextmanager
+    def timed(self, name: str):
+        """Records the duration of work that isn't a routing step (e.g. cleanup) in the timing report."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+    def rollback(self):
+        while self._undo_stack:
+            name, args = self._undo_stack.pop()
+            print(f"Rolling back: {name}")
+            subprocess.run(args, capture_output=True)
+
+    def report(self) -> str:
+        total = time.perf_counter() - self._started
+        lines = ["Setup timings:"]
+        for name, seconds in self.timings:
+            lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<28} {total * 1000:8.1f} ms")
+        return "\n".join(lines)
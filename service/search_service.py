@@ -0,0 +1,194 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from model.sound_effect import SoundEffect
+from service.settings_service import settings_service
+from service.signal_service import signals
+
+
+class SoundSearchIndex:
+    """
+    In-memory search index over sound names, their path relative to the sound folder and their tags.
+    Prefix matches come from a sorted token list (binary search), fuzzy matches from a trigram index.
+    The index is updated sound by sound when the library changes.
+    """
+    _split_pattern = re.compile(r"[^0-9a-z]+")
+
+    # Scores of the different kinds of matches of a single search term
+    _score_exact = 3.0
+    _score_prefix = 2.0
+    _score_fuzzy = 1.0
+    # Share of a term's trigrams that must appear in a sound's tokens to count as a fuzzy match
+    _fuzzy_threshold = 0.6
+
+    def __init__(self):
+        self._sounds: dict[int, SoundEffect] = {}
+        self._ids_by_path: dict[str, int] = {}
+        self._path_of: dict[int, str] = {}
+        self._tokens_of: dict[int, set[str]] = {}
+        self._names_of: dict[int, str] = {}#lowercase name, the tie breaker of the ranking
+        self._tokens: list[tuple[str, int]] = []#sorted (token, sound id)
+        self._trigrams: dict[str, set[int]] = {}
+        self._lock = threading.Lock()
+
+    def _tokenize(self, sound: SoundEffect) -> set[str]:
+        parts = [sound.name, *sound.tags]
+        try:
+            relative = sound.mp3_path.relative_to(Path(settings_service.settings["sound_path"]))
+            parts.append(str(relative.with_suffix("")))
+        except ValueError:
+            pass
+        tokens = set()
+        for part in parts:
+            tokens.update(t for t in self._split_pattern.split(part.lower()) if t)
+        return tokens
+
+    @staticmethod
+    def _trigrams_of(text: str) -> set[str]:
+        padded = f" {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, sounds: list[SoundEffect]):
+        with self._lock:
+            for sound in sounds:
+                self._add(sound)
+
+    def _add(self, sound: SoundEffect):
+        sound_id = id(sound)
+        if sound_id in self._sounds:
+            self._remove(sound)
+        tokens = self._tokenize(sound)
+        self._sounds[sound_id] = sound
+        self._ids_by_path[str(sound.mp3_path)] = sound_id
+        self._path_of[sound_id] = str(sound.mp3_path)
+        self._tokens_of[sound_id] = tokens
+        self._names_of[sound_id] = sound.name.lower()
+        for token in tokens:
+            bisect.insort(self._tokens, (token, sound_id))
+            for trigram in self._trigrams_of(token):
+                self._trigrams.setdefault(trigram, set()).add(sound_id)
+
+    def remove(self, sounds: list[SoundEffect]):
+        with self._lock:
+            for sound in sounds:
+                self._remove(sound)
+
+    def _remove(self, sound: SoundEffect):
+        sound_id = id(sound)
+        if self._sounds.pop(sound_id, None) is None:
+            return
+        #the sound might have been renamed since it was indexed, so the indexed path is used
+        path = self._path_of.pop(sound_id)
+        if self._ids_by_path.get(path) == sound_id:
+            del self._ids_by_path[path]
+        self._names_of.pop(sound_id, None)
+        for token in self._tokens_of.pop(sound_id, set()):
+            index = bisect.bisect_left(self._tokens, (token, sound_id))
+            if index < len(self._tokens) and self._tokens[index] == (token, sound_id):
+                del self._tokens[index]
+            for trigram in self._trigrams_of(token):
+                ids = self._trigrams.get(trigram)
+                if ids is not None:
+                    ids.discard(sound_id)
+                    if not ids:
+                        del self._trigrams[trigram]
+
+    def apply_diff(self, added: list[SoundEffect], removed: list[SoundEffect], renamed: list[SoundEffect]):
+        with self._lock:
+            for sound in removed:
+                self._remove(sound)
+            #renamed sounds keep their object, so they are simply indexed again
+            for sound in [*renamed, *added]:
+                self._add(sound)
+
+    def sync(self, sounds: list[SoundEffect]):
+        """Brings the index in line with a full sounds list. Only sounds whose path is new or gone are touched."""
+        with self._lock:
+            new_paths = {str(sound.mp3_path): sound for sound in sounds}
+            for path in [p for p in self._ids_by_path if p not in new_paths]:
+                self._remove(self._sounds[self._ids_by_path[path]])
+            for path, sound in new_paths.items():
+                known_id = self._ids_by_path.get(path)
+                if known_id is None:
+                    self._add(sound)
+                elif known_id != id(sound):
+                    #same file, but a new object after a full rescan. Its tokens are the same, so only swap the object.
+                    self._swap(self._sounds[known_id], sound)
+
+    def _swap(self, old: SoundEffect, new: SoundEffect):
+        old_id, new_id = id(old), id(new)
+        tokens = self._tokens_of.pop(old_id)
+        self._sounds.pop(old_id)
+        self._sounds[new_id] = new
+        self._tokens_of[new_id] = tokens
+        self._names_of[new_id] = self._names_of.pop(old_id)
+        self._ids_by_path[str(new.mp3_path)] = new_id
+        self._path_of[new_id] = self._path_of.pop(old_id)
+        for token in tokens:
+            index = bisect.bisect_left(self._tokens, (token, old_id))
+            del self._tokens[index]
+            bisect.insort(self._tokens, (token, new_id))
+            for trigram in self._trigrams_of(token):
+                ids = self._trigrams[trigram]
+                ids.discard(old_id)
+                ids.add(new_id)
+
+    def search(self, query: str, limit: int = None) -> list[SoundEffect]:
+        """Returns the sounds matching every word of the query, best matches first. Only the best `limit` are ranked."""
+        terms = [t for t in self._split_pattern.split(query.lower()) if t]
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = self._match_term(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {i: s + term_scores[i] for i, s in scores.items() if i in term_scores}
+                if not scores:
+                    return []
+
+            names = self._names_of
+            key = lambda i: (-scores[i], names[i])
+            if limit is not None and limit < len(scores):
+                ranked = heapq.nsmallest(limit, scores, key=key)
+            else:
+                ranked = sorted(scores, key=key)
+            return [self._sounds[i] for i in ranked]
+
+    def _match_term(self, term: str) -> dict[int, float]:
+        scores: dict[int, float] = {}
+
+        index = bisect.bisect_left(self._tokens, (term, -1))
+        while index < len(self._tokens) and self._tokens[index][0].startswith(term):
+            token, sound_id = self._tokens[index]
+            score = self._score_exact if token == term else self._score_prefix
+            if score > scores.get(sound_id, 0):
+                scores[sound_id] = score
+            index += 1
+
+        if len(term) >= 3:
+            term_trigrams = self._trigrams_of(term)
+            hits = Counter()
+            for trigram in term_trigrams:
+                hits.update(self._trigrams.get(trigram, ()))
+            needed = self._fuzzy_threshold * len(term_trigrams)
+            for sound_id, count in hits.items():
+                if count >= needed and sound_id not in scores:
+                    scores[sound_id] = self._score_fuzzy * count / len(term_trigrams)
+
+        return scores
+
+    def __len__(self):
+        return len(self._sounds)
+
+
+search_index = SoundSearchIndex()
+signals.sounds_list_changed.connect(search_index.sync)
+signals.sounds_list_diff.connect(search_index.apply_diff)
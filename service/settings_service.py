@@ -17,6 +17,19 @@ class SettingsService:
             "global_volume": 1.0,
             "allow_distortion": False,#volumn over 100%
             "wakeup_noise": False,
+            "max_voices": 16,#how many sounds can play at the same time
+            "voice_steal_policy": "oldest",#oldest, quietest or none. what happens when max_voices is reached
+            "disk_cache_max_mb": 1024,#size cap of the decoded audio cache in the config dir
+            "predecode_workers": 2,#threads that decode the library in the background
+            "memory_cache_max_mb": 256,#RAM budget for decoded sounds
+            "cache_sample_format": "float32",#float32 or int16. int16 halves the memory use
+            "streaming_threshold_mb": 16,#files bigger than this are decoded while they play instead of up front
+            "resample_quality": "medium",#linear, medium or high. used once when a sound is converted to the output rate
+            "normalization": "loudness",#loudness, peak or none. how the level of every sound is evened out
+            "loudness_target_lufs": -16.0,#what the loudness normalization aims for
+            "trace_buffer_size": 4096,#how many timing spans of recent plays are kept for the diagnostics
+            "paced_output": True,#render in step with the clock, so volume changes and stop are heard right away
+            "output_lookahead_ms": 60,#how far ahead of the clock the paced output may render
             "output_device": "" #default is "". it will look for default output device in hijack service
         }
 
@@ -2,5 +2,9 @@ from PySide6.QtCore import Signal, QObject
 
 class SignalService(QObject):
     sounds_list_changed = Signal(list)
+    sounds_list_diff = Signal(list, list, list)#added, removed, renamed sound effects
+    predecode_progress = Signal(int, int)#done, total
+    audio_setup_changed = Signal(str)#starting, ready or failed
+    sound_settings_changed = Signal(object)#sound effect whose volume or effects were changed
 
 signals = SignalService()
\ No newline at end of file
@@ -1,23 +1,51 @@
+import json
 import os
+import threading
+from collections import Counter, defaultdict
 from pathlib import Path
 
-from PySide6.QtCore import QObject
+from PySide6.QtCore import QObject, QFileSystemWatcher, Signal
 import shutil
 from model.sound_effect import SoundEffect
 from service.signal_service import signals
 from service.settings_service import settings_service
 from service.pipewire_hijack_service import sb
+from service.player_service import player
+from service.predecode_service import predecode_service
+from service.library_index_service import library_index
 
 class SoundsService(QObject):
+    #the folder as the background walk found it: directory -> (files, subdirs), renames found by content hash, generation
+    _walked = Signal(object, object, int)
+
     def __init__(self):
         super().__init__()
         self.sounds_list: list[SoundEffect] = []
 
+        #what we know about every watched directory. Used to find out what changed without rescanning everything
+        self._sounds_by_path: dict[Path, SoundEffect] = {}
+        self._files_by_dir: dict[Path, set[Path]] = {}
+        self._subdirs_by_dir: dict[Path, set[Path]] = {}
+        self._file_ids: dict[Path, tuple[int, int, int]] = {}#inode, mtime, size
+        self._hashes: dict[Path, str | None] = {}#content hash from the index, to find files moved while not running
+
+        #inotify based watcher on every directory of the sound folder.
+        #It is created on the first scan because it needs the running QApplication to deliver events.
+        self._watcher: QFileSystemWatcher | None = None
+
+        #every refresh starts a new generation. Results of older walks are dropped.
+        self._generation = 0
+        #directories the watcher reported before the walk of this generation was applied. Rescanned after it.
+        self._walk_pending = False
+        self._pending_rescans: set[Path] = set()
+        self._walked.connect(self._apply_walk)
+
     def delete_sound_by_id(self, num):
-        path = self.sounds_list[num].mp3_path
-        if path.is_file():
-            os.remove(path)
-        self.update_sounds_from_folder()
+        sound = self.sounds_list[num]
+        if sound.mp3_path.is_file():
+            os.remove(sound.mp3_path)
+        #the watcher would notice too, but the list should be correct right after returning
+        self._rescan_directory(sound.mp3_path.parent)
 
     def add_sound(self, path: Path):
         """Doesn't add the sound to the list, but adds it to the Sounds folder copying it."""
@@ -25,32 +53,336 @@ class SoundsService(QObject):
         if path.is_file():
             try:
                 shutil.copy(path, sounds_path)
-                self.update_sounds_from_folder()
+                self._rescan_directory(sounds_path)
             except Exception as e:
                 print(e)
         else:
             print("INTERNAL ERROR: Invalid file selected")
 
+    def set_effects(self, sound: SoundEffect, effects: list[dict]):
+        """Stores the effect chain of a sound. Renders of the old chain are dropped from the memory cache."""
+        sound.effects = effects
+        library_index.set_effects(sound.mp3_path, effects)
+        sb.audio_cache.remove_path(str(sound.mp3_path))
+        signals.sound_settings_changed.emit(sound)
+
+    def set_volume(self, sound: SoundEffect, volume: float):
+        """Stores the volume of a sound, 1.0 is 100%. It is applied per voice, nothing cached changes."""
+        sound.volume = volume
+        library_index.set_volume(sound.mp3_path, volume)
+        signals.sound_settings_changed.emit(sound)
+
+    @staticmethod
+    def _is_sound_file(path: Path) -> bool:
+        return path.suffix.lower()[1:] in settings_service.supported_formates
+
     def update_sounds_from_folder(self):
+        """
+        Shows the sounds from the library index right away and compares them with the folder in the background.
+        After that, changes are picked up incrementally by the watcher.
+        """
         #resettings current sounds
         self.sounds_list = []
+        self._sounds_by_path.clear()
+        self._files_by_dir.clear()
+        self._subdirs_by_dir.clear()
+        self._file_ids.clear()
+        self._hashes.clear()
+        if self._watcher is None:
+            self._watcher = QFileSystemWatcher(self)
+            self._watcher.directoryChanged.connect(self._directory_changed)
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
 
-        #update sounds from a folder
+        #update sounds from the index. Nothing on disk is touched for this.
         sounds_path: Path = Path(settings_service.settings.get("sound_path"))
         print("Refreshing sounds from: ", sounds_path)
-
-        for file_path in sounds_path.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower()[1:] in settings_service.supported_formates:
-                print(type(file_path),file_path)
-                new_sound_effect = SoundEffect(file_path)
-                self.sounds_list.append(new_sound_effect)
+        prefix = str(sounds_path.absolute()).rstrip("/") + "/"
+        for row in library_index.sounds_under(sounds_path):
+            self._add_row(row, prefix)
 
         #sending update signal
-        print(self.sounds_list)
+        print(f"Found {len(self.sounds_list)} sounds in the library index")
         signals.sounds_list_changed.emit(self.sounds_list)
 
+        #the walk only reads, it hands the result to _apply_walk on this thread
+        self._generation += 1
+        self._walk_pending = True
+        self._pending_rescans.clear()
+        known = {path: (self._file_ids[path], row_hash) for path, row_hash in self._hashes.items()}
+        threading.Thread(target=self._walk, args=(sounds_path, known, self._generation),
+                         name="library-walk", daemon=True).start()
+
+    def _add_row(self, row, prefix: str):
+        file_path = Path(row["path"])
+        #same as _tags_for, but thousands of relative_to() calls would take longer than reading the whole index
+        tags = row["path"][len(prefix):].split("/")[:-1]
+        sound = SoundEffect(file_path, row["name"], row["volume"], tags,
+                            duration=row["duration"], sample_rate=row["sample_rate"],
+                            effects=json.loads(row["effects"]) if row["effects"] else None)
+        self._register(sound, (row["inode"], row["mtime_ns"], row["size"]))
+        self._hashes[file_path] = row["content_hash"]
+
+    def _walk(self, directory: Path, known: dict, generation: int):
+        """Lists the whole folder. Runs on its own thread."""
+        snapshot = {}
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            files, subdirs = self._list_directory(current)
+            snapshot[current] = (files, subdirs)
+            pending.extend(subdirs)
+
+        #a file that was moved while we weren't running can have a new inode (e.g. another filesystem).
+        #new files with the size of a vanished one are hashed to find them. That's rare, so it stays cheap.
+        #a hash only counts when nothing else explains it: no inode match and exactly one file on each side,
+        #otherwise a deleted sound would hand its settings to an unrelated copy.
+        present = {path: file_id for files, _ in snapshot.values() for path, file_id in files.items()}
+        present_ids = set(present.values())
+        known_ids = {file_id for file_id, _ in known.values()}
+        hash_counts = Counter((file_id[2], content_hash) for file_id, content_hash in known.values() if content_hash)
+        vanished = {(file_id[2], content_hash): path for path, (file_id, content_hash) in known.items()
+                    if path not in present and content_hash and file_id not in present_ids
+                    and hash_counts[(file_id[2], content_hash)] == 1}
+        sizes = {size for size, _ in vanished}
+        candidates = defaultdict(list)
+        for path, file_id in present.items():
+            if path not in known and file_id not in known_ids and file_id[2] in sizes:
+                try:
+                    key = (file_id[2], library_index.content_hash(path))
+                except OSError:
+                    continue
+                if key in vanished:
+                    candidates[key].append(path)
+        hash_renames = {vanished[key]: paths[0] for key, paths in candidates.items() if len(paths) == 1}
+        self._walked.emit(snapshot, hash_renames, generation)
+
+    def _apply_walk(self, snapshot: dict, hash_renames: dict, generation: int):
+        """Applies the difference between the index and the folder, and starts watching every directory."""
+        if generation != self._generation:
+            return
+        present = {path: file_id for files, _ in snapshot.values() for path, file_id in files.items()}
+        gone = [path for path in self._sounds_by_path if path not in present]
+        new = {path: file_id for path, file_id in present.items() if path not in self._sounds_by_path}
+        changed = [path for path, file_id in present.items()
+                   if path in self._sounds_by_path and self._file_ids[path] != file_id]
+
+        added, removed, renamed, moves = [], [], [], []
+        #inodes of deleted files get reused, so a rename has to keep mtime and size too
+        new_by_id = {file_id: path for path, file_id in new.items()}
+        for old_path in gone:
+            new_path = new_by_id.get(self._file_ids[old_path])
+            if new_path not in new:
+                new_path = hash_renames.get(old_path)
+            if new_path in new:
+                renamed.append(self._rename_file(old_path, new_path, new.pop(new_path)))
+                moves.append((old_path, new_path))
+            else:
+                removed.append(self._remove_file(old_path))
+        for file_path, file_id in new.items():
+            added.append(self._add_file(file_path, file_id))
+        for file_path in changed:
+            self._file_ids[file_path] = present[file_path]
+            sb.audio_cache.remove_path(str(file_path))
+
+        self._files_by_dir = {directory: set(files) for directory, (files, _) in snapshot.items()}
+        self._subdirs_by_dir = {directory: set(subdirs) for directory, (_, subdirs) in snapshot.items()}
+        self._watcher.addPaths([str(directory) for directory in snapshot])
+        self._walk_pending = False
+
+        self._update_index(added + renamed + [self._sounds_by_path[p] for p in changed], removed, moves)
+        if added or removed or renamed:
+            print(f"Library index updated: {len(added)} added, {len(removed)} removed, {len(renamed)} renamed")
+            signals.sounds_list_diff.emit(added, removed, renamed)
+
+        #changes the walk may have listed too early. Rescanning a directory that didn't change does nothing.
+        pending, self._pending_rescans = self._pending_rescans, set()
+        for directory in pending:
+            self._rescan_directory(directory)
+
+        #warming the decoded audio cache so the first click doesn't have to decode
+        predecode_service.warm(self.sounds_list)
+        threading.Thread(target=self._fill_metadata, args=(Path(settings_service.settings.get("sound_path")),
+                                                          generation), name="library-metadata", daemon=True).start()
+
+    def _fill_metadata(self, directory: Path, generation: int):
+        """Hashes new files and reads their duration in the background."""
+        for path in library_index.missing_metadata(directory):
+            if generation != self._generation:
+                return
+            try:
+                row = library_index.fill_metadata(path)
+            except FileNotFoundError:
+                #deleted meanwhile, the watcher removes it
+                continue
+            except Exception as e:
+                print(f"❌ Could not read {path}: {e}")
+                continue
+            sound = self._sounds_by_path.get(path)
+            if row is not None and sound is not None:
+                sound.duration = row["duration"]
+                sound.sample_rate = row["sample_rate"]
+
+    def _update_index(self, sounds: list[SoundEffect], removed: list[SoundEffect], moves: list[tuple[Path, Path]]):
+        files = [(s.mp3_path, s.name, self._file_ids[s.mp3_path]) for s in sounds]
+        library_index.update(files, [s.mp3_path for s in removed], moves)
+        for old_path, new_path in moves:
+            self._hashes[new_path] = self._hashes.pop(old_path, None)
+
+    def _scan_tree(self, directory: Path) -> list[SoundEffect]:
+        """Adds every sound below a directory that we don't know yet and starts watching its directories."""
+        added = []
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            files, subdirs = self._list_directory(current)
+            self._files_by_dir[current] = set()
+            self._subdirs_by_dir[current] = set(subdirs)
+            self._watcher.addPath(str(current))
+            for file_path, file_id in files.items():
+                added.append(self._add_file(file_path, file_id))
+            pending.extend(subdirs)
+        return added
+
+    def _list_directory(self, directory: Path) -> tuple[dict[Path, tuple[int, int, int]], list[Path]]:
+        """Returns the sound files (with inode, mtime and size) and the subdirectories of one directory."""
+        files = {}
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path = Path(entry.path)
+                    if entry.is_dir():
+                        subdirs.append(path)
+                    elif entry.is_file() and self._is_sound_file(path):
+                        stat = entry.stat()
+                        files[path] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return files, subdirs
+
+    def _add_file(self, file_path: Path, file_id: tuple[int, int, int]) -> SoundEffect:
+        new_sound_effect = SoundEffect(file_path, tags=self._tags_for(file_path))
+        self._register(new_sound_effect, file_id)
+        return new_sound_effect
+
+    def _register(self, sound: SoundEffect, file_id: tuple[int, int, int]):
+        self.sounds_list.append(sound)
+        self._sounds_by_path[sound.mp3_path] = sound
+        self._files_by_dir.setdefault(sound.mp3_path.parent, set()).add(sound.mp3_path)
+        self._file_ids[sound.mp3_path] = file_id
+
+    @staticmethod
+    def _tags_for(file_path: Path) -> list[str]:
+        """The folders between the sound folder and the file are used as tags"""
+        sounds_path = Path(settings_service.settings.get("sound_path"))
+        try:
+            return list(file_path.parent.relative_to(sounds_path).parts)
+        except ValueError:
+            return []
+
+    def _remove_file(self, file_path: Path) -> SoundEffect | None:
+        sound = self._sounds_by_path.pop(file_path, None)
+        self._files_by_dir.get(file_path.parent, set()).discard(file_path)
+        self._file_ids.pop(file_path, None)
+        self._hashes.pop(file_path, None)
+        if sound is not None:
+            self.sounds_list.remove(sound)
+            sb.audio_cache.remove_path(str(file_path))
+        return sound
+
+    def _remove_tree(self, directory: Path) -> list[SoundEffect]:
+        removed = []
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            for file_path in list(self._files_by_dir.pop(current, set())):
+                sound = self._remove_file(file_path)
+                if sound is not None:
+                    removed.append(sound)
+            pending.extend(self._subdirs_by_dir.pop(current, set()))
+            self._watcher.removePath(str(current))
+        return removed
+
+    def _directory_changed(self, path: str):
+        self._rescan_directory(Path(path))
+
+    def _rescan_directory(self, directory: Path):
+        """Compares one directory with what we know about it and applies the difference to the sounds list."""
+        #until the background walk is applied we only know the index, so the directory is rescanned after it
+        if self._walk_pending:
+            self._pending_rescans.add(directory)
+            return
+        if directory not in self._subdirs_by_dir:
+            return
+
+        added, removed, renamed, moves, changed = [], [], [], [], []
+        if not directory.is_dir():
+            removed = self._remove_tree(directory)
+        else:
+            files, subdirs = self._list_directory(directory)
+            known_files = self._files_by_dir[directory]
+            gone = [p for p in known_files if p not in files]
+            new = {p: file_id for p, file_id in files.items() if p not in known_files}
+            changed = [p for p, file_id in files.items() if p in known_files and self._file_ids.get(p) != file_id]
+
+            #a file that disappeared and a new file with the same inode, mtime and size is a rename.
+            #inodes of deleted files get reused, so the inode alone isn't enough.
+            new_by_id = {file_id: p for p, file_id in new.items()}
+            for old_path in gone:
+                new_path = new_by_id.get(self._file_ids.get(old_path))
+                if new_path is not None:
+                    renamed.append(self._rename_file(old_path, new_path, new.pop(new_path)))
+                    moves.append((old_path, new_path))
+                else:
+                    sound = self._remove_file(old_path)
+                    if sound is not None:
+                        removed.append(sound)
+
+            for file_path, file_id in new.items():
+                added.append(self._add_file(file_path, file_id))
+            #rewritten in place: the decoded audio is stale and the index resets the content columns
+            for file_path in changed:
+                self._file_ids[file_path] = files[file_path]
+                sb.audio_cache.remove_path(str(file_path))
+
+            known_subdirs = self._subdirs_by_dir[directory]
+            for subdir in known_subdirs - set(subdirs):
+                removed += self._remove_tree(subdir)
+            for subdir in set(subdirs) - known_subdirs:
+                added += self._scan_tree(subdir)
+            self._subdirs_by_dir[directory] = set(subdirs)
+
+        rewritten = [self._sounds_by_path[p] for p in changed if p in self._sounds_by_path]
+        if not (added or removed or renamed or rewritten):
+            return
+
+        self._update_index(added + renamed + rewritten, removed, moves)
+        print(f"Sounds changed in {directory}: {len(added)} added, {len(removed)} removed, {len(renamed)} renamed, "
+              f"{len(rewritten)} rewritten")
+        if added or removed or renamed:
+            signals.sounds_list_diff.emit(added, removed, renamed)
+        if added or rewritten:
+            predecode_service.add(added + rewritten)
+
+    def _rename_file(self, old_path: Path, new_path: Path, file_id: tuple[int, int, int]) -> SoundEffect:
+        sound = self._sounds_by_path.pop(old_path)
+        self._files_by_dir[old_path.parent].discard(old_path)
+        self._file_ids.pop(old_path, None)
+        sb.audio_cache.remove_path(str(old_path))
+
+        sound.previous_path = old_path
+        sound.mp3_path = new_path
+        sound.name = sound.make_name_from_dir()
+        sound.tags = self._tags_for(new_path)
+        self._sounds_by_path[new_path] = sound
+        self._files_by_dir.setdefault(new_path.parent, set()).add(new_path)
+        self._file_ids[new_path] = file_id
+        return sound
+
     @staticmethod
     def stop_current_sound():
-        sb.stop()
+        player.stop()
 
 sound_service = SoundsService()
@@ -0,0 +1,95 @@
+import builtins
+import sys
+import threading
+import time
+
+
+class StartupProfiler:
+    """
+    Built-in version of python -X importtime for --profile-startup.
+    Wraps __import__ and records the self and cumulative time of every module that is loaded for the first time,
+    on any thread. mark() records when a startup phase was reached. report() prints both.
+    Only standard library modules that are loaded anyway are imported here, so it doesn't change what it measures.
+    """
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._original_import = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (module, self µs, cumulative µs, depth, thread name), in the order the imports finished
+        self.imports: list[tuple[str, int, int, int, str]] = []
+        self.phases: list[tuple[str, float]] = []
+
+    def start(self):
+        if self._original_import is not None:
+            return
+        self._start = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, phase: str):
+        """Records that a phase was reached, in ms since start()."""
+        with self._lock:
+            self.phases.append((phase, (time.perf_counter() - self._start) * 1000))
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        module = self._new_module(name, globals, fromlist, level)
+        if module is None:
+            #Already loaded, this is only a dict lookup
+            return original(name, globals, locals, fromlist, level)
+
+        # Time spent in nested imports, per level of the current thread. Subtracted to get the self time.
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0)
+        start = time.perf_counter_ns()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = (time.perf_counter_ns() - start) // 1000
+            nested = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            with self._lock:
+                self.imports.append((module, cumulative - nested, cumulative, len(stack),
+                                     threading.current_thread().name))
+
+    @staticmethod
+    def _new_module(name, globals, fromlist, level) -> str | None:
+        """The name of the module this import loads for the first time, or None if everything is loaded already."""
+        if level > 0:
+            package = (globals or {}).get("__package__") or ""
+            base = package.rsplit(".", level - 1)[0] if level > 1 else package
+            name = f"{base}.{name}" if name else base
+        if name not in sys.modules:
+            return name
+        # "from package import submodule" loads the submodule
+        for item in fromlist or ():
+            if item != "*" and f"{name}.{item}" not in sys.modules and not hasattr(sys.modules[name], item):
+                return f"{name}.{item}"
+        return None
+
+    def report(self, top: int = 25) -> str:
+        """The slowest imports by cumulative time in the format of -X importtime, then the phases."""
+        with self._lock:
+            imports = sorted(self.imports, key=lambda entry: entry[2], reverse=True)[:top]
+            phases = list(self.phases)
+        lines = [f"Startup profile: {len(self.imports)} modules imported",
+                 "import time: self [us] | cumulative | imported package"]
+        for module, self_us, cumulative_us, depth, thread in imports:
+            suffix = "" if thread == "MainThread" else f"  ({thread})"
+            lines.append(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{module}{suffix}")
+        lines.append("phase (ms since start):")
+        for phase, ms in phases:
+            lines.append(f"  {ms:>9.1f}  {phase}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
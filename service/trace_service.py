@@ -0,0 +1,115 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from service.settings_service import settings_service
+
+
+class Span:
+    __slots__ = ("trace_id", "name", "start_ns", "end_ns", "thread")
+
+    def __init__(self, trace_id: int, name: str, start_ns: int, end_ns: int, thread: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.thread = thread
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    """
+    Records what a trigger spends its time on (cache lookup, decode, stream open, first write, ...).
+    Every play() starts a trace, and spans recorded on the same thread while it runs belong to it.
+    Spans from other threads (e.g. the mix thread) name the trace explicitly.
+    Spans are kept in ring buffers, so recording is only a clock read and an append.
+    Spans outside of a trace (e.g. background pre-decoding) aren't recorded.
+    """
+    def __init__(self, capacity: int):
+        self._spans: deque[Span] = deque(maxlen=capacity)
+        self._traces: deque[tuple[int, str, int]] = deque(maxlen=max(1, capacity // 8))#(trace id, sound name, start)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def current(self) -> int:
+        return getattr(self._local, "trace_id", 0)
+
+    @contextmanager
+    def trace(self, name: str):
+        """Starts a new trace on this thread and yields its id."""
+        trace_id = next(self._ids)
+        self._traces.append((trace_id, name, time.monotonic_ns()))
+        previous = self.current()
+        self._local.trace_id = trace_id
+        try:
+            yield trace_id
+        finally:
+            self._local.trace_id = previous
+
+    @contextmanager
+    def span(self, name: str):
+        trace_id = self.current()
+        if not trace_id:
+            yield
+            return
+        start = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.record(trace_id, name, start, time.monotonic_ns())
+
+    def record(self, trace_id: int, name: str, start_ns: int, end_ns: int):
+        if trace_id:
+            self._spans.append(Span(trace_id, name, start_ns, end_ns, threading.current_thread().name))
+
+    def spans(self) -> list[Span]:
+        # copying a deque is atomic, appends from other threads can't break it
+        return list(self._spans)
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        """The newest traces first, with the total time per phase in ms."""
+        traces = list(self._traces)[-limit:]
+        wanted = {trace_id for trace_id, _, _ in traces}
+        phases: dict[int, dict[str, float]] = {trace_id: {} for trace_id in wanted}
+        for span in self.spans():
+            if span.trace_id in wanted:
+                trace_phases = phases[span.trace_id]
+                trace_phases[span.name] = trace_phases.get(span.name, 0.0) + span.duration_ms
+        return [{"trace_id": trace_id, "sound": name, "started_ns": started, "phases": phases[trace_id]}
+                for trace_id, name, started in reversed(traces)]
+
+    def clear(self):
+        self._spans.clear()
+        self._traces.clear()
+
+    def export_json(self, path: str):
+        names = {trace_id: name for trace_id, name, _ in self._traces}
+        spans = [{"trace": s.trace_id, "sound": names.get(s.trace_id, ""), "name": s.name, "thread": s.thread,
+                  "start_ns": s.start_ns, "duration_ms": s.duration_ms} for s in self.spans()]
+        with open(path, "w") as f:
+            json.dump(spans, f, indent=1)
+
+    def export_chrome(self, path: str):
+        """Writes the spans in the Chrome trace event format (chrome://tracing, Perfetto)."""
+        names = {trace_id: name for trace_id, name, _ in self._traces}
+        pid = os.getpid()
+        spans = self.spans()
+        # The format wants numeric thread ids. The names are added as metadata events.
+        thread_ids = {thread: i for i, thread in enumerate(dict.fromkeys(s.thread for s in spans), 1)}
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}}
+                  for thread, tid in thread_ids.items()]
+        events += [{"name": s.name, "cat": "playback", "ph": "X", "pid": pid, "tid": thread_ids[s.thread],
+                    "ts": s.start_ns / 1000, "dur": (s.end_ns - s.start_ns) / 1000,
+                    "args": {"trace": s.trace_id, "sound": names.get(s.trace_id, "")}} for s in spans]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+tracer = Tracer(settings_service.settings["trace_buffer_size"])
@@ -2,11 +2,16 @@ from pathlib import Path
 from typing import Dict
 
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QTableWidget, QHeaderView, QTableWidgetItem, \
-    QAbstractItemView, QLineEdit
+    QAbstractItemView, QLineEdit, QKeySequenceEdit, QSpinBox
 from PySide6.QtCore import Qt
+from PySide6.QtGui import QKeySequence
 
 from service.sounds_service import sound_service
 from service.settings_service import settings_service
+from service.hotkey_service import hotkey_service
+from service.daemon_client_service import DaemonError
+from service.player_service import player
+from service.effects_service import parse_chain, format_chain, effect_types
 
 class ConfigureSoundPopup(QDialog):
     def __init__(self, parent=None):
@@ -14,7 +19,7 @@ class ConfigureSoundPopup(QDialog):
         self.sound_service = sound_service
         self.setWindowTitle("Configure Sounds")
         self.setWindowModality(Qt.WindowModality.WindowModal)
-        self.resize(600, 400)
+        self.resize(800, 400)
 
         layout = QVBoxLayout()
 
@@ -31,8 +36,8 @@ class ConfigureSoundPopup(QDialog):
 
         #Table
         self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Sound Name", "File Path", ""])
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["Sound Name", "File Path", "Volume", "Global Hotkey", "Effects", ""])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
@@ -43,7 +48,12 @@ class ConfigureSoundPopup(QDialog):
         header.setSectionResizeMode(0, QHeaderView.Stretch)
         header.setSectionResizeMode(1, QHeaderView.Stretch)
         header.setSectionResizeMode(2, QHeaderView.Fixed)
+        header.setSectionResizeMode(3, QHeaderView.Fixed)
+        header.setSectionResizeMode(4, QHeaderView.Stretch)
+        header.setSectionResizeMode(5, QHeaderView.Fixed)
         self.table.setColumnWidth(2, 80)
+        self.table.setColumnWidth(3, 140)
+        self.table.setColumnWidth(5, 80)
 
         #loads the table data
         self.load_table_data()
@@ -59,12 +69,35 @@ class ConfigureSoundPopup(QDialog):
 
     def load_table_data(self):
         self.table.setRowCount(len(self.sound_service.sounds_list))
+        self.hotkey_edits = []
 
         for row, sound in enumerate(self.sound_service.sounds_list):
             # Create table items from the object attributes
             name_item = QTableWidgetItem(sound.name)
             path_item = QTableWidgetItem(str(sound.mp3_path))
 
+            #volume of this sound, on top of the global volume
+            volume_edit = QSpinBox()
+            volume_edit.setRange(0, 200)
+            volume_edit.setSuffix("%")
+            volume_edit.setValue(round(sound.volume * 100))
+            volume_edit.editingFinished.connect(lambda s=sound, e=volume_edit: self.set_volume(s, e))
+
+            #global hotkey, a single key combination
+            hotkey_edit = QKeySequenceEdit(QKeySequence.fromString(hotkey_service.hotkey_to_qt(hotkey_service.hotkey_for(sound))))
+            hotkey_edit.setMaximumSequenceLength(1)
+            hotkey_edit.setClearButtonEnabled(True)
+            hotkey_edit.editingFinished.connect(lambda s=sound, e=hotkey_edit: self.set_hotkey(s, e))
+            #the clear button doesn't finish editing
+            hotkey_edit.keySequenceChanged.connect(lambda seq, s=sound, e=hotkey_edit: self._hotkey_changed(s, e, seq))
+            self.hotkey_edits.append(hotkey_edit)
+
+            #effect chain in the short text form, e.g. "highpass=120 gain=-3"
+            effects_edit = QLineEdit(format_chain(sound.effects))
+            effects_edit.setPlaceholderText("e.g. highpass=120 gain=-3")
+            effects_edit.setToolTip("Effects in order: " + ", ".join(f"{name}={param}" for name, (_, param) in effect_types.items()))
+            effects_edit.editingFinished.connect(lambda s=sound, e=effects_edit: self.set_effects(s, e))
+
             delete_btn = QPushButton("Delete")
             delete_btn.setStyleSheet("background-color: #e74c3c; color: white; font-weight: bold;")
             delete_btn.clicked.connect(lambda _, r=row: self.delete_row(r))
@@ -73,8 +106,58 @@ class ConfigureSoundPopup(QDialog):
             self.table.setItem(row, 0, name_item)
             self.table.setItem(row, 1, path_item)
 
-            self.table.setCellWidget(row, 2, delete_btn)
+            self.table.setCellWidget(row, 2, volume_edit)
+            self.table.setCellWidget(row, 3, hotkey_edit)
+            self.table.setCellWidget(row, 4, effects_edit)
+            self.table.setCellWidget(row, 5, delete_btn)
+
+    def set_hotkey(self, sound, hotkey_edit):
+        hotkey = hotkey_service.hotkey_from_qt(hotkey_edit.keySequence().toString())
+        if hotkey == hotkey_service.hotkey_for(sound):
+            return
+        try:
+            hotkey_service.bind(sound, hotkey)
+        except ValueError as e:
+            print(f"Invalid hotkey {hotkey}: {e}")
+            hotkey_edit.clear()
+            return
+        #a hotkey can only belong to one sound, so another row might have lost it
+        for other_sound, edit in zip(self.sound_service.sounds_list, self.hotkey_edits):
+            sequence = QKeySequence.fromString(hotkey_service.hotkey_to_qt(hotkey_service.hotkey_for(other_sound)))
+            if edit is not hotkey_edit and edit.keySequence() != sequence:
+                edit.blockSignals(True)
+                edit.setKeySequence(sequence)
+                edit.blockSignals(False)
+
+    def set_volume(self, sound, volume_edit):
+        volume = volume_edit.value() / 100
+        if volume != sound.volume:
+            self.sound_service.set_volume(sound, volume)
+
+    def set_effects(self, sound, effects_edit):
+        try:
+            #the sounds are rendered at the rate of the speakers, the daemon's if the window is its client
+            effects = parse_chain(effects_edit.text(), player.stats()["sample_rate"])
+        except ValueError as e:
+            print(f"Invalid effects for {sound.name}: {e}")
+            effects_edit.setText(format_chain(sound.effects))
+            return
+        except (DaemonError, OSError) as e:
+            #without the daemon's rate the cutoffs can't be checked, so nothing is stored
+            print(f"❌ Can't change the effects of {sound.name} while the daemon is unreachable: {e}")
+            effects_edit.setText(format_chain(sound.effects))
+            return
+        if effects != sound.effects:
+            self.sound_service.set_effects(sound, effects)
+        effects_edit.setText(format_chain(effects))
+
+    def _hotkey_changed(self, sound, hotkey_edit, sequence):
+        if sequence.isEmpty():
+            self.set_hotkey(sound, hotkey_edit)
 
     def delete_row(self, row):
+        sound = self.sound_service.sounds_list[row]
+        if hotkey_service.hotkey_for(sound):
+            hotkey_service.bind(sound, "")
         self.sound_service.delete_sound_by_id(row)
         self.load_table_data()
\ No newline at end of file
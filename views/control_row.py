@@ -3,7 +3,8 @@ from PySide6.QtGui import QPalette
 from PySide6.QtWidgets import QFrame, QPushButton, QStyle, QSlider, QHBoxLayout, QLabel, QCheckBox, QComboBox
 from service.sounds_service import sound_service
 from service.settings_service import settings_service
-from service.pipewire_hijack_service import sb
+from service.player_service import player
+from service.audio_state_service import audio_state
 
 class ControlRow(QFrame):
     def __init__(self, parent=None):
@@ -63,9 +64,9 @@ class ControlRow(QFrame):
         mic_selection_layout.addWidget(QLabel("Microphone:"))
 
         self.mic_selection = QComboBox()
-        self.mic_selection.addItem("Default")
-        self.mic_selection.addItems(sb.get_all_available_microphone_devices())
+        self._fill_mic_selection(audio_state.get_sources())
         self.mic_selection.currentIndexChanged.connect(self._changed_mic_selection)
+        audio_state.sources_changed.connect(self._fill_mic_selection)
 
         mic_selection_layout.addWidget(self.mic_selection)
 
@@ -76,7 +77,18 @@ class ControlRow(QFrame):
         float_value = value / 100.0
         print(f"Volume set to {float_value}")
         self.volume_label.setText(f"Volume: {value}%")
-        settings_service.settings["global_volume"] = float_value
+        player.set_volume(float_value)
+
+    def _fill_mic_selection(self, sources):
+        """Fills the mic box again when devices are plugged in or removed. Keeps the current selection if possible."""
+        current = self.mic_selection.currentText()
+        self.mic_selection.blockSignals(True)
+        self.mic_selection.clear()
+        self.mic_selection.addItem("Default")
+        self.mic_selection.addItems(list(sources))
+        index = self.mic_selection.findText(current)
+        self.mic_selection.setCurrentIndex(max(index, 0))
+        self.mic_selection.blockSignals(False)
 
     def _changed_mic_selection(self, index):
         print(f"Selected mic: {self.mic_selection.currentText()}")
@@ -84,7 +96,8 @@ class ControlRow(QFrame):
             settings_service.settings["output_device"] = ""
         else:
             settings_service.settings["output_device"] = self.mic_selection.currentText()
-        sb.setup()
+        # Only the loopback from the mic is replaced. Apps recording from the virtual mic don't notice.
+        player.start_mic_switch()
 
     def _update_allow_distortion(self, value):
         if value == 0:
@@ -0,0 +1,122 @@
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                               QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog)
+
+from service.daemon_client_service import DaemonError
+from service.player_service import player
+from service.trace_service import tracer
+
+
+class DiagnosticsPopup(QDialog):
+    """
+    Live view of the recent play timings, the caches and the output streams. Refreshes itself twice a second.
+    When the window is a client of the daemon, everything shown comes from the daemon.
+    """
+    # Phases shown as columns, in the order they happen
+    phases = ["cache lookup", "disk cache lookup", "decode", "disk cache write", "loudness", "effects", "sink query",
+              "stream open", "spawn helper", "open decoder", "first block", "queue voice", "first write", "finish",
+              "audible"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(1000, 500)
+
+        layout = QVBoxLayout(self)
+
+        self.status_label = QLabel()
+        self.status_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.status_label)
+
+        #Recent plays, newest first. Times in ms.
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.phases) + 1)
+        self.table.setHorizontalHeaderLabels(["Sound", *self.phases])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        #Buttons
+        button_layout = QHBoxLayout()
+        export_json_button = QPushButton("Export JSON...")
+        export_json_button.clicked.connect(self.export_json)
+        button_layout.addWidget(export_json_button)
+
+        export_chrome_button = QPushButton("Export Chrome Trace...")
+        export_chrome_button.clicked.connect(self.export_chrome)
+        button_layout.addWidget(export_chrome_button)
+
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        button_layout.addWidget(clear_button)
+
+        #these work on the spans of this process, the daemon only sends the timings per phase
+        if player.remote:
+            for button in (export_json_button, export_chrome_button, clear_button):
+                button.setEnabled(False)
+                button.setToolTip("The plays are traced by the daemon")
+
+        button_layout.addStretch()
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(500)
+        self.refresh()
+
+    def refresh(self):
+        # From the daemon if the window is its client. The timer keeps trying, so it shows up again after a restart.
+        try:
+            stats = player.stats()
+        except (DaemonError, OSError) as e:
+            self.status_label.setText(f"Daemon disconnected: {e}")
+            self.table.setRowCount(0)
+            return
+        cache = stats["cache"]
+        disk = stats["disk_cache"]
+        rate = stats["sample_rate"]
+        lookups = cache["hits"] + cache["misses"]
+        hit_rate = cache["hits"] / lookups * 100 if lookups else 0
+        self.status_label.setText(
+            f"Memory cache: {cache['entries']} sounds, {cache['resident_bytes'] / 2**20:.1f} / "
+            f"{cache['max_bytes'] / 2**20:.0f} MB ({cache['sample_format']}), {hit_rate:.0f}% hits, "
+            f"{cache['evictions']} evictions, {cache['pinned']} pinned\n"
+            f"Disk cache: {disk['bytes'] / 2**20:.1f} / {disk['max_bytes'] / 2**20:.0f} MB\n"
+            f"Playing voices: {stats['voices']} / {stats['max_voices']}    "
+            f"Underruns: {stats['underruns']}    Starved stream blocks: {stats['starved']}    "
+            f"Output stream restarts: {stats['restarts']}\n"
+            + "\n".join(f"{w['target']} ({w['policy']}): {w['frames_written'] / rate:.1f} s written, "
+                        f"{w['frames_dropped'] / rate:.2f} s dropped in {w['overflows']} overflows, "
+                        f"{w['underruns']} underruns, lag up to {w['max_lag']} blocks"
+                        for w in stats["sinks"])
+        )
+
+        traces = stats["traces"] if player.remote else tracer.recent()
+        self.table.setRowCount(len(traces))
+        for row, trace in enumerate(traces):
+            self.table.setItem(row, 0, QTableWidgetItem(trace["sound"]))
+            for column, phase in enumerate(self.phases, 1):
+                ms = trace["phases"].get(phase)
+                item = QTableWidgetItem("" if ms is None else f"{ms:.2f}")
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def export_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Timings", "soundboard-trace.json", "JSON (*.json)")
+        if path:
+            tracer.export_json(path)
+
+    def export_chrome(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Chrome Trace", "soundboard-chrome-trace.json",
+                                              "Chrome Trace (*.json)")
+        if path:
+            tracer.export_chrome(path)
+
+    def clear(self):
+        tracer.clear()
+        self.refresh()
@@ -0,0 +1,65 @@
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QLineEdit, QLabel
+
+from views.control_row import ControlRow
+from views.overview_grid import GridWidget
+from views.menu_bar import setup_menu_bar
+from service.player_service import player
+from service.signal_service import signals
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Linux Soundboard")
+        self.setGeometry(100, 100, 800, 600)
+
+        # Create a central widget and main layout
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+
+        # Control Row
+        main_layout.addWidget(ControlRow(self))
+
+        #Search Box
+        self.search_box = QLineEdit(self)
+        self.search_box.setPlaceholderText("Search sounds... (Enter plays the first match)")
+        self.search_box.setClearButtonEnabled(True)
+        main_layout.addWidget(self.search_box)
+
+        #Grid Widget
+        self.grid_widget = GridWidget(self)
+        main_layout.addWidget(self.grid_widget)
+
+        self.search_box.textChanged.connect(self.grid_widget.set_filter)
+        self.search_box.returnPressed.connect(self.grid_widget.play_top_hit)
+
+        setup_menu_bar(self)
+
+        #Audio state, permanently on the right of the status bar. The setup runs in the background after the window is shown.
+        self.audio_label = QLabel()
+        self.statusBar().addPermanentWidget(self.audio_label)
+        self.show_audio_state(player.setup_state)
+
+        signals.predecode_progress.connect(self.show_predecode_progress)
+        signals.audio_setup_changed.connect(self.show_audio_state)
+
+    def show_predecode_progress(self, done, total):
+        if done < total:
+            self.statusBar().showMessage(f"Preparing sounds... {done}/{total}")
+        else:
+            self.statusBar().showMessage("All sounds ready", 3000)
+
+    def show_audio_state(self, state):
+        if state == "ready":
+            self.audio_label.setText("🎤 Virtual mic active (daemon)" if player.remote else "🎤 Virtual mic active")
+            self.audio_label.setToolTip("")
+        elif state == "failed":
+            self.audio_label.setText("❌ Audio setup failed")
+            self.audio_label.setToolTip(player.setup_error)
+        else:
+            self.audio_label.setText("⏳ Setting up audio...")
+            self.audio_label.setToolTip("Sounds can be played as soon as the virtual mic is ready")
+            if player.remote:
+                # The daemon's setup doesn't emit audio_setup_changed in this process, so it is asked again
+                QTimer.singleShot(500, lambda: self.show_audio_state(player.setup_state))
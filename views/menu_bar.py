@@ -1,7 +1,6 @@
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QAction, QKeySequence
 
-from views.configure_sound_popup import ConfigureSoundPopup
-from views.new_sound_popup import NewSoundPopup
 from service.sounds_service import sound_service
 
 
@@ -44,12 +43,27 @@ def setup_menu_bar(window):
 
     sounds_menu.addAction(add_sound_action)
 
+    # --- Help Menu ---
+    help_menu = menu_bar.addMenu("&Help")
+    diagnostics_action = QAction("&Diagnostics", window)
+    diagnostics_action.triggered.connect(lambda _: show_diagnostics(window))
+    help_menu.addAction(diagnostics_action)
+
 def add_sound(window):
     print("Add sound!")
+    from views.new_sound_popup import NewSoundPopup
     popup = NewSoundPopup(window)
     popup.exec()
 
 def configure_sounds(window):
     print("Configure sounds!")
+    from views.configure_sound_popup import ConfigureSoundPopup
     popup = ConfigureSoundPopup(window)
     popup.exec()
+
+def show_diagnostics(window):
+    # Not modal, so it can stay open while playing sounds
+    from views.diagnostics_popup import DiagnosticsPopup
+    popup = DiagnosticsPopup(window)
+    popup.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+    popup.show()
@@ -1,52 +1,97 @@
-from PySide6.QtWidgets import QWidget, QLabel
+from PySide6.QtCore import Qt, QSize
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QListView, QAbstractItemView
 
-from views.flow_layout import FlowLayout
-from views.grid_item import GridItem
+from views.sound_grid_model import SoundGridModel
+from views.sound_tile_delegate import SoundTileDelegate
+from service.player_service import player
 from service.signal_service import signals
 from service.sounds_service import sound_service
 
-class GridWidget(QWidget):
+class GridWidget(QListView):
+    """
+    Grid of sound buttons. The tiles are painted by a delegate, so only the visible ones cost anything
+    and a change in the folder only inserts or removes single rows.
+    """
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.items = sound_service.sounds_list
-        signals.sounds_list_changed.connect(self.set_items)
 
         # Grid settings
         self.grid_spacing = 10
         self.item_size = 100
+        self._pressed_row = -1
+
+        # Icon mode lays the tiles out left to right and wraps them like the old flow layout
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setGridSize(QSize(self.item_size + self.grid_spacing, self.item_size + self.grid_spacing))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setMouseTracking(True)
+        self.setFrameShape(QListView.Shape.NoFrame)
 
-        # Create layout
-        self.layout = FlowLayout(self)
-        self.layout.setSpacing(self.grid_spacing)
+        self.sound_model = SoundGridModel(self)
+        self.setModel(self.sound_model)
+        self.setItemDelegate(SoundTileDelegate(self.item_size, self))
+
+        self.clicked.connect(self._clicked)
+        signals.sounds_list_changed.connect(self.set_items)
+        signals.sounds_list_diff.connect(self._apply_diff)
 
         # Update grid
         sound_service.update_sounds_from_folder()
 
-    def populate_grid(self):
-        """Generate a grid from a list of sound effect objects"""
+    def set_items(self, items):
+        """Update the grid with new items"""
         print("Populating grid...")
-        # Clear existing widgets
-        self.clear_grid()
+        self.sound_model.set_sounds(items)
 
-        # Add widgets to the flow layout (will wrap automatically)
-        for sound_effect_obj in self.items:
-            item_widget = GridItem(sound_effect_obj, self.item_size)
-            self.layout.addWidget(item_widget)
+    def _apply_diff(self, added, removed, renamed):
+        self.sound_model.apply_diff(added, removed, renamed)
 
-        # If no sounds are in the list
-        if len(self.items) == 0:
-            self.layout.addWidget(QLabel("No sounds found! Add some in the Sounds tab."))
-
-    def clear_grid(self):
-        """Remove all widgets from the grid"""
-        while self.layout.count():
-            item = self.layout.takeAt(0)
-            if item.widget():
-                w = item.widget()
-                w.setParent(None)
-                w.deleteLater()
+    def set_filter(self, query: str):
+        self.sound_model.set_query(query)
+        self.scrollToTop()
 
-    def set_items(self, items):
-        """Update the grid with new items"""
-        self.items = items
-        self.populate_grid()
+    def play_top_hit(self):
+        """Plays the first sound of the current search result."""
+        sound_effect_obj = self.sound_model.top_sound()
+        if sound_effect_obj is not None:
+            self._play(sound_effect_obj)
+
+    def pressed_row(self) -> int:
+        return self._pressed_row
+
+    def mousePressEvent(self, event):
+        index = self.indexAt(event.position().toPoint())
+        self._pressed_row = index.row() if index.isValid() else -1
+        super().mousePressEvent(event)
+        self.viewport().update()
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        self._pressed_row = -1
+        self.viewport().update()
+
+    def _clicked(self, index):
+        sound_effect_obj = self.sound_model.sound_at(index.row())
+        self._play(sound_effect_obj)
+
+    def _play(self, sound_effect_obj):
+        print(f"Item {sound_effect_obj.name} clicked!")
+        #the sound plays with its own volume, the global volume is the master gain of the mixer
+        player.play(sound_effect_obj)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        # If no sounds are in the list
+        if self.sound_model.sound_count() == 0:
+            painter = QPainter(self.viewport())
+            painter.drawText(self.viewport().rect(), Qt.AlignmentFlag.AlignCenter,
+                             "No sounds found! Add some in the Sounds tab.")
+        elif self.sound_model.rowCount() == 0:
+            painter = QPainter(self.viewport())
+            painter.drawText(self.viewport().rect(), Qt.AlignmentFlag.AlignCenter, "No sounds match your search.")
@@ -0,0 +1,94 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from model.sound_effect import SoundEffect
+from service.search_service import search_index
+
+
+class SoundGridModel(QAbstractListModel):
+    """
+    List model of the sound effects. Without a search query it shows all of them, and rows are inserted and removed
+    one by one when the folder changes. With a query it shows the ranked search result, best matches first.
+    """
+    SoundRole = Qt.ItemDataRole.UserRole + 1
+    # The grid shows at most this many matches of a query
+    max_results = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._sounds: list[SoundEffect] = []
+        self._query = ""
+        #the rows shown, the same list as _sounds while there is no query
+        self._rows: list[SoundEffect] = self._sounds
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        sound = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return sound.name
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if sound.duration is None:
+                return str(sound.mp3_path)
+            minutes, seconds = divmod(round(sound.duration), 60)
+            return f"{sound.mp3_path} ({minutes}:{seconds:02d})"
+        if role == self.SoundRole:
+            return sound
+        return None
+
+    def sound_at(self, row: int) -> SoundEffect:
+        return self._rows[row]
+
+    def sound_count(self) -> int:
+        """All sounds, not only the ones matching the query."""
+        return len(self._sounds)
+
+    def top_sound(self) -> SoundEffect | None:
+        return self._rows[0] if self._rows else None
+
+    def set_query(self, query: str):
+        query = query.strip()
+        if not query and not self._query:
+            return
+        self.beginResetModel()
+        self._query = query
+        self._rows = search_index.search(query, self.max_results) if query else self._sounds
+        self.endResetModel()
+
+    def set_sounds(self, sounds: list[SoundEffect]):
+        self.beginResetModel()
+        self._sounds = list(sounds)
+        self._rows = search_index.search(self._query, self.max_results) if self._query else self._sounds
+        self.endResetModel()
+
+    def apply_diff(self, added: list[SoundEffect], removed: list[SoundEffect], renamed: list[SoundEffect]):
+        if self._query:
+            #the search index is updated already, the result is simply taken again
+            removed_ids = {id(sound) for sound in removed}
+            sounds = [sound for sound in self._sounds if id(sound) not in removed_ids] + list(added)
+            self.set_sounds(sounds)
+            return
+
+        removed_ids = {id(sound) for sound in removed}
+        rows = [row for row, sound in enumerate(self._sounds) if id(sound) in removed_ids]
+        #removing from the back keeps the other row numbers valid
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._sounds[row]
+            self.endRemoveRows()
+
+        if added:
+            first = len(self._sounds)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            self._sounds.extend(added)
+            self.endInsertRows()
+
+        renamed_ids = {id(sound) for sound in renamed}
+        for row, sound in enumerate(self._sounds):
+            if id(sound) in renamed_ids:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole])
@@ -0,0 +1,34 @@
+from PySide6.QtCore import Qt, QSize
+from PySide6.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+
+class SoundTileDelegate(QStyledItemDelegate):
+    """Paints a sound as a square push button with its wrapped name. No widget is created per sound."""
+    def __init__(self, item_size, parent=None):
+        super().__init__(parent)
+        self.item_size = item_size
+
+    def sizeHint(self, option, index):
+        return QSize(self.item_size, self.item_size)
+
+    def paint(self, painter, option, index):
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+
+        button = QStyleOptionButton()
+        button.rect = option.rect
+        button.palette = option.palette
+        button.state = QStyle.StateFlag.State_Enabled | QStyle.StateFlag.State_Raised
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            button.state |= QStyle.StateFlag.State_MouseOver
+        if hasattr(widget, "pressed_row") and widget.pressed_row() == index.row():
+            button.state |= QStyle.StateFlag.State_Sunken
+        if option.state & QStyle.StateFlag.State_HasFocus:
+            button.state |= QStyle.StateFlag.State_HasFocus
+        style.drawControl(QStyle.ControlElement.CE_PushButton, button, painter, widget)
+
+        text_rect = option.rect.adjusted(6, 6, -6, -6)
+        painter.save()
+        painter.setPen(option.palette.buttonText().color())
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignCenter | Qt.TextFlag.TextWordWrap, index.data())
+        painter.restore()